@@ -0,0 +1,100 @@
+# benchmarks/chat_context.py
+#
+# Prompt tokens sent per turn over a long synthetic chat (prose and code
+# turns), building the context with and without rolling summaries. The
+# summarizing model is simulated: it returns a summary of
+# CHAT_SUMMARY_MAX_TOKENS worth of words. Prefill time, and with it the time
+# to first token, grows with the prompt size.
+#
+# Run from the project root:  python -m benchmarks.chat_context
+
+import asyncio
+import itertools
+from config.settings import CHAT_SUMMARY_MAX_TOKENS
+from services import context_builder
+from services.context_builder import ContextBuilder, context_for, token_counts_for
+from services.conversation_summarizer import ConversationSummarizer
+
+MODEL = "Meta-Llama-3.3-70B-Instruct"
+REPLY_TOKENS = 1024
+TURNS = 60
+
+PROSE = (
+    "Could you explain how the scheduler decides which job runs next when several users "
+    "are waiting, and what happens to a job that keeps failing? "
+)
+CODE = (
+    "def drr_next(queues, quantum):\n"
+    "    for user, queue in itertools.cycle(queues.items()):\n"
+    "        queue.deficit += quantum\n"
+    "        if queue and queue[0].cost <= queue.deficit:\n"
+    "            return queue.popleft()\n"
+)
+
+
+class MemoryDatabase:
+    """The message and summary methods of services.database.Database, in memory."""
+
+    def __init__(self):
+        self.messages = []
+        self.summary = None
+        self._ids = itertools.count()
+
+    async def insert_message(self, chat_id, timestamp, sender, content, token_counts=None):
+        self.messages.append({
+            "_id": next(self._ids), "chat_id": chat_id, "timestamp": timestamp,
+            "sender": sender, "content": content, "token_counts": dict(token_counts or {})
+        })
+
+    async def get_messages(self, chat_id, history_cleared_at, after=None):
+        return [message for message in self.messages if after is None or message["timestamp"] > after]
+
+    async def set_token_counts(self, tokenizer, counts):
+        for message in self.messages:
+            if message["_id"] in counts:
+                message["token_counts"][tokenizer] = counts[message["_id"]]
+
+    async def get_chat_summary(self, chat_id):
+        return self.summary
+
+    async def set_chat_summary(self, chat_id, content, until, token_counts):
+        self.summary = {"content": content, "until": until, "token_counts": token_counts}
+
+
+class FakeClient:
+    async def generate_response(self, model, messages, temperature, max_tokens):
+        yield " ".join(["summary"] * (max_tokens * 3 // 4))
+
+
+async def run(summaries: bool) -> list:
+    context_builder.CHAT_SUMMARY_ENABLED = summaries
+    db = MemoryDatabase()
+    summarizer = ConversationSummarizer(db)
+    _, counter = context_for(MODEL)
+    prompt_tokens = []
+    for turn in range(TURNS):
+        user_text = (PROSE * 3) if turn % 2 else (PROSE + CODE * 4)
+        await db.insert_message(1, turn * 2, "user", user_text, token_counts_for(MODEL, user_text))
+        context = await ContextBuilder(db).build(1, None, MODEL, REPLY_TOKENS)
+        prompt_tokens.append(sum(counter.count_message(message["content"]) for message in context))
+        reply = (PROSE * 6) if turn % 2 else (CODE * 10)
+        await db.insert_message(1, turn * 2 + 1, "bot", reply, token_counts_for(MODEL, reply))
+        if summaries:
+            await summarizer.compact(1, None, MODEL, FakeClient())
+    return prompt_tokens
+
+
+def main():
+    window, counter = context_for(MODEL)
+    full = asyncio.run(run(summaries=False))
+    summarized = asyncio.run(run(summaries=True))
+    print(f"{MODEL}: window {window}, reply reserve {REPLY_TOKENS}, {TURNS} turns, "
+          f"summary up to {CHAT_SUMMARY_MAX_TOKENS} tokens ({counter.name})")
+    for turn in (10, 20, 40, TURNS):
+        print(f"turn {turn:>3}: {full[turn - 1]:>6} tokens without summary, {summarized[turn - 1]:>6} with")
+    saved = 1 - sum(summarized) / sum(full)
+    print(f"total prompt tokens: {sum(full)} -> {sum(summarized)} ({saved:.0%} saved)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# benchmarks/image_pipeline.py
+#
+# End-to-end latency of one /generate_images request with simulated upstream
+# latencies, comparing the old sequential pipeline (fixed progress sleeps,
+# second image started after the first) with the current concurrent one, and
+# the time to first pixel with and without low-step previews.
+#
+# Run from the project root:  python -m benchmarks.image_pipeline
+
+import asyncio
+import io
+import time
+from types import SimpleNamespace
+from config.settings import CONCURRENT_IMAGE_GENERATIONS, IMAGE_WIDTH, IMAGE_HEIGHT, IMAGE_STEPS
+from handlers import message_handlers
+from handlers.message_handlers import BotMessageHandler, TIME_TO_FIRST_PIXEL, TIME_TO_FINAL_IMAGE
+from services.image_service import ImageService
+from services.image_scheduler import ImageJobScheduler
+from services.prompt_filter import PromptFilter
+
+TRANSLATION_LATENCY = 1.2   # Seconds for the enhancement LLM call
+IMAGE_LATENCY = 3.0         # Seconds per full-size image generation
+IMAGE_BASE_LATENCY = 0.3    # Part of IMAGE_LATENCY that does not scale with pixels and steps
+RUNS = 3
+
+
+class FakeMessage:
+    def __init__(self, text=""):
+        self.text = text
+        self.from_user = SimpleNamespace(id=1)
+        self.edits = 0
+
+    async def reply_text(self, text, **kwargs):
+        return FakeMessage(text)
+
+    async def reply_photo(self, photo=None, **kwargs):
+        return FakeMessage()
+
+    async def reply_media_group(self, media=None, **kwargs):
+        return [FakeMessage() for _ in media]
+
+    async def edit_text(self, text, **kwargs):
+        self.edits += 1
+
+    async def edit_media(self, media, **kwargs):
+        return FakeMessage()
+
+    async def edit_caption(self, caption, **kwargs):
+        pass
+
+    async def delete(self):
+        pass
+
+
+class FakeTranslationService:
+    async def translate_prompt(self, prompt, *args, **kwargs):
+        await asyncio.sleep(TRANSLATION_LATENCY)
+        return f"enhanced {prompt}"
+
+    async def enhance_prompt(self, prompt, deadline=None):
+        return await self.translate_prompt(prompt)
+
+
+class FakeImageService(ImageService):
+    def __init__(self):
+        self.semaphore = asyncio.Semaphore(CONCURRENT_IMAGE_GENERATIONS)
+        self.cache = None
+
+    async def _request_images(self, prompt, seed=None, n=1, width=IMAGE_WIDTH, height=IMAGE_HEIGHT, steps=IMAGE_STEPS,
+                              deadline=None):
+        scale = (steps / IMAGE_STEPS) * (width * height) / (IMAGE_WIDTH * IMAGE_HEIGHT)
+        await asyncio.sleep(IMAGE_BASE_LATENCY + (IMAGE_LATENCY - IMAGE_BASE_LATENCY) * scale)
+        return [self._fake_image() for _ in range(n)]
+
+    @staticmethod
+    def _fake_image() -> io.BytesIO:
+        bio = io.BytesIO(b"image")
+        bio.name = "image.png"
+        return bio
+
+
+class FakePromptStorage:
+    async def add_prompts(self, user_id, prompts):
+        pass
+
+
+class FakeRateLimiter:
+    async def can_make_request(self, user_id):
+        return True
+
+    async def get_remaining_requests(self, user_id):
+        return 10
+
+
+async def legacy_pipeline(translation, images):
+    """
+    The pre-concurrency schedule: ~6s of fixed sleeps around enhancement,
+    then two sequential image generations padded by progress sleeps.
+    """
+    await asyncio.sleep(2)
+    await asyncio.sleep(2)
+    await asyncio.sleep(2)
+    prompt = await translation.translate_prompt("a cat")
+    first = asyncio.create_task(images.generate_single_image(prompt))
+    for _ in range(3):
+        await asyncio.sleep(1.3)
+    await first
+    second = asyncio.create_task(images.generate_single_image(prompt))
+    for _ in range(3):
+        await asyncio.sleep(1.9)
+    await second
+
+
+async def current_pipeline(handler):
+    message = FakeMessage("a cat")
+    update = SimpleNamespace(
+        message=message,
+        effective_user=SimpleNamespace(id=1),
+        effective_chat=SimpleNamespace(id=1)
+    )
+    context = SimpleNamespace(user_data={}, bot_data={})
+    await handler.generate_images(update, context)
+
+
+async def measure(label, factory):
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        await factory()
+        timings.append(time.perf_counter() - start)
+    print(f"{label:<10} mean {sum(timings) / len(timings):6.2f}s  min {min(timings):6.2f}s")
+
+
+async def main():
+    handler = BotMessageHandler.__new__(BotMessageHandler)
+    handler.rate_limiter = FakeRateLimiter()
+    handler.translation_service = FakeTranslationService()
+    handler.image_service = FakeImageService()
+    handler.prompt_storage = FakePromptStorage()
+    handler.prompt_filter = PromptFilter([])
+    handler.image_scheduler = ImageJobScheduler(slots=2, max_per_user=1, quantum=2, initial_latency=IMAGE_LATENCY)
+
+    print(f"translation={TRANSLATION_LATENCY}s image={IMAGE_LATENCY}s runs={RUNS}")
+    await measure("before", lambda: legacy_pipeline(handler.translation_service, handler.image_service))
+    await measure("after", lambda: current_pipeline(handler))
+
+    for preview in (False, True):
+        message_handlers.IMAGE_PREVIEW_ENABLED = preview
+        first_pixel, final = TIME_TO_FIRST_PIXEL.total, TIME_TO_FINAL_IMAGE.total
+        for _ in range(RUNS):
+            await current_pipeline(handler)
+        print(
+            f"preview={'on ' if preview else 'off'} first pixel {(TIME_TO_FIRST_PIXEL.total - first_pixel) / RUNS:6.2f}s"
+            f"  final {(TIME_TO_FINAL_IMAGE.total - final) / RUNS:6.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+# config/models.py
+#
+# The chat models the bot offers. Handlers, the AI client and the context
+# builder all read model facts from here.
+
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    key: str                # Id used in /mode callbacks and stored in user_data
+    name: str               # Upstream model id
+    label: str              # Shown to users
+    backend: str            # "openai" (SambaNova) or "g4f"
+    context_tokens: int
+    max_output_tokens: int
+    tokenizer: str          # Spec for utils.token_counter.get_token_counter
+    temperature: float = 0.75
+    top_p: float = 0.60
+    cost: str = "free"      # Cost class: free, low or high
+    latency: str = "standard"  # Latency class: fast, standard or slow
+    providers: Tuple[str, ...] = ()  # g4f providers, in preference order
+    fallback_backends: Tuple[str, ...] = ()  # Tried, with their own default model, when `backend` fails
+
+    @property
+    def backends(self) -> Tuple[str, ...]:
+        """
+        Backends to try for this model, in order.
+        """
+        return (self.backend,) + self.fallback_backends
+
+
+MODELS: Tuple[ModelSpec, ...] = (
+    ModelSpec(
+        key="llama70b",
+        name="Meta-Llama-3.3-70B-Instruct",
+        label="Llama 3.3 70B",
+        backend="openai",
+        context_tokens=int(os.getenv('LLAMA_CONTEXT_TOKENS', 8192)),
+        max_output_tokens=1024,
+        tokenizer="estimate:1.1",
+        fallback_backends=("g4f",),
+    ),
+    ModelSpec(
+        key="qwen32b",
+        name="Qwen2.5-Coder-32B-Instruct",
+        label="Qwen2.5 Coder 32B",
+        backend="openai",
+        context_tokens=int(os.getenv('QWEN_CONTEXT_TOKENS', 8192)),
+        max_output_tokens=2048,
+        tokenizer="estimate:1.1",
+        temperature=0.3,
+        latency="fast",
+        fallback_backends=("g4f",),
+    ),
+    ModelSpec(
+        key="g4f",
+        name="gpt-4o-mini",
+        label="GPT-4o mini (G4F)",
+        backend="g4f",
+        context_tokens=int(os.getenv('G4F_CONTEXT_TOKENS', 16384)),
+        max_output_tokens=1024,
+        tokenizer="tiktoken:o200k_base",
+        latency="slow",
+        providers=("DDG", "Pizzagpt"),
+        fallback_backends=("openai",),
+    ),
+)
+
+DEFAULT_MODEL = os.getenv('DEFAULT_MODEL', "llama70b")
+
+_by_key: Dict[str, ModelSpec] = {spec.key: spec for spec in MODELS}
+_by_name: Dict[str, ModelSpec] = {spec.name: spec for spec in MODELS}
+
+
+def find_model(model) -> Optional[ModelSpec]:
+    """
+    The spec for a registry key, an upstream model id or a g4f Model object.
+    """
+    if model is None:
+        return None
+    model = getattr(model, 'name', model)
+    return _by_key.get(model) or _by_name.get(model)
+
+
+def get_model(model=None) -> ModelSpec:
+    """
+    Like find_model, falling back to DEFAULT_MODEL.
+    """
+    return find_model(model) or _by_key[DEFAULT_MODEL]
@@ -30,7 +30,127 @@ IMAGE_STEPS = int(os.getenv('IMAGE_STEPS', 4))
 MODEL_NAME = os.getenv('MODEL_NAME', "black-forest-labs/FLUX.1-schnell-Free")
 TRANSLATION_MODEL = os.getenv('TRANSLATION_MODEL', "meta-llama/Llama-3.3-70B-Instruct")
 MAX_PROMPT_LENGTH = int(os.getenv('MAX_PROMPT_LENGTH', 600))
+PROMPT_FILTER_TERMS = os.getenv('PROMPT_FILTER_TERMS', '')  # Comma-separated terms rejected before any API call
+PROMPT_FILTER_TERMS_FILE = os.getenv('PROMPT_FILTER_TERMS_FILE', '')  # One term per line
+TRANSLATION_CACHE_ENABLED = os.getenv('TRANSLATION_CACHE_ENABLED', 'true').lower() == 'true'
+TRANSLATION_CACHE_MEMORY_SIZE = int(os.getenv('TRANSLATION_CACHE_MEMORY_SIZE', 1024))  # Prompts kept in memory
+TRANSLATION_CACHE_MAX_ROWS = int(os.getenv('TRANSLATION_CACHE_MAX_ROWS', 50000))  # Prompts kept on disk
+TRANSLATION_ENGLISH_FAST_PATH = os.getenv('TRANSLATION_ENGLISH_FAST_PATH', 'off').lower()  # off, skip or template
+TRANSLATION_BATCH_ENABLED = os.getenv('TRANSLATION_BATCH_ENABLED', 'false').lower() == 'true'
+TRANSLATION_BATCH_WINDOW_MS = int(os.getenv('TRANSLATION_BATCH_WINDOW_MS', 20))  # Wait to gather a batch
+TRANSLATION_BATCH_MAX = int(os.getenv('TRANSLATION_BATCH_MAX', 8))  # Prompts per batched call
 CONCURRENT_IMAGE_GENERATIONS = int(os.getenv('CONCURRENT_IMAGE_GENERATIONS', 5))
+PROGRESS_MIN_INTERVAL = float(os.getenv('PROGRESS_MIN_INTERVAL', 1.5))  # Seconds between status edits
+IMAGE_JOB_SLOTS = int(os.getenv('IMAGE_JOB_SLOTS', 2))  # Image jobs running at once
+IMAGE_JOBS_PER_USER = int(os.getenv('IMAGE_JOBS_PER_USER', 1))  # Running jobs allowed per user
+IMAGE_JOB_INITIAL_ETA = float(os.getenv('IMAGE_JOB_INITIAL_ETA', 8))  # Seconds per job until measured
+
+# Out-of-process image workers (python image_worker.py)
+IMAGE_WORKER_MODE = os.getenv('IMAGE_WORKER_MODE', 'false').lower() == 'true'
+IMAGE_WORKER_CONCURRENCY = int(os.getenv('IMAGE_WORKER_CONCURRENCY', 2))  # Jobs per worker process
+IMAGE_QUEUE_DB_PATH = os.getenv(
+    'IMAGE_QUEUE_DB_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'image_jobs.db')
+)
+IMAGE_SPOOL_DIR = os.getenv(
+    'IMAGE_SPOOL_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'image_spool')
+)
+IMAGE_QUEUE_POLL_INTERVAL = float(os.getenv('IMAGE_QUEUE_POLL_INTERVAL', 0.5))
+IMAGE_JOB_STALE_SECONDS = float(os.getenv('IMAGE_JOB_STALE_SECONDS', 300))  # Requeue running jobs after this
+IMAGE_JOB_HEARTBEAT_INTERVAL = float(os.getenv('IMAGE_JOB_HEARTBEAT_INTERVAL', 30))  # Worker heartbeat while a job runs
+IMAGE_BATCH_VARIANTS = os.getenv('IMAGE_BATCH_VARIANTS', 'false').lower() == 'true'  # One upstream call for all variants
+IMAGE_VARIANT_RETRIES = int(os.getenv('IMAGE_VARIANT_RETRIES', 1))  # Retries per missing variant
+IMAGE_OUTPUT_FORMAT = os.getenv('IMAGE_OUTPUT_FORMAT', 'passthrough').lower()  # passthrough, jpeg, webp or png
+IMAGE_OUTPUT_QUALITY = int(os.getenv('IMAGE_OUTPUT_QUALITY', 90))  # jpeg / webp quality
+IMAGE_ENCODE_WORKERS = int(os.getenv('IMAGE_ENCODE_WORKERS', 2))  # Processes used for re-encoding
+
+# Two-phase delivery: a cheap preview is sent first and replaced by the full render
+IMAGE_PREVIEW_ENABLED = os.getenv('IMAGE_PREVIEW_ENABLED', 'false').lower() == 'true'
+IMAGE_PREVIEW_WIDTH = int(os.getenv('IMAGE_PREVIEW_WIDTH', 448))
+IMAGE_PREVIEW_HEIGHT = int(os.getenv('IMAGE_PREVIEW_HEIGHT', 576))
+IMAGE_PREVIEW_STEPS = int(os.getenv('IMAGE_PREVIEW_STEPS', 1))
+
+# Generated image cache, keyed on prompt, seed and render settings
+IMAGE_CACHE_ENABLED = os.getenv('IMAGE_CACHE_ENABLED', 'true').lower() == 'true'
+IMAGE_CACHE_DIR = os.getenv(
+    'IMAGE_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'image_cache')
+)
+IMAGE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MAX_MB', 512)) * 1024 * 1024
+
+# Upstream quota shaping (requests / tokens per minute, 0 disables a limit)
+UPSTREAM_LIMITS = {
+    "sambanova": (int(os.getenv('SAMBANOVA_RPM', 30)), int(os.getenv('SAMBANOVA_TPM', 0))),
+    "together": (int(os.getenv('TOGETHER_RPM', 60)), int(os.getenv('TOGETHER_TPM', 0))),
+    "together_images": (int(os.getenv('TOGETHER_IMAGE_RPM', 10)), 0),
+    "g4f": (int(os.getenv('G4F_RPM', 20)), 0),
+}
+UPSTREAM_MAX_RETRIES = int(os.getenv('UPSTREAM_MAX_RETRIES', 2))
+
+# Circuit breakers per text backend and model
+CIRCUIT_WINDOW = int(os.getenv('CIRCUIT_WINDOW', 20))  # Recent calls considered
+CIRCUIT_MIN_CALLS = int(os.getenv('CIRCUIT_MIN_CALLS', 5))  # Calls needed before the circuit can open
+CIRCUIT_FAILURE_RATE = float(os.getenv('CIRCUIT_FAILURE_RATE', 0.5))
+CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv('CIRCUIT_SLOW_CALL_SECONDS', 20))  # Time to first token
+CIRCUIT_SLOW_CALL_RATE = float(os.getenv('CIRCUIT_SLOW_CALL_RATE', 0.8))
+CIRCUIT_OPEN_SECONDS = float(os.getenv('CIRCUIT_OPEN_SECONDS', 30))  # Wait before a half-open probe
+
+# Hedged text requests: start the next backend when the first token is late
+LLM_HEDGING_ENABLED = os.getenv('LLM_HEDGING_ENABLED', 'false').lower() == 'true'
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', 0.9))  # TTFT percentile used as the budget
+LLM_HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', 2.0))  # Budget floor, also used until enough samples
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', 20))
+LLM_HEDGE_MAX_RATE = float(os.getenv('LLM_HEDGE_MAX_RATE', 0.2))  # Share of recent requests allowed to hedge
+
+# Streams that fail after output was delivered
+LLM_FAILOVER_MODE = os.getenv('LLM_FAILOVER_MODE', 'continue').lower()  # continue or restart
+LLM_MAX_RESUMES = int(os.getenv('LLM_MAX_RESUMES', 2))  # Failovers allowed per response
+
+# Time budget per update, covering every upstream call it makes (0 disables)
+TEXT_REQUEST_DEADLINE = float(os.getenv('TEXT_REQUEST_DEADLINE', 120))
+IMAGE_REQUEST_DEADLINE = float(os.getenv('IMAGE_REQUEST_DEADLINE', 240))  # Includes waiting for a queue slot
+CHAT_SUMMARY_DEADLINE = float(os.getenv('CHAT_SUMMARY_DEADLINE', 120))  # Background compaction of one chat
+
+# g4f providers ordered by measured success rate, TTFT and throughput
+G4F_RANKING_ENABLED = os.getenv('G4F_RANKING_ENABLED', 'true').lower() == 'true'
+G4F_RANK_HALF_LIFE = float(os.getenv('G4F_RANK_HALF_LIFE', 600))  # Seconds for a sample to lose half its weight
+G4F_PROBE_INTERVAL = float(os.getenv('G4F_PROBE_INTERVAL', 300))  # Seconds between probes of a demoted provider
+
+# Reuse of complete chat replies for single-turn or low-temperature requests
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'false').lower() == 'true'
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 512))  # Replies kept in memory
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 3600))  # Seconds a reply stays valid
+RESPONSE_CACHE_MAX_TEMPERATURE = float(os.getenv('RESPONSE_CACHE_MAX_TEMPERATURE', 0.2))  # Multi-turn requests at or below this are cached
+RESPONSE_CACHE_REPLAY_CHARS = int(os.getenv('RESPONSE_CACHE_REPLAY_CHARS', 80))  # Chunk size when replaying
+
+# Identical concurrent chat, enhancement and image requests share one upstream call
+SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+
+# Chat context (per-model windows and tokenizers are in config/models.py)
+DEFAULT_CONTEXT_TOKENS = int(os.getenv('DEFAULT_CONTEXT_TOKENS', 4096))  # Models missing from the registry
+CHAT_HISTORY_MAX_WORDS = int(os.getenv('CHAT_HISTORY_MAX_WORDS', 20000))  # Stored history per chat
+
+# Rolling summaries: older turns are folded into one stored summary per chat, in the background
+CHAT_SUMMARY_ENABLED = os.getenv('CHAT_SUMMARY_ENABLED', 'false').lower() == 'true'
+CHAT_SUMMARY_TRIGGER_TOKENS = int(os.getenv('CHAT_SUMMARY_TRIGGER_TOKENS', 3000))  # Unsummarized history that starts a compaction
+CHAT_SUMMARY_KEEP_MESSAGES = int(os.getenv('CHAT_SUMMARY_KEEP_MESSAGES', 6))  # Recent messages always sent verbatim
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv('CHAT_SUMMARY_MAX_TOKENS', 400))
+
+# Together HTTP client
+TOGETHER_BASE_URL = os.getenv('TOGETHER_BASE_URL', "https://api.together.xyz/v1")
+TOGETHER_CONNECT_TIMEOUT = float(os.getenv('TOGETHER_CONNECT_TIMEOUT', 10))
+TOGETHER_READ_TIMEOUT = float(os.getenv('TOGETHER_READ_TIMEOUT', 120))
+TOGETHER_MAX_CONNECTIONS = int(os.getenv('TOGETHER_MAX_CONNECTIONS', 20))
+
+# Local SQLite storage shared by the rate limiter and prompt history
+SQLITE_DB_PATH = os.getenv(
+    'SQLITE_DB_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'rate_limit.db')
+)
+SQLITE_READERS = int(os.getenv('SQLITE_READERS', 2))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_WRITE_BATCH = int(os.getenv('SQLITE_WRITE_BATCH', 64))
 
 # Validate configurations
 if not TELEGRAM_BOT_TOKEN: #This check is redundant since you check BOT_TOKEN
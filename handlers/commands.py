@@ -5,22 +5,10 @@ import logging
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
 from services.database import Database
-from g4f.models import Model
-from g4f.Provider import DDG, Pizzagpt, ChatgptFree, IterListProvider
+from config.models import DEFAULT_MODEL, MODELS, find_model
 
 logger = logging.getLogger(__name__)
 
-# Define models
-OPENAI_MODEL1 = "Meta-Llama-3.3-70B-Instruct"
-OPENAI_MODEL2 = "Qwen2.5-Coder-32B-Instruct"
-G4F_MODEL = Model(
-    name='gpt-4o-mini',
-    base_provider='OpenAI',
-    best_provider=IterListProvider([
-        DDG, Pizzagpt, ChatgptFree,
-    ])
-)
-
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     user_name = user.first_name if user.first_name else "there"
@@ -28,9 +16,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"👋 Hi {user_name}!\n\n"
         "I'm your AI assistant with multiple capabilities:\n\n"
         "🤖 Text Generation Models:\n"
-        "• Meta-Llama-3.1-405B (Default)\n"
-        "• Meta-Llama-3.1-70B\n"
-        "• GPT-4-Mini (G4F)\n\n"
+        + "".join(f"• {spec.label}{' (Default)' if spec.key == DEFAULT_MODEL else ''}\n" for spec in MODELS)
+        + "\n"
         "🎨 Image Generation\n\n"
         "Use /mode to select your preferred mode and model!"
     )
@@ -54,11 +41,9 @@ async def clear_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [
-        [InlineKeyboardButton("Meta-Llama-3.1-405B 🤖", callback_data='model_openai1')],
-        [InlineKeyboardButton("Meta-Llama-3.1-70B 🧠", callback_data='model_openai2')],
-        [InlineKeyboardButton("GPT-4-Mini (G4F) ⚡", callback_data='model_g4f')],
-        [InlineKeyboardButton("Image Generator 🎨", callback_data='mode_image')]
+        [InlineKeyboardButton(f"{spec.label} 🤖", callback_data=f'model_{spec.key}')] for spec in MODELS
     ]
+    keyboard.append([InlineKeyboardButton("Image Generator 🎨", callback_data='mode_image')])
     reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text(
         "Choose your preferred mode:",
@@ -80,27 +65,16 @@ async def mode_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
     elif choice.startswith('model_'):
         context.user_data['mode'] = 'text'
-        model_choice = choice.split('_')[1]
-        
-        if model_choice == 'openai1':
-            context.user_data['model'] = OPENAI_MODEL1
-            model_name = "Meta-Llama-3.1-405B"
-            logger.info(f"Set OpenAI Model 1: {OPENAI_MODEL1}")
-        elif model_choice == 'openai2':
-            context.user_data['model'] = OPENAI_MODEL2
-            model_name = "Meta-Llama-3.1-70B"
-            logger.info(f"Set OpenAI Model 2: {OPENAI_MODEL2}")
-        elif model_choice == 'g4f':
-            context.user_data['model'] = G4F_MODEL
-            model_name = "GPT-4-Mini (G4F)"
-            logger.info(f"Set G4F Model: {G4F_MODEL.name}")
-        
-        # Debug logging
-        logger.info(f"Model set to: {context.user_data['model']}")
-        logger.info(f"Model type: {type(context.user_data['model'])}")
-        
+        spec = find_model(choice.split('_', 1)[1])
+        if spec is None:
+            await query.edit_message_text("This model is no longer available. Use /mode to choose another one.")
+            return
+
+        context.user_data['model'] = spec.key
+        logger.info(f"User {user_id} set model {spec.name} ({spec.backend})")
+
         await query.edit_message_text(
-            f"Model set to: {model_name}\n"
+            f"Model set to: {spec.label}\n"
             "You can now start chatting!"
         )
 
@@ -4,6 +4,7 @@ import logging
 from telegram import Update
 from telegram.ext import ContextTypes
 from handlers.messages import handle_message
+from config.models import DEFAULT_MODEL, get_model
 
 logger = logging.getLogger(__name__)
 
@@ -18,10 +19,8 @@ async def mode_dispatcher(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if mode == 'text':
         if not model:
-            # If no model is selected, use OPENAI_MODEL1 as default
-            from handlers.commands import OPENAI_MODEL1
-            context.user_data['model'] = OPENAI_MODEL1
-            logger.info("No model selected, using default OPENAI_MODEL1")
+            context.user_data['model'] = DEFAULT_MODEL
+            logger.info(f"No model selected, using default {DEFAULT_MODEL}")
         
         await handle_message(update, context)
         
@@ -45,10 +44,9 @@ async def mode_dispatcher(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         logger.warning(f"Unknown mode '{mode}' detected. Defaulting to text mode.")
         context.user_data['mode'] = 'text'
-        from handlers.commands import OPENAI_MODEL1
-        context.user_data['model'] = OPENAI_MODEL1
+        context.user_data['model'] = DEFAULT_MODEL
         await update.message.reply_text(
-            "Unknown mode detected. Defaulting to text mode with Meta-Llama-3.1-405B.\n"
+            f"Unknown mode detected. Defaulting to text mode with {get_model().label}.\n"
             "Use /mode to select your preferred mode and model."
         )
         await handle_message(update, context)
@@ -1,36 +1,53 @@
 # handlers/message_handlers.py
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
 from telegram.ext import ContextTypes
+from telegram.error import BadRequest
 import asyncio
-from config.settings import MAX_PROMPT_LENGTH
+import time
+from config.settings import (
+    MAX_PROMPT_LENGTH, IMAGE_COUNT, PROGRESS_MIN_INTERVAL,
+    IMAGE_JOB_SLOTS, IMAGE_JOBS_PER_USER, IMAGE_JOB_INITIAL_ETA, IMAGE_WORKER_MODE,
+    IMAGE_PREVIEW_ENABLED, IMAGE_REQUEST_DEADLINE
+)
 from services.translation_service import TranslationService
 from services.image_service import ImageService
+from services.image_scheduler import ImageJobScheduler, TIER_NEW, TIER_REGENERATE
+from services.job_queue import ImageJobQueue, STATUS_QUEUED, STATUS_FAILED
+from services.prompt_filter import get_prompt_filter
 from utils.logging_config import logger
 from utils.rate_limiter import RateLimiter
 from utils.prompt_storage import PromptStorage 
+from utils.progress import ProgressReporter
+from utils.metrics import histogram
+from utils.deadline import current_deadline, enforce, remaining, with_deadline
 from utils.exceptions import (
     ImageGenerationError,
     NSFWContentError,
     APIConnectionError,
-    InvalidPromptError
+    InvalidPromptError,
+    PromptRefusedError,
+    DeadlineExceededError
 )
 from datetime import datetime, timedelta
 
-class BotMessageHandler:
-    REFUSAL_MESSAGES = [
-        "I can't create explicit content.",
-        "I can't create adult content.",
-        "I'm sorry, but I can't assist with that request.",
-        "I can't help with that.",
-        "I cannot create explicit content.",
-        "I can't help with that request.",
-        "I can't help you with this request.",
-        "I can't help you with that.",
-        "I can't help with that",
-        "I can't create explicit content.",
-    ]
+# Error types reported by image workers, mapped back to local exceptions
+WORKER_ERRORS = {
+    "nsfw": NSFWContentError,
+    "invalid": InvalidPromptError,
+    "refused": PromptRefusedError,
+    "connection": APIConnectionError,
+    "deadline": DeadlineExceededError,
+}
+
+TIME_TO_FIRST_PIXEL = histogram(
+    "image_time_to_first_pixel_seconds", "Seconds from request until the first image or preview is shown"
+)
+TIME_TO_FINAL_IMAGE = histogram(
+    "image_time_to_final_image_seconds", "Seconds from request until all full images are delivered"
+)
 
+class BotMessageHandler:
     # Progress bar configuration
     PROGRESS_FULL = "🟩"
     PROGRESS_EMPTY = "⬜️"
@@ -42,7 +59,15 @@ class BotMessageHandler:
         self.rate_limiter = rate_limiter
         self.translation_service = TranslationService()
         self.image_service = ImageService()
+        self.image_scheduler = ImageJobScheduler(
+            slots=IMAGE_JOB_SLOTS,
+            max_per_user=IMAGE_JOBS_PER_USER,
+            quantum=IMAGE_COUNT,
+            initial_latency=IMAGE_JOB_INITIAL_ETA
+        )
         self.prompt_storage = PromptStorage(max_prompts=5)  # Initialize PromptStorage
+        self.job_queue = ImageJobQueue() if IMAGE_WORKER_MODE else None
+        self.prompt_filter = get_prompt_filter()
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
@@ -54,15 +79,28 @@ class BotMessageHandler:
             logger.error(f"Error in start handler: {e}", exc_info=True)
             await update.message.reply_text("An error occurred while processing your request.")
 
+    @with_deadline(IMAGE_REQUEST_DEADLINE)
     async def generate_images(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        started = time.monotonic()
+        deadline = current_deadline()
         original_prompt = update.message.text.strip()
         user_id = update.effective_user.id
         chat_id = update.effective_chat.id
 
+        # Validate and pre-filter the prompt before it can use a rate-limit slot
+        if not await self._validate_prompt(original_prompt, update):
+            return
+
+        blocked_term = self.prompt_filter.check(original_prompt)
+        if blocked_term is not None:
+            logger.warning(f"User {user_id} prompt rejected by the local filter (term '{blocked_term}')")
+            await update.message.reply_text("Sorry, your prompt contains content that cannot be processed.")
+            return
+
         # Check rate limit
         try:
-            if not self.rate_limiter.can_make_request(user_id):
-                oldest_request = self.rate_limiter.get_oldest_request_time(user_id)
+            if not await self.rate_limiter.can_make_request(user_id):
+                oldest_request = await self.rate_limiter.get_oldest_request_time(user_id)
                 if oldest_request:
                     reset_time = oldest_request + timedelta(hours=24)
                     remaining_time = reset_time - datetime.now()
@@ -80,95 +118,83 @@ class BotMessageHandler:
             await update.message.reply_text("An error occurred while processing your request. Please try again later.")
             return
 
-        # Validate prompt
-        if not self._validate_prompt(original_prompt, update):
-            return
-
         logger.info(f"User {user_id} in chat {chat_id} sent prompt: {original_prompt}")
         status_message = await update.message.reply_text('Created by: 纳谢纳斯 \n\n contact me for any error @orionagi')
 
+        progress = self._create_progress_reporter(status_message)
         try:
-            # Initial progress bar
-            await asyncio.sleep(2)
-            await self._update_progress(status_message, 0)
-
-            await asyncio.sleep(2)
-            await self._update_progress(status_message, 1)
-
-            # Prompt enhancement phase (0-20%)
-            await asyncio.sleep(2)
-            enhanced_prompt = await self.translation_service.translate_prompt(original_prompt)
-            await self._update_progress(status_message, 2)
-
-            if not enhanced_prompt:
-                await status_message.edit_text("Failed to process your prompt. Please try again.")
-                return
-
-            if any(message.lower() in enhanced_prompt.lower() for message in self.REFUSAL_MESSAGES):
-                logger.warning(f"User {user_id} provided an unprocessable prompt: {original_prompt}")
-                await status_message.edit_text(
-                    "Sorry, your prompt contains content that cannot be processed."
+            await progress.update(0, force=True)
+            # The regenerate round belongs to the user's last prompt, which is per user like it
+            context.user_data['seed_round'] = 0
+
+            previews = {}
+            if IMAGE_WORKER_MODE:
+                enhanced_prompt, images = await self._generate_via_workers(
+                    progress, user_id, chat_id, prompt=original_prompt, deadline=deadline
                 )
-                return
-
-            # Store the original and enhanced prompts
-            await self.prompt_storage.add_prompt(user_id, original_prompt)
-            await self.prompt_storage.add_prompt(user_id, enhanced_prompt)
-
-            # First image generation (20-60%)
-            first_image_task = asyncio.create_task(
-                self.image_service.generate_single_image(enhanced_prompt)
-            )
-
-            # Update progress during first image generation
-            for step in range(3, 6):
-                await asyncio.sleep(1.3)
-                await self._update_progress(status_message, step)
-
-            first_image = await first_image_task
-            await self._update_progress(status_message, 6)
-
-            # Second image generation (60-100%)
-            second_image_task = asyncio.create_task(
-                self.image_service.generate_single_image(enhanced_prompt)
-            )
-
-            # Update progress during second image generation
-            for step in range(7, 10):
-                await asyncio.sleep(1.9)
-                await self._update_progress(status_message, step)
-
-            second_image = await second_image_task
-            await self._update_progress(status_message, 10)
+                await self.prompt_storage.add_prompts(user_id, [original_prompt, enhanced_prompt])
+            else:
+                enhanced_prompt = await self.translation_service.enhance_prompt(original_prompt, deadline)
+                await progress.update(self.PROMPT_STEPS)
+
+                # Render the images and store the original and enhanced prompts at the same time
+                (images, previews), _ = await asyncio.gather(
+                    self._generate_images_concurrently(
+                        enhanced_prompt, progress, user_id, message=update.message, started=started,
+                        deadline=deadline
+                    ),
+                    self.prompt_storage.add_prompts(user_id, [original_prompt, enhanced_prompt])
+                )
+            await progress.update(self.TOTAL_STEPS)
+            progress.close()
 
             # Send images
-            images = [first_image, second_image]
-            await self._send_images(update.message, context, images, prompt=original_prompt, enhanced_prompt=enhanced_prompt)
+            await self._send_images(
+                update.message, context, images, prompt=original_prompt, enhanced_prompt=enhanced_prompt,
+                previews=previews, started=started
+            )
             await status_message.delete()
 
+        except DeadlineExceededError as e:
+            progress.close()
+            logger.error(f"Request of user {user_id} ran out of time: {e}")
+            await status_message.edit_text("Generating your images took too long. Please try again.")
+        except PromptRefusedError as e:
+            progress.close()
+            logger.warning(f"User {user_id} provided an unprocessable prompt: {original_prompt}")
+            await status_message.edit_text(
+                "Sorry, your prompt contains content that cannot be processed."
+            )
         except NSFWContentError as e:
+            progress.close()
             logger.error(f"NSFW content detected for user {user_id}: {e}", exc_info=True)
             await status_message.edit_text("Your prompt resulted in content that cannot be processed due to its nature.")
             await update.message.reply_text("Please modify your prompt to avoid NSFW content and try again.")
         except InvalidPromptError as e:
+            progress.close()
             logger.error(f"Invalid prompt for user {user_id}: {e}", exc_info=True)
             await status_message.edit_text("Your prompt is invalid. Please revise it and try again.")
         except APIConnectionError as e:
+            progress.close()
             logger.error(f"API connection error for user {user_id}: {e}", exc_info=True)
             await status_message.edit_text("We're experiencing technical difficulties. Please try again later.")
         except ImageGenerationError as e:
+            progress.close()
             logger.error(f"Image generation error for user {user_id}: {e}", exc_info=True)
             await status_message.edit_text("An error occurred while generating your images. Please try again.")
         except Exception as e:
+            progress.close()
             logger.error(f"Unexpected error processing request for user {user_id}: {e}", exc_info=True)
             await status_message.edit_text('An unexpected error occurred. Please try again later.')
 
-    async def _update_progress(self, message, steps: int):
+    async def _update_progress(self, message, steps: int, note: str = None):
         """
         Updates the progress bar message.
         """
         try:
             progress = self._create_progress_bar(steps)
+            if note:
+                progress = f"{note}\n{progress}"
             await message.edit_text(
                 f"Generating images, please wait...\n\nJoin our group for the free version:\nhttps://t.me/+dN7qZppVw9w4YjVh\n\n{progress}",
                 disable_web_page_preview=True
@@ -176,6 +202,123 @@ class BotMessageHandler:
         except Exception as e:
             logger.error(f"Error updating progress bar: {e}", exc_info=True)
 
+    async def _generate_via_workers(self, progress: ProgressReporter, user_id: int, chat_id: int,
+                                    prompt: str = None, enhanced_prompt: str = None,
+                                    tier: int = TIER_NEW, seed_round: int = 0, deadline: float = None) -> tuple:
+        """
+        Hands the job to the image worker processes and mirrors its state on
+        the progress bar. Returns the enhanced prompt and the images. The job
+        is given up at `deadline`.
+        """
+        # Workers run in other processes, so they get the deadline as wall-clock time
+        time_left = remaining(deadline)
+        job_id = await self.job_queue.enqueue(
+            user_id, chat_id, prompt=prompt, enhanced_prompt=enhanced_prompt, tier=tier, seed_round=seed_round,
+            deadline_at=time.time() + time_left if time_left is not None else None
+        )
+
+        async def on_update(job):
+            if job["status"] == STATUS_QUEUED:
+                # The in-process scheduler does not see worker jobs, so there is no ETA to show
+                position = await self.job_queue.position(job)
+                await progress.set_note(f"⏳ Queue position: {position}")
+            else:
+                await progress.set_note(None)
+                await progress.update(job["progress"])
+
+        job = await self.job_queue.wait(job_id, on_update, deadline)
+        if job["status"] == STATUS_FAILED:
+            error_class = WORKER_ERRORS.get(job["error_type"], ImageGenerationError)
+            raise error_class(job["error"])
+        images = await self.job_queue.take_results(job)
+        if not any(images):
+            raise APIConnectionError("Image worker returned no images")
+        return job["enhanced_prompt"], images
+
+    def _create_progress_reporter(self, status_message) -> ProgressReporter:
+        """
+        Creates a throttled progress reporter bound to the status message.
+        """
+        return ProgressReporter(
+            lambda steps, note: self._update_progress(status_message, steps, note),
+            total_steps=self.TOTAL_STEPS,
+            min_interval=PROGRESS_MIN_INTERVAL
+        )
+
+    async def _generate_images_concurrently(self, enhanced_prompt: str, progress: ProgressReporter,
+                                            user_id: int, tier: int = TIER_NEW, seed_round: int = 0,
+                                            message=None, started: float = None, deadline: float = None) -> tuple:
+        """
+        Waits for a fair-queue slot, then requests all IMAGE_COUNT variants at
+        once and advances the progress bar as each one resolves. Returns the
+        images, with None for failed variants, and the preview messages sent
+        in reply to `message` by index. Time spent queued counts against `deadline`.
+        """
+        async def on_queued(position, eta):
+            await progress.set_note(f"⏳ Queue position: {position} (about {eta:.0f}s)")
+
+        async with enforce(deadline, "image queue"):
+            async with self.image_scheduler.slot(user_id, cost=IMAGE_COUNT, tier=tier, on_queued=on_queued):
+                await progress.set_note(None)
+                return await self._generate_variants(enhanced_prompt, progress, seed_round, message, started, deadline)
+
+    async def _generate_variants(self, enhanced_prompt: str, progress: ProgressReporter, seed_round: int = 0,
+                                 message=None, started: float = None, deadline: float = None) -> tuple:
+        """
+        With IMAGE_PREVIEW_ENABLED, low-step previews of the same seeds are
+        rendered alongside the full images and sent as soon as they are ready,
+        unless the full images arrive first or are all cached.
+        """
+        resolved = 0
+        image_span = self.TOTAL_STEPS - self.PROMPT_STEPS
+
+        async def on_variant(variant):
+            nonlocal resolved
+            resolved += 1
+            await progress.update(self.PROMPT_STEPS + image_span * resolved // IMAGE_COUNT)
+
+        seeds = self.image_service.seeds_for(enhanced_prompt, IMAGE_COUNT, seed_round)
+        full_task = asyncio.create_task(self.image_service.generate_variants(
+            enhanced_prompt, count=IMAGE_COUNT, seeds=seeds, on_variant=on_variant, deadline=deadline
+        ))
+
+        previews = {}
+        if IMAGE_PREVIEW_ENABLED and message is not None and not await self.image_service.is_cached(enhanced_prompt, seeds):
+            preview_task = asyncio.create_task(self.image_service.generate_previews(enhanced_prompt, seeds, deadline))
+            await asyncio.wait({preview_task, full_task}, return_when=asyncio.FIRST_COMPLETED)
+            if full_task.done():
+                preview_task.cancel()
+            else:
+                previews = await self._send_previews(message, await preview_task, started)
+
+        variants = await full_task
+        for variant in variants:
+            if variant.error:
+                logger.warning(f"Variant with seed {variant.seed} failed: {variant.error}")
+        return [variant.image for variant in variants], previews
+
+    async def _send_previews(self, message, images: list, started: float = None) -> dict:
+        """
+        Sends the preview images that succeeded as one media group; returns
+        their messages by index.
+        """
+        indexes = [i for i, image_bio in enumerate(images) if image_bio is not None]
+        if not indexes:
+            return {}
+        try:
+            messages = await self._send_media_group(
+                message,
+                [images[i] for i in indexes],
+                [f"Image {i+1}/{len(images)} · preview, refining..." for i in indexes]
+            )
+        except Exception as e:
+            logger.error(f"Failed to send previews: {e}", exc_info=True)
+            return {}
+        sent = dict(zip(indexes, messages))
+        if started is not None:
+            TIME_TO_FIRST_PIXEL.observe(time.monotonic() - started)
+        return sent
+
     def _create_progress_bar(self, completed: int) -> str:
         """
         Creates a 10-position progress bar.
@@ -185,9 +328,12 @@ class BotMessageHandler:
         percentage = (completed / self.TOTAL_STEPS) * 100
         return f"{filled}{empty} {percentage:.0f}%"
 
-    async def _send_images(self, message, context: ContextTypes.DEFAULT_TYPE, images: list, prompt: str = None, enhanced_prompt: str = None):
+    async def _send_images(self, message, context: ContextTypes.DEFAULT_TYPE, images: list, prompt: str = None,
+                           enhanced_prompt: str = None, previews: dict = None, started: float = None):
         """
-        Sends generated images to the user with a regenerate button.
+        Sends generated images as one media group, then a single summary
+        message with failures, remaining quota and the regenerate button.
+        Images with a preview message replace the preview in place.
         """
         user_id = message.from_user.id
         original_prompt = prompt if prompt else message.text.strip()
@@ -200,54 +346,131 @@ class BotMessageHandler:
         keyboard = [[InlineKeyboardButton("🔄 Regenerate", callback_data="regenerate")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
+        previews = previews or {}
+        captions = [f"Image {i+1}/{len(images)}" for i in range(len(images))]
         successful_count = 0
+        summary = []
 
-        # Send all images
-        for i, image_bio in enumerate(images):
-            if image_bio:
-                try:
-                    # For the last image, attach the regenerate button
-                    if i == len(images) - 1:
-                        await message.reply_photo(
-                            photo=image_bio,
-                            caption=f"Image {i+1}/2",
-                            reply_markup=reply_markup
-                        )
-                    else:
-                        await message.reply_photo(
-                            photo=image_bio,
-                            caption=f"Image {i+1}/2"
-                        )
+        # Images with a preview are swapped into it; the rest go out in one upload
+        fresh = [i for i, image_bio in enumerate(images) if image_bio and i not in previews]
+        if fresh:
+            try:
+                await self._send_media_group(message, [images[i] for i in fresh], [captions[i] for i in fresh])
+                successful_count += len(fresh)
+                if started is not None and not previews:
+                    TIME_TO_FIRST_PIXEL.observe(time.monotonic() - started)
+            except Exception as e:
+                logger.error(f"Failed to send images {[i + 1 for i in fresh]}: {e}", exc_info=True)
+                summary.extend(f"Failed to send Image {i+1}." for i in fresh)
+
+        for i, preview in previews.items():
+            try:
+                if images[i]:
+                    await self._send_photo(message, images[i], captions[i], preview=preview)
                     successful_count += 1
-                except Exception as e:
-                    logger.error(f"Failed to send image {i+1}: {e}", exc_info=True)
-                    await message.reply_text(f"Failed to send Image {i+1}.")
-            else:
-                await message.reply_text(f"Failed to generate Image {i+1}.")
+                else:
+                    await preview.edit_caption(f"{captions[i]} · preview only, the full render failed")
+            except Exception as e:
+                logger.error(f"Failed to replace preview {i+1}: {e}", exc_info=True)
+                summary.append(f"Failed to send Image {i+1}.")
 
-        if successful_count < 2:
-            await message.reply_text(
-                f"Generated {successful_count} out of 2 images successfully."
-            )
+        summary.extend(
+            f"Failed to generate Image {i+1}." for i, image_bio in enumerate(images)
+            if not image_bio and i not in previews
+        )
+
+        if started is not None and successful_count:
+            TIME_TO_FINAL_IMAGE.observe(time.monotonic() - started)
+
+        if successful_count < len(images):
+            summary.append(f"Generated {successful_count} out of {len(images)} images successfully.")
 
         # Inform the user about remaining requests
         try:
-            remaining_requests = self.rate_limiter.get_remaining_requests(user_id)
-            await message.reply_text(f"You have {remaining_requests} image generations remaining today.")
+            remaining_requests = await self.rate_limiter.get_remaining_requests(user_id)
+            summary.append(f"You have {remaining_requests} image generations remaining today.")
         except Exception as e:
             logger.error(f"Error fetching remaining requests for user {user_id}: {e}", exc_info=True)
 
+        await message.reply_text("\n".join(summary) or "Done!", reply_markup=reply_markup)
+
+    async def _send_media_group(self, message, images: list, captions: list) -> list:
+        """
+        Uploads several images in a single call and returns their messages.
+        Images from the cache that were uploaded before are sent by file_id.
+        """
+        if len(images) == 1:
+            return [await self._send_photo(message, images[0], captions[0])]
+
+        cache = self.image_service.cache
+        cache_keys = [getattr(image_bio, 'cache_key', None) if cache else None for image_bio in images]
+        file_ids = [await cache.get_file_id(key) if key else None for key in cache_keys]
+
+        def media(file_ids):
+            return [
+                InputMediaPhoto(media=file_id or image_bio, caption=caption)
+                for image_bio, file_id, caption in zip(images, file_ids, captions)
+            ]
+
+        try:
+            sent = await message.reply_media_group(media=media(file_ids))
+        except BadRequest as e:
+            if not any(file_ids):
+                raise
+            logger.warning(f"Cached file_ids were rejected, uploading the images again: {e}")
+            for key, file_id in zip(cache_keys, file_ids):
+                if file_id:
+                    await cache.set_file_id(key, None)
+            file_ids = [None] * len(images)
+            for image_bio in images:
+                image_bio.seek(0)
+            sent = await message.reply_media_group(media=media(file_ids))
+
+        for key, file_id, sent_message in zip(cache_keys, file_ids, sent):
+            if key and not file_id and sent_message.photo:
+                await cache.set_file_id(key, sent_message.photo[-1].file_id)
+        return list(sent)
+
+    async def _send_photo(self, message, image_bio, caption: str, preview=None):
+        """
+        Sends one image, or swaps it into its `preview` message. An image
+        from the cache that was uploaded before is sent by its file_id.
+        """
+        async def send(photo):
+            if preview is not None:
+                return await preview.edit_media(InputMediaPhoto(media=photo, caption=caption))
+            return await message.reply_photo(photo=photo, caption=caption)
+
+        cache = self.image_service.cache
+        cache_key = getattr(image_bio, 'cache_key', None) if cache else None
+        if cache_key:
+            file_id = await cache.get_file_id(cache_key)
+            if file_id:
+                try:
+                    return await send(file_id)
+                except BadRequest as e:
+                    logger.warning(f"Cached file_id for image {cache_key} was rejected, uploading again: {e}")
+                    await cache.set_file_id(cache_key, None)
+
+        sent = await send(image_bio)
+        if cache_key and sent.photo:
+            await cache.set_file_id(cache_key, sent.photo[-1].file_id)
+        return sent
+
+    @with_deadline(IMAGE_REQUEST_DEADLINE)
     async def handle_regenerate(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         Handles the regenerate button callback.
         """
+        started = time.monotonic()
+        deadline = current_deadline()
         try:
             query = update.callback_query
             user_id = update.effective_user.id
 
             # Check rate limit
-            if not self.rate_limiter.can_make_request(user_id):
-                oldest_request = self.rate_limiter.get_oldest_request_time(user_id)
+            if not await self.rate_limiter.can_make_request(user_id):
+                oldest_request = await self.rate_limiter.get_oldest_request_time(user_id)
                 if oldest_request:
                     reset_time = oldest_request + timedelta(hours=24)
                     remaining_time = reset_time - datetime.now()
@@ -281,30 +504,28 @@ class BotMessageHandler:
             chat_id = update.effective_chat.id
             logger.info(f"User {user_id} in chat {chat_id} regenerating with enhanced prompt: {enhanced_prompt}")
 
-            try:
-                # Initial progress bar
-                await self._update_progress(status_message, 0)
-                await asyncio.sleep(2)
+            # Each regeneration of the user's last prompt uses the next round of seeds
+            seed_round = context.user_data.get('seed_round', 0) + 1
+            context.user_data['seed_round'] = seed_round
 
+            progress = self._create_progress_reporter(status_message)
+            try:
                 # Skip prompt enhancement phase and use stored enhanced prompt
-                await self._update_progress(status_message, 2)
-
-                # Generate both images
-                first_image_task = asyncio.create_task(
-                    self.image_service.generate_single_image(enhanced_prompt)
-                )
-                second_image_task = asyncio.create_task(
-                    self.image_service.generate_single_image(enhanced_prompt)
-                )
-
-                # Update progress while waiting for images
-                for step in range(3, 10):
-                    await asyncio.sleep(1.5)
-                    await self._update_progress(status_message, step)
+                await progress.update(self.PROMPT_STEPS, force=True)
 
-                # Wait for both images to complete
-                images = await asyncio.gather(first_image_task, second_image_task)
-                await self._update_progress(status_message, 10)
+                previews = {}
+                if IMAGE_WORKER_MODE:
+                    _, images = await self._generate_via_workers(
+                        progress, user_id, chat_id, enhanced_prompt=enhanced_prompt,
+                        tier=TIER_REGENERATE, seed_round=seed_round, deadline=deadline
+                    )
+                else:
+                    images, previews = await self._generate_images_concurrently(
+                        enhanced_prompt, progress, user_id, tier=TIER_REGENERATE, seed_round=seed_round,
+                        message=query.message, started=started, deadline=deadline
+                    )
+                await progress.update(self.TOTAL_STEPS)
+                progress.close()
 
                 # Send the regenerated images
                 await self._send_images(
@@ -312,11 +533,14 @@ class BotMessageHandler:
                     context=context,
                     images=images,
                     prompt=original_prompt,
-                    enhanced_prompt=enhanced_prompt
+                    enhanced_prompt=enhanced_prompt,
+                    previews=previews,
+                    started=started
                 )
                 await status_message.delete()
 
             except Exception as e:
+                progress.close()
                 logger.error(f"Error during regeneration for user {user_id}: {e}", exc_info=True)
                 await status_message.edit_text("Failed to regenerate images. Please try again.")
 
@@ -6,58 +6,24 @@ import re
 import traceback
 from telegram import Update
 from telegram.ext import ContextTypes
-from g4f.models import(
-    Model , Blackbox, DDG , Pizzagpt,
-    HuggingChat
-)
-from g4f.Provider import IterListProvider
-from services.unified_ai_client import OpenAIClient,G4FClient,UnifiedAIClient
+from services.unified_ai_client import UnifiedAIClient,STREAM_RESTART
 from services.database import Database
+from services.context_builder import ContextBuilder, token_counts_for
+from services.conversation_summarizer import get_summarizer
+from config.models import get_model
+from config.settings import CHAT_HISTORY_MAX_WORDS, CHAT_SUMMARY_ENABLED, TEXT_REQUEST_DEADLINE
 from telegram.error import RetryAfter, BadRequest
 from utils.markdown_utils import is_markdown_complete
 from utils.helpers import send_or_edit_message
 from rate_limit.limiter import rate_limiter
+from utils.deadline import current_deadline, with_deadline
+from utils.exceptions import DeadlineExceededError
 
 logger = logging.getLogger(__name__)
 
 # Import markdownvn1 if it's a separate module. Assuming it's in utils.
 from utils.markdown_utils import escape_markdown_v2  # Update path if different
 
-MAX_WORDS = 2500
-MAX_REPLY_TOKENS = 1024
-OPENAI_MODEL1 = "Meta-Llama-3.3-70B-Instruct"
-OPENAI_MODEL2 = "Meta-Llama-3.1-70B-Instruct"
-G4F_MODEL = Model(
-    name          = 'gpt-4o-mini',
-    base_provider = 'OpenAI',
-    best_provider = IterListProvider([
-    DDG, Pizzagpt,
-    ])
-)
-# Initialize with specific backend
-client_g4f = UnifiedAIClient(backend="g4f")
-client_openai = UnifiedAIClient(backend="openai")
-
-
-CHUNK_UPDATE_THRESHOLD = 200  # Update every 200 words
-MIN_UPDATE_INTERVAL = 5       # Minimum 5 seconds between updates
-MAX_MESSAGES = 400            # Maximum number of messages
-WINDOW_SECONDS = 43200        # 12 hours
-
-OPENAI_MODEL1 = "Meta-Llama-3.3-70B-Instruct"
-OPENAI_MODEL2 = "Qwen2.5-Coder-32B-Instruct"
-G4F_MODEL = Model(
-    name          = 'gpt-4o-mini',
-    base_provider = 'OpenAI',
-    best_provider = IterListProvider([
-    DDG, Pizzagpt,
-    ])
-)
-# Initialize with specific backend
-client_g4f = UnifiedAIClient(backend="g4f")
-client_openai = UnifiedAIClient(backend="openai")
-
-
 CHUNK_UPDATE_THRESHOLD = 200  # Update every 200 words
 MIN_UPDATE_INTERVAL = 5       # Minimum 5 seconds between updates
 MAX_MESSAGES = 400            # Maximum number of messages
@@ -65,20 +31,14 @@ WINDOW_SECONDS = 43200        # 12 hours
 
 
 @rate_limiter(max_messages=MAX_MESSAGES, window_seconds=WINDOW_SECONDS)
+@with_deadline(TEXT_REQUEST_DEADLINE)
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     db: Database = context.bot_data['db']
-    model = context.user_data.get('model')
-
-    logger.info(f"Selected model: {getattr(model, 'name', model)}")
-    logger.info(f"Model type: {type(model)}")
+    model = get_model(context.user_data.get('model'))
+    model_name = model.name
+    logger.info(f"Selected model: {model_name} (backends: {', '.join(model.backends)})")
 
-    # Get the AI client from bot_data or create a new one with correct backend
-    if isinstance(model, Model):  # G4F model
-        unified_ai_client = UnifiedAIClient(backend="g4f")
-        logger.info("Using G4F backend")
-    else:  # OpenAI models
-        unified_ai_client = UnifiedAIClient(backend="openai")
-        logger.info("Using OpenAI backend")
+    unified_ai_client: UnifiedAIClient = context.bot_data['ai_client']
 
     try:
         message = update.message
@@ -88,14 +48,14 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_first_name = user.first_name if user.first_name else "Unknown"
         user_username = user.username if user.username else "Unknown"
 
-        logger.info(f"Processing message with model: {getattr(model, 'name', model)}")
+        logger.info(f"Processing message with model: {model_name}")
 
         # Update chat metadata
         await db.update_chat_metadata(chat_id, user_first_name, user_username)
 
         # Insert user's message
         timestamp = asyncio.get_event_loop().time()
-        await db.insert_message(chat_id, timestamp, "user", user_input)
+        await db.insert_message(chat_id, timestamp, "user", user_input, token_counts_for(model_name, user_input))
 
         # Get history_cleared_at
         history_cleared_at = await db.get_chat_history_cleared_at(chat_id)
@@ -104,12 +64,12 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         total_words = await db.get_total_words(chat_id, history_cleared_at)
         logger.info(f"Total words in chat {chat_id}: {total_words}")
 
-        if total_words > MAX_WORDS:
+        if total_words > CHAT_HISTORY_MAX_WORDS:
             logger.info(f"Chat {chat_id} exceeds word limit. Trimming history.")
-            await db.trim_chat_history(chat_id, history_cleared_at, MAX_WORDS)
+            await db.trim_chat_history(chat_id, history_cleared_at, CHAT_HISTORY_MAX_WORDS)
 
-        # Get chat history
-        chat_history = await db.get_chat_history(chat_id, history_cleared_at, MAX_WORDS)
+        # Get as much recent history as the model's context window holds
+        chat_history = await ContextBuilder(db).build(chat_id, history_cleared_at, model_name, model.max_output_tokens)
 
         # Indicate typing
         await context.bot.send_chat_action(chat_id=chat_id, action="typing")
@@ -122,12 +82,20 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         last_update_time = 0
 
         async for chunk in unified_ai_client.generate_response(
-            model=model,  # Use the selected model
+            model=model_name,
             messages=chat_history,
-            temperature=0.75,
-            max_tokens=MAX_REPLY_TOKENS,
-            top_p=0.60
+            temperature=model.temperature,
+            max_tokens=model.max_output_tokens,
+            top_p=model.top_p,
+            deadline=current_deadline()
         ):
+            if chunk is STREAM_RESTART:
+                # The backend failed mid-answer and the reply starts over; the
+                # sent message is overwritten by the next update
+                reply_text = ""
+                chunk_buffer = ""
+                word_count = 0
+                continue
 
             reply_text += chunk
             chunk_buffer += chunk
@@ -190,8 +158,18 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             message_obj = await send_or_edit_message(context, update, message_obj, escaped_text, message_sent)
 
         # Insert bot's response
-        await db.insert_message(update.effective_chat.id, asyncio.get_event_loop().time(), "bot", reply_text)
-
+        await db.insert_message(
+            update.effective_chat.id, asyncio.get_event_loop().time(), "bot", reply_text,
+            token_counts_for(model_name, reply_text)
+        )
+
+        # Fold older turns into the chat's summary, off the request path
+        if CHAT_SUMMARY_ENABLED:
+            get_summarizer(db).schedule(chat_id, history_cleared_at, model_name, unified_ai_client)
+
+    except DeadlineExceededError as e:
+        logger.error(f"Reply in chat {update.effective_chat.id} ran out of time: {e}")
+        await update.message.reply_text("The answer took too long. Please try again.")
     except Exception as e:
         logger.error(f"An unexpected error occurred: {e}")
         traceback.print_exc()
@@ -0,0 +1,153 @@
+# image_worker.py
+#
+# Image worker process for IMAGE_WORKER_MODE. Start one or more next to the
+# bot; each claims jobs from the shared SQLite queue, runs prompt enhancement
+# and image generation, and spools the results back for the bot to deliver.
+#
+#   python image_worker.py --concurrency 2
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import time
+from config.settings import (
+    IMAGE_COUNT, IMAGE_WORKER_CONCURRENCY, IMAGE_QUEUE_POLL_INTERVAL, IMAGE_JOB_HEARTBEAT_INTERVAL
+)
+from handlers.message_handlers import BotMessageHandler
+from services.image_service import ImageService, shutdown_encode_pool
+from services.job_queue import ImageJobQueue
+from services.together_client import close_together_client
+from services.translation_service import TranslationService
+from utils.deadline import deadline_scope, enforce
+from utils.exceptions import (
+    APIConnectionError, DeadlineExceededError, InvalidPromptError, NSFWContentError, PromptRefusedError
+)
+from utils.logging_config import setup_logging
+from utils.sqlite_engine import close_engines
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+ERROR_TYPES = (
+    (NSFWContentError, "nsfw"),
+    (InvalidPromptError, "invalid"),
+    (PromptRefusedError, "refused"),
+    (APIConnectionError, "connection"),
+    (DeadlineExceededError, "deadline"),
+)
+
+
+def error_type(error: Exception) -> str:
+    for error_class, name in ERROR_TYPES:
+        if isinstance(error, error_class):
+            return name
+    return "error"
+
+
+async def process_job(job, queue: ImageJobQueue, translation_service: TranslationService, image_service: ImageService):
+    """
+    Runs the job within its deadline, which every upstream call inherits.
+    """
+    if job["deadline_at"] is None:
+        return await run_job(job, queue, translation_service, image_service)
+    seconds = job["deadline_at"] - time.time()
+    if seconds <= 0:
+        raise DeadlineExceededError("The job's deadline passed before it started")
+    with deadline_scope(seconds):
+        async with enforce(None, "image worker"):
+            await run_job(job, queue, translation_service, image_service)
+
+
+async def run_job(job, queue: ImageJobQueue, translation_service: TranslationService, image_service: ImageService):
+    prompt_steps = BotMessageHandler.PROMPT_STEPS
+    image_span = BotMessageHandler.TOTAL_STEPS - prompt_steps
+
+    enhanced_prompt = job["enhanced_prompt"]
+    if enhanced_prompt is None:
+        enhanced_prompt = await translation_service.enhance_prompt(job["prompt"])
+    await queue.update_progress(job["id"], prompt_steps, enhanced_prompt)
+
+    resolved = 0
+
+    async def on_variant(variant):
+        nonlocal resolved
+        resolved += 1
+        await queue.update_progress(job["id"], prompt_steps + image_span * resolved // IMAGE_COUNT)
+
+    variants = await image_service.generate_variants(
+        enhanced_prompt, count=IMAGE_COUNT, on_variant=on_variant, seed_round=job["seed_round"]
+    )
+    await queue.complete(job["id"], enhanced_prompt, [variant.image for variant in variants])
+
+
+async def heartbeat(job_id: int, queue: ImageJobQueue, work: asyncio.Task) -> bool:
+    """
+    Refreshes the job while it runs, so renders that report no progress for
+    a while are not requeued as stale and run twice. Once the job is no
+    longer running (the bot gave up on it), `work` is cancelled and True
+    returned.
+    """
+    while True:
+        await asyncio.sleep(IMAGE_JOB_HEARTBEAT_INTERVAL)
+        try:
+            if not await queue.heartbeat(job_id):
+                work.cancel()
+                return True
+        except Exception as e:
+            logger.error(f"Heartbeat of image job {job_id} failed: {e}")
+
+
+async def run_worker(name: str, queue: ImageJobQueue, translation_service: TranslationService, image_service: ImageService):
+    while True:
+        job = await queue.claim(name)
+        if job is None:
+            await asyncio.sleep(IMAGE_QUEUE_POLL_INTERVAL)
+            continue
+
+        logger.info(f"Worker {name} processing image job {job['id']} of user {job['user_id']}")
+        work = asyncio.create_task(process_job(job, queue, translation_service, image_service))
+        beat = asyncio.create_task(heartbeat(job["id"], queue, work))
+        try:
+            await work
+        except asyncio.CancelledError:
+            if not (beat.done() and not beat.cancelled() and beat.result()):
+                raise
+            logger.info(f"Stopped image job {job['id']}: nobody waits for it any more")
+        except Exception as e:
+            logger.error(f"Image job {job['id']} failed: {e}", exc_info=True)
+            await queue.fail(job["id"], error_type(e), str(e))
+        finally:
+            beat.cancel()
+
+
+async def main(concurrency: int):
+    queue = ImageJobQueue()
+    await queue.init_schema()
+    translation_service = TranslationService()
+    image_service = ImageService()
+    if image_service.cache:
+        await image_service.cache.init_schema()
+    if translation_service.cache:
+        await translation_service.cache.init_schema()
+
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    logger.info(f"Image worker {prefix} started with concurrency {concurrency}")
+    try:
+        await asyncio.gather(*(
+            run_worker(f"{prefix}:{slot}", queue, translation_service, image_service)
+            for slot in range(concurrency)
+        ))
+    finally:
+        await close_engines()
+        await close_together_client()
+        shutdown_encode_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run image generation workers.")
+    parser.add_argument("--concurrency", type=int, default=IMAGE_WORKER_CONCURRENCY,
+                        help="Jobs processed at once by this process")
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency))
@@ -2,18 +2,38 @@
 from services.database import Database
 from services.openai_client import OpenAIClient
 from services.unified_ai_client import UnifiedAIClient  # Ensure the correct import path
+from services.image_service import shutdown_encode_pool
+from services.together_client import close_together_client
 from utils.rate_limiter import RateLimiter
+from utils.sqlite_engine import get_engine, close_engines
 from handlers.message_handlers import BotMessageHandler
 
 # initializers.py
 def initialize_services(mongo_uri):
     db = Database(mongo_uri)
     openai_client = OpenAIClient()
-    unified_ai_client = UnifiedAIClient()
+    # Runs every backend; each chat model picks its own and its fallbacks from config.models
+    unified_ai_client = UnifiedAIClient(backend="auto")
     rate_limiter = RateLimiter(max_requests=50, time_window=24*3600)
     bot_handler = BotMessageHandler(rate_limiter=rate_limiter)
     # Match the order used in main.py:
     return db, openai_client, unified_ai_client, rate_limiter, bot_handler
 
-async def run_startup_tasks(db_instance: Database):
-    await db_instance.create_indexes()
\ No newline at end of file
+async def run_startup_tasks(db_instance: Database, bot_handler: BotMessageHandler):
+    await db_instance.create_indexes()
+    await get_engine().start()
+    await bot_handler.rate_limiter.init_schema()
+    await bot_handler.prompt_storage.init_schema()
+    if bot_handler.translation_service.cache:
+        await bot_handler.translation_service.cache.init_schema()
+    if bot_handler.image_service.cache:
+        await bot_handler.image_service.cache.init_schema()
+    if bot_handler.job_queue:
+        await bot_handler.job_queue.init_schema()
+
+async def run_shutdown_tasks(unified_ai_client: UnifiedAIClient, openai_client: OpenAIClient):
+    await unified_ai_client.close()
+    await openai_client.close()
+    await close_engines()
+    await close_together_client()
+    shutdown_encode_pool()
\ No newline at end of file
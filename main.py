@@ -4,7 +4,8 @@ from fastapi import FastAPI, Response, status
 from telegram.ext import Application
 from config.settings import BOT_TOKEN, MONGO_URI, WEBHOOK_URL, PORT, WEBHOOK_PATH
 from utils.logging_config import setup_logging
-from initializers import initialize_services, run_startup_tasks
+from utils.metrics import render_metrics
+from initializers import initialize_services, run_startup_tasks, run_shutdown_tasks
 from handler_registry import register_handlers
 from handlers.dispatchers import mode_dispatcher
 import uvicorn
@@ -25,7 +26,7 @@ async def setup_webhook():
     db, openai_client, unified_ai_client, rate_limiter, bot_handler = initialize_services(MONGO_URI)
 
     # Run startup tasks
-    await run_startup_tasks(db)
+    await run_startup_tasks(db, bot_handler)
 
     # Initialize the Application
     application = Application.builder().token(BOT_TOKEN).build()
@@ -61,6 +62,7 @@ async def startup():
 async def shutdown():
     if application:
         await application.bot.delete_webhook()
+        await run_shutdown_tasks(application.bot_data['ai_client'], application.bot_data['openai_client'])
         await application.shutdown()
     logger.info("Bot shutdown complete")
 
@@ -73,6 +75,10 @@ async def health_check():
         content="Bot not initialized"
     )
 
+@app.get("/metrics")
+async def metrics():
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.post(WEBHOOK_PATH)
 async def webhook_handler(update: dict):
     if application:
@@ -0,0 +1,109 @@
+# services/context_builder.py
+
+from typing import Any, Dict, List, Optional, Tuple
+from config.models import find_model
+from config.settings import DEFAULT_CONTEXT_TOKENS, CHAT_SUMMARY_ENABLED
+from utils.logging_config import logger
+from utils.token_counter import TokenCounter, get_token_counter
+
+# How the running summary of a chat is presented to the model
+SUMMARY_CONTEXT = "Summary of the earlier conversation:\n{summary}"
+
+
+def context_for(model_name: str) -> Tuple[int, TokenCounter]:
+    """
+    Context window in tokens and the token counter of `model_name`.
+    """
+    spec = find_model(model_name)
+    if spec is None:
+        return DEFAULT_CONTEXT_TOKENS, get_token_counter("estimate")
+    return spec.context_tokens, get_token_counter(spec.tokenizer)
+
+
+def token_counts_for(model_name: str, text: str) -> Dict[str, int]:
+    """
+    Token count of a message to store with it, keyed by tokenizer name.
+    """
+    _, counter = context_for(model_name)
+    return {counter.name: counter.count_message(text)}
+
+
+def message_tokens(message: Dict[str, Any], counter: TokenCounter, missing_counts: Dict[Any, int]) -> int:
+    """
+    Cached token count of a stored message; counts that had to be computed
+    are added to `missing_counts` by message id, to be stored afterwards.
+    """
+    tokens = message.get("token_counts", {}).get(counter.name)
+    if tokens is None:
+        tokens = counter.count_message(message["content"])
+        missing_counts[message["_id"]] = tokens
+    return tokens
+
+
+async def store_token_counts(db, chat_id: int, counter: TokenCounter, missing_counts: Dict[Any, int]):
+    if not missing_counts:
+        return
+    try:
+        await db.set_token_counts(counter.name, missing_counts)
+    except Exception as e:
+        logger.error(f"Failed to store token counts for chat {chat_id}: {e}")
+
+
+class ContextBuilder:
+    """
+    Fills a model's context window with the most recent turns of a chat,
+    leaving `reply_tokens` free for the answer. Token counts are cached on
+    the stored messages per tokenizer, so each message is counted once.
+
+    With CHAT_SUMMARY_ENABLED, turns already folded into the chat's running
+    summary are replaced by the summary, sent first as a system message.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def build(self, chat_id: int, history_cleared_at, model_name: str,
+                    reply_tokens: int) -> List[Dict[str, Any]]:
+        window, counter = context_for(model_name)
+        budget = window - reply_tokens
+
+        summary = await self._summary(chat_id)
+        if summary:
+            summary_tokens = summary.get("token_counts", {}).get(counter.name)
+            if summary_tokens is None:
+                summary_tokens = counter.count_message(SUMMARY_CONTEXT.format(summary=summary["content"]))
+            budget -= summary_tokens
+        messages = await self.db.get_messages(chat_id, history_cleared_at, summary["until"] if summary else None)
+
+        selected = []
+        used = 0
+        missing_counts = {}
+        for message in reversed(messages):
+            tokens = message_tokens(message, counter, missing_counts)
+            # The newest message is always sent, even if it alone exceeds the budget
+            if selected and used + tokens > budget:
+                break
+            selected.append(message)
+            used += tokens
+        await store_token_counts(self.db, chat_id, counter, missing_counts)
+
+        logger.info(
+            f"Context for chat {chat_id}: {'summary + ' if summary else ''}{len(selected)}/{len(messages)} "
+            f"messages, {used}/{budget} tokens ({counter.name})"
+        )
+        context = [
+            {"role": "user" if message["sender"] == "user" else "assistant", "content": message["content"]}
+            for message in reversed(selected)
+        ]
+        if summary:
+            context.insert(0, {"role": "system", "content": SUMMARY_CONTEXT.format(summary=summary["content"])})
+        return context
+
+    async def _summary(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        if not CHAT_SUMMARY_ENABLED:
+            return None
+        try:
+            return await self.db.get_chat_summary(chat_id)
+        except Exception as e:
+            logger.error(f"Failed to load the summary of chat {chat_id}: {e}")
+            return None
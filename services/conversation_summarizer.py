@@ -0,0 +1,124 @@
+# services/conversation_summarizer.py
+
+import asyncio
+import contextvars
+from typing import Dict, Optional
+from config.settings import (
+    CHAT_SUMMARY_TRIGGER_TOKENS, CHAT_SUMMARY_KEEP_MESSAGES, CHAT_SUMMARY_MAX_TOKENS, CHAT_SUMMARY_DEADLINE
+)
+from services.context_builder import (
+    SUMMARY_CONTEXT, context_for, message_tokens, store_token_counts, token_counts_for
+)
+from services.unified_ai_client import STREAM_RESTART
+from utils.deadline import deadline_scope
+from utils.logging_config import logger
+from utils.metrics import counter
+
+COMPACTIONS = counter("chat_summary_compactions_total", "Older chat turns folded into a running summary")
+COMPACTED_MESSAGES = counter("chat_summary_messages_total", "Chat messages folded into running summaries")
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain the running summary of a chat between a user and an assistant. "
+    "Merge the new messages into the current summary. Keep facts about the user, names, decisions, "
+    "code identifiers and open questions the assistant may need later; drop greetings and small talk. "
+    "Write in the language of the conversation, in at most {words} words. Return ONLY the summary."
+)
+
+
+class ConversationSummarizer:
+    """
+    Folds the older turns of long chats into a stored running summary, in a
+    background task after the reply has been sent. The most recent
+    CHAT_SUMMARY_KEEP_MESSAGES messages are never folded, so they always
+    reach the model verbatim.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._running: Dict[int, asyncio.Task] = {}
+
+    def schedule(self, chat_id: int, history_cleared_at, model, client):
+        """
+        Starts a compaction of `chat_id` unless one is already running.
+        """
+        if chat_id in self._running:
+            return
+        # A fresh context, so the compaction is not bound by the deadline of the update that scheduled it
+        task = asyncio.create_task(
+            self._compact_in_scope(chat_id, history_cleared_at, model, client), context=contextvars.Context()
+        )
+        self._running[chat_id] = task
+        task.add_done_callback(lambda _: self._running.pop(chat_id, None))
+
+    async def _compact_in_scope(self, chat_id: int, history_cleared_at, model, client):
+        with deadline_scope(CHAT_SUMMARY_DEADLINE):
+            await self.compact(chat_id, history_cleared_at, model, client)
+
+    async def compact(self, chat_id: int, history_cleared_at, model, client) -> bool:
+        """
+        Folds the oldest unsummarized turns into the summary once they exceed
+        CHAT_SUMMARY_TRIGGER_TOKENS. Returns whether the summary was updated.
+        """
+        try:
+            model_name = getattr(model, 'name', model)
+            window, token_counter = context_for(model_name)
+            summary = await self.db.get_chat_summary(chat_id)
+            messages = await self.db.get_messages(chat_id, history_cleared_at, summary["until"] if summary else None)
+
+            missing_counts = {}
+            tokens = [message_tokens(message, token_counter, missing_counts) for message in messages]
+            await store_token_counts(self.db, chat_id, token_counter, missing_counts)
+            older = messages[:max(0, len(messages) - CHAT_SUMMARY_KEEP_MESSAGES)]
+            if not older or sum(tokens) < CHAT_SUMMARY_TRIGGER_TOKENS:
+                return False
+
+            # Fold no more than one request can hold; the rest waits for the next compaction
+            budget = window - 2 * CHAT_SUMMARY_MAX_TOKENS - token_counter.count(SUMMARY_INSTRUCTIONS)
+            batch = []
+            used = 0
+            for message, count in zip(older, tokens):
+                if batch and used + count > budget:
+                    break
+                batch.append(message)
+                used += count
+
+            content = await self._summarize(client, model, summary["content"] if summary else None, batch)
+            if not content:
+                return False
+            await self.db.set_chat_summary(
+                chat_id, content, batch[-1]["timestamp"],
+                token_counts_for(model_name, SUMMARY_CONTEXT.format(summary=content))
+            )
+            COMPACTIONS.inc()
+            COMPACTED_MESSAGES.inc(len(batch))
+            logger.info(f"Folded {len(batch)} messages ({used} tokens) of chat {chat_id} into its summary")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to compact chat {chat_id}: {e}")
+            return False
+
+    @staticmethod
+    async def _summarize(client, model, summary: Optional[str], batch: list) -> str:
+        transcript = "\n\n".join(
+            f"{'User' if message['sender'] == 'user' else 'Assistant'}: {message['content']}" for message in batch
+        )
+        messages = [
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS.format(words=CHAT_SUMMARY_MAX_TOKENS * 3 // 4)},
+            {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+        ]
+        content = ""
+        async for chunk in client.generate_response(
+            model=model, messages=messages, temperature=0.2, max_tokens=CHAT_SUMMARY_MAX_TOKENS
+        ):
+            content = "" if chunk is STREAM_RESTART else content + chunk
+        return content.strip()
+
+
+_summarizer: Optional[ConversationSummarizer] = None
+
+
+def get_summarizer(db) -> ConversationSummarizer:
+    global _summarizer
+    if _summarizer is None:
+        _summarizer = ConversationSummarizer(db)
+    return _summarizer
@@ -90,13 +90,16 @@ class Database:
             upsert=True
         )
 
-    async def insert_message(self, chat_id, timestamp, sender, content):
-        await self.messages_collection.insert_one({
+    async def insert_message(self, chat_id, timestamp, sender, content, token_counts=None):
+        message = {
             "chat_id": chat_id,
             "timestamp": timestamp,
             "sender": sender,
             "content": content
-        })
+        }
+        if token_counts:
+            message["token_counts"] = token_counts
+        await self.messages_collection.insert_one(message)
 
     async def get_chat_history_cleared_at(self, chat_id):
         chat_doc = await self.chats_collection.find_one({"chat_id": chat_id})
@@ -105,7 +108,20 @@ class Database:
     async def clear_chat_history(self, chat_id, current_time):
         await self.chats_collection.update_one(
             {"chat_id": chat_id},
-            {"$set": {"history_cleared_at": current_time}},
+            {"$set": {"history_cleared_at": current_time}, "$unset": {"summary": ""}},
+            upsert=True
+        )
+
+    async def get_chat_summary(self, chat_id):
+        """The running summary of a chat: {"content", "until", "token_counts"}, or None"""
+        chat_doc = await self.chats_collection.find_one({"chat_id": chat_id}, {"summary": 1})
+        return chat_doc.get("summary") if chat_doc else None
+
+    async def set_chat_summary(self, chat_id, content, until, token_counts):
+        """Stores the summary of every message up to the timestamp `until`"""
+        await self.chats_collection.update_one(
+            {"chat_id": chat_id},
+            {"$set": {"summary": {"content": content, "until": until, "token_counts": token_counts}}},
             upsert=True
         )
 
@@ -168,6 +184,22 @@ class Database:
 
         return chat_history
 
+    async def get_messages(self, chat_id, history_cleared_at, after=None):
+        """Messages of a chat since its history was cleared (and after `after`), oldest first"""
+        query = {"chat_id": chat_id}
+        since = [timestamp for timestamp in (history_cleared_at, after) if timestamp]
+        if since:
+            query["timestamp"] = {"$gt": max(since)}
+        cursor = self.messages_collection.find(query).sort("timestamp", pymongo.ASCENDING)
+        return await cursor.to_list(length=None)
+
+    async def set_token_counts(self, tokenizer, counts):
+        """Caches token counts, given by message id, for one tokenizer"""
+        await self.messages_collection.bulk_write([
+            pymongo.UpdateOne({"_id": message_id}, {"$set": {f"token_counts.{tokenizer}": tokens}})
+            for message_id, tokens in counts.items()
+        ], ordered=False)
+
     async def reset_collections(self):
         try:
             await self.chats_collection.drop()
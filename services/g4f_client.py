@@ -1,6 +1,7 @@
 #g4f_client.py
 import os
 import logging
+import time
 from typing import List, Dict, Any, Union
 from dotenv import load_dotenv
 from g4f.client import AsyncClient
@@ -9,6 +10,9 @@ from g4f.models import(
     Model, Blackbox, DDG, HuggingChat, Pizzagpt
 )
 from g4f.Provider import IterListProvider
+from config.settings import G4F_RANKING_ENABLED
+from utils.provider_ranker import get_provider_ranker
+from utils.quota_shaper import get_shaper, is_rate_limit_error, retry_after_from
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -17,6 +21,8 @@ logger = logging.getLogger(__name__)
 class G4FClient:
     def __init__(self):
         self.client = AsyncClient()
+        self.shaper = get_shaper("g4f")
+        self.ranker = get_provider_ranker()
 
     async def generate_response(
         self, 
@@ -27,15 +33,54 @@ class G4FClient:
         top_p: float = 0.60, 
         stop: List[str] = ["<|eot_id|>", "<|eom_id|>"]
     ):
-        try:
-            # If model is a Model object, use its provider directly
-            if isinstance(model, Model):
-                provider = model.best_provider
-                model_name = model.name
-            else:
-                model_name = model
-                provider = None
+        # If model is a Model object, use its provider directly
+        if isinstance(model, Model):
+            provider = model.best_provider
+            model_name = model.name
+        else:
+            model_name = model
+            provider = None
+
+        if not (G4F_RANKING_ENABLED and isinstance(provider, IterListProvider)):
+            async for content in self._stream(model_name, provider, messages, temperature, max_tokens, top_p, stop):
+                yield content
+            return
+
+        # Try the providers of the list one by one, best ranked first, so each gets measured
+        providers = {p.__name__: p for p in provider.providers}
+        last_error = None
+        for name in self.ranker.order(list(providers)):
+            started = time.monotonic()
+            first_chunk_at = None
+            chars = 0
+            try:
+                async for content in self._stream(
+                    model_name, providers[name], messages, temperature, max_tokens, top_p, stop
+                ):
+                    if first_chunk_at is None:
+                        first_chunk_at = time.monotonic()
+                    chars += len(content)
+                    yield content
+            except Exception as e:
+                self.ranker.record_failure(name)
+                if first_chunk_at is not None:
+                    raise
+                last_error = e
+                continue
+            if first_chunk_at is None:
+                # An empty answer counts as a failure, as it does for IterListProvider
+                self.ranker.record_failure(name)
+                continue
+            self.ranker.record_success(
+                name, first_chunk_at - started, chars, time.monotonic() - first_chunk_at
+            )
+            return
+        raise last_error or RuntimeError("No g4f provider returned a response")
 
+    async def _stream(self, model_name: str, provider, messages: List[Dict[str, Any]],
+                      temperature: float, max_tokens: int, top_p: float, stop: List[str]):
+        try:
+            await self.shaper.acquire()
             response = await self.client.chat.completions.create(
                 model=model_name,
                 messages=messages,
@@ -52,6 +97,8 @@ class G4FClient:
                     yield chunk.choices[0].delta.content
 
         except Exception as e:
+            if is_rate_limit_error(e):
+                self.shaper.record_rate_limited(retry_after_from(e))
             logger.error(f"Error generating G4F response: {e}")
             raise
     async def close(self):
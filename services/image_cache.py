@@ -0,0 +1,169 @@
+# services/image_cache.py
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import time
+from typing import List, Optional
+from config.settings import (
+    MODEL_NAME, IMAGE_WIDTH, IMAGE_HEIGHT, IMAGE_STEPS,
+    IMAGE_OUTPUT_FORMAT, IMAGE_OUTPUT_QUALITY,
+    IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES
+)
+from utils.logging_config import logger
+from utils.sqlite_engine import SQLiteEngine, get_engine
+
+
+async def _create_image_cache(db):
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS image_cache (
+            key TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            file_id TEXT,
+            last_access REAL NOT NULL
+        )
+    ''')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_image_cache_access ON image_cache (last_access)')
+
+
+def image_cache_key(enhanced_prompt: str, seed: int) -> str:
+    """
+    Content address of one generated image: everything that decides its bytes.
+    """
+    settings = [
+        enhanced_prompt, MODEL_NAME, IMAGE_WIDTH, IMAGE_HEIGHT, IMAGE_STEPS, seed,
+        IMAGE_OUTPUT_FORMAT, IMAGE_OUTPUT_QUALITY
+    ]
+    return hashlib.sha256(json.dumps(settings).encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    """
+    On-disk cache of generated images, shared by the bot and image workers.
+
+    Images are stored under their content address (see image_cache_key) and
+    indexed in SQLite with their size, last access time and, once uploaded,
+    the Telegram file_id, so a hit can be re-sent without uploading again.
+    The cache is bounded to `max_bytes`; the least recently used entries are
+    evicted first.
+    """
+
+    MIGRATIONS = [_create_image_cache]
+
+    def __init__(self, engine: SQLiteEngine = None, cache_dir: str = IMAGE_CACHE_DIR,
+                 max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.engine = engine or get_engine()
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    async def init_schema(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        await self.engine.migrate('image_cache', self.MIGRATIONS)
+
+    async def get(self, key: str) -> Optional[io.BytesIO]:
+        """
+        Returns the cached image tagged with its `cache_key`, or None.
+        """
+        row = await self.engine.fetchone('SELECT filename FROM image_cache WHERE key = ?', (key,))
+        if row is None:
+            return None
+
+        try:
+            data = await asyncio.to_thread(self._read_file, os.path.join(self.cache_dir, row[0]))
+        except OSError as e:
+            logger.warning(f"Dropping unreadable image cache entry {key}: {e}")
+            await self.engine.execute('DELETE FROM image_cache WHERE key = ?', (key,))
+            return None
+
+        await self.engine.execute(
+            'UPDATE image_cache SET last_access = ? WHERE key = ?', (time.time(), key)
+        )
+        bio = io.BytesIO(data)
+        bio.name = row[0].split("_", 1)[1]
+        bio.cache_key = key
+        return bio
+
+    async def put(self, key: str, image: io.BytesIO):
+        """
+        Stores an image, tags it with its `cache_key` and evicts old entries
+        beyond the size bound.
+        """
+        data = image.getvalue()
+        filename = f"{key}_{image.name}"
+        await asyncio.to_thread(self._write_file, os.path.join(self.cache_dir, filename), data)
+
+        async def job(db):
+            await db.execute('''
+                INSERT INTO image_cache (key, filename, size, last_access) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    filename = excluded.filename, size = excluded.size, last_access = excluded.last_access
+            ''', (key, filename, len(data), time.time()))
+            return await self._evict(db)
+
+        evicted = await self.engine.write(job)
+        image.cache_key = key
+        if evicted:
+            await asyncio.to_thread(self._remove_files, evicted)
+            logger.info(f"Evicted {len(evicted)} images from the image cache.")
+
+    async def contains(self, key: str) -> bool:
+        return await self.engine.fetchone('SELECT 1 FROM image_cache WHERE key = ?', (key,)) is not None
+
+    async def get_file_id(self, key: str) -> Optional[str]:
+        row = await self.engine.fetchone('SELECT file_id FROM image_cache WHERE key = ?', (key,))
+        return row[0] if row else None
+
+    async def set_file_id(self, key: str, file_id: Optional[str]):
+        """
+        Remembers (or, with None, forgets) the Telegram file_id of an uploaded image.
+        """
+        await self.engine.execute('UPDATE image_cache SET file_id = ? WHERE key = ?', (file_id, key))
+
+    async def _evict(self, db) -> List[str]:
+        async with db.execute('SELECT COALESCE(SUM(size), 0) FROM image_cache') as cursor:
+            total = (await cursor.fetchone())[0]
+        if total <= self.max_bytes:
+            return []
+
+        evicted = []
+        async with db.execute('SELECT key, filename, size FROM image_cache ORDER BY last_access ASC') as cursor:
+            async for key, filename, size in cursor:
+                if total <= self.max_bytes:
+                    break
+                evicted.append((key, filename))
+                total -= size
+        await db.executemany('DELETE FROM image_cache WHERE key = ?', [(key,) for key, _ in evicted])
+        return [os.path.join(self.cache_dir, filename) for _, filename in evicted]
+
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def _write_file(path: str, data: bytes):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _remove_files(paths: List[str]):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+_image_cache: Optional[ImageCache] = None
+
+
+def get_image_cache() -> ImageCache:
+    global _image_cache
+    if _image_cache is None:
+        _image_cache = ImageCache()
+    return _image_cache
@@ -0,0 +1,170 @@
+# services/image_scheduler.py
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+from utils.logging_config import logger
+
+# Priority tiers, lower is served first
+TIER_NEW = 0
+TIER_REGENERATE = 1
+
+# Weight of the newest sample in the latency moving average
+LATENCY_ALPHA = 0.2
+
+QueueCallback = Callable[[int, float], Awaitable[None]]
+
+
+class ImageJob:
+    def __init__(self, user_id: int, cost: int, tier: int):
+        self.user_id = user_id
+        self.cost = cost
+        self.tier = tier
+        self.admitted = False
+        self.changed = asyncio.Event()
+
+
+class ImageJobScheduler:
+    """
+    Admits image jobs to a fixed number of slots with per-user fairness.
+
+    Within a tier users are served by deficit round robin: each visit adds
+    `quantum` to the user's deficit and a job runs once the deficit covers its
+    cost (its number of images), after which the user moves to the back of the
+    rotation. Higher tiers always go first, and a user never holds more than
+    `max_per_user` slots, so one user spamming Regenerate only queues behind
+    themselves.
+    """
+
+    def __init__(self, slots: int, max_per_user: int, quantum: int, initial_latency: float, tiers: int = 2):
+        self.slots = slots
+        self.max_per_user = max_per_user
+        self.quantum = quantum
+        self.latency = initial_latency
+        self._tiers: List["OrderedDict[int, Deque[ImageJob]]"] = [OrderedDict() for _ in range(tiers)]
+        self._deficit: Dict[tuple, int] = {}
+        self._in_flight: Dict[int, int] = {}
+        self._running = 0
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, cost: int = 1, tier: int = TIER_NEW, on_queued: Optional[QueueCallback] = None):
+        """
+        Waits for a slot, reporting (position, eta_seconds) through `on_queued`
+        whenever the job's place in the queue changes.
+        """
+        job = ImageJob(user_id, cost, min(tier, len(self._tiers) - 1))
+        self._tiers[job.tier].setdefault(user_id, deque()).append(job)
+        self._dispatch()
+
+        try:
+            last_position = None
+            while not job.admitted:
+                position = self.position(job)
+                if on_queued and position != last_position:
+                    last_position = position
+                    await on_queued(position, self.eta(position))
+                if not job.admitted:
+                    await job.changed.wait()
+                    job.changed.clear()
+        except BaseException:
+            if job.admitted:
+                self._release(job, None)
+            else:
+                self._remove(job)
+            raise
+
+        started = time.monotonic()
+        try:
+            yield job
+        finally:
+            self._release(job, time.monotonic() - started)
+
+    def position(self, job: ImageJob) -> int:
+        """
+        Approximate 1-based queue position of a waiting job under round robin:
+        everything in higher tiers, plus up to as many jobs of each other user
+        in the same tier as this user has ahead of `job`.
+        """
+        ahead = sum(len(jobs) for queues in self._tiers[:job.tier] for jobs in queues.values())
+        queues = self._tiers[job.tier]
+        own = queues.get(job.user_id, ())
+        index = own.index(job) if job in own else 0
+        before_user = True
+        for user_id, jobs in queues.items():
+            if user_id == job.user_id:
+                before_user = False
+                continue
+            ahead += min(len(jobs), index + (1 if before_user else 0))
+        return ahead + index + 1
+
+    def eta(self, position: int) -> float:
+        """
+        Seconds until a job at `position` starts, from measured job latency.
+        """
+        return self.latency * math.ceil(position / self.slots)
+
+    def _remove(self, job: ImageJob):
+        queues = self._tiers[job.tier]
+        jobs = queues.get(job.user_id)
+        if jobs and job in jobs:
+            jobs.remove(job)
+            if not jobs:
+                del queues[job.user_id]
+                self._deficit.pop((job.tier, job.user_id), None)
+        self._notify()
+
+    def _release(self, job: ImageJob, duration: Optional[float]):
+        self._running -= 1
+        self._in_flight[job.user_id] -= 1
+        if not self._in_flight[job.user_id]:
+            del self._in_flight[job.user_id]
+        if duration is not None:
+            self.latency += LATENCY_ALPHA * (duration - self.latency)
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._running < self.slots:
+            job = self._next_job()
+            if job is None:
+                break
+            job.admitted = True
+            self._running += 1
+            self._in_flight[job.user_id] = self._in_flight.get(job.user_id, 0) + 1
+            job.changed.set()
+            logger.debug(f"Admitted image job of user {job.user_id} (tier {job.tier}, running {self._running})")
+        self._notify()
+
+    def _next_job(self) -> Optional[ImageJob]:
+        for tier, queues in enumerate(self._tiers):
+            if not any(self._in_flight.get(user_id, 0) < self.max_per_user for user_id in queues):
+                continue
+            while True:
+                user_id = next(iter(queues))
+                jobs = queues[user_id]
+                key = (tier, user_id)
+                if self._in_flight.get(user_id, 0) >= self.max_per_user:
+                    queues.move_to_end(user_id)
+                    continue
+                if self._deficit.get(key, 0) < jobs[0].cost:
+                    self._deficit[key] = self._deficit.get(key, 0) + self.quantum
+                if self._deficit[key] < jobs[0].cost:
+                    queues.move_to_end(user_id)
+                    continue
+                job = jobs.popleft()
+                self._deficit[key] -= job.cost
+                if jobs:
+                    queues.move_to_end(user_id)
+                else:
+                    del queues[user_id]
+                    del self._deficit[key]
+                return job
+        return None
+
+    def _notify(self):
+        for queues in self._tiers:
+            for jobs in queues.values():
+                for job in jobs:
+                    job.changed.set()
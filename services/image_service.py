@@ -1,41 +1,285 @@
 import asyncio
-import functools
 import io
 import base64
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
 from PIL import Image
-from together import Together
 from asyncio import Semaphore
 from config.settings import (
-    API_KEY, MODEL_NAME, IMAGE_WIDTH, IMAGE_HEIGHT, 
-    IMAGE_STEPS, CONCURRENT_IMAGE_GENERATIONS
+    MODEL_NAME, IMAGE_WIDTH, IMAGE_HEIGHT,
+    IMAGE_STEPS, CONCURRENT_IMAGE_GENERATIONS, IMAGE_COUNT,
+    IMAGE_BATCH_VARIANTS, IMAGE_VARIANT_RETRIES,
+    IMAGE_OUTPUT_FORMAT, IMAGE_OUTPUT_QUALITY, IMAGE_ENCODE_WORKERS, IMAGE_CACHE_ENABLED,
+    IMAGE_PREVIEW_WIDTH, IMAGE_PREVIEW_HEIGHT, IMAGE_PREVIEW_STEPS, SINGLE_FLIGHT_ENABLED
 )
 from utils.logging_config import logger
-from utils.exceptions import NSFWContentError, APIConnectionError, InvalidPromptError
+from utils.quota_shaper import get_shaper
+from utils.single_flight import SingleFlight
+from services.image_cache import get_image_cache, image_cache_key
+from services.together_client import get_together_client
+from utils.deadline import current_deadline, enforce
+from utils.exceptions import (
+    ImageGenerationError, NSFWContentError, APIConnectionError, InvalidPromptError, DeadlineExceededError
+)
+
+MAX_SEED = 2**31 - 1
+
+# File extensions by magic bytes, used to name pass-through uploads
+IMAGE_SIGNATURES = (
+    (b"\x89PNG", "png"),
+    (b"\xff\xd8", "jpg"),
+    (b"RIFF", "webp"),
+)
+
+# Identical single-image requests in flight share one upstream call
+flights = SingleFlight("images")
+
+_encode_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_encode_pool() -> ProcessPoolExecutor:
+    global _encode_pool
+    if _encode_pool is None:
+        _encode_pool = ProcessPoolExecutor(max_workers=IMAGE_ENCODE_WORKERS)
+    return _encode_pool
+
+
+def shutdown_encode_pool():
+    global _encode_pool
+    if _encode_pool is not None:
+        _encode_pool.shutdown(cancel_futures=True)
+        _encode_pool = None
+
+
+def reencode_image(image_data: bytes, image_format: str, quality: int) -> bytes:
+    """
+    Decodes provider bytes and re-encodes them as png, jpeg or webp.
+    Runs in a worker process, so it must stay a module-level function.
+    """
+    image = Image.open(io.BytesIO(image_data)).convert("RGB")
+    output = io.BytesIO()
+    if image_format == "png":
+        image.save(output, "PNG")
+    elif image_format == "jpeg":
+        image.save(output, "JPEG", quality=quality, optimize=True)
+    else:
+        image.save(output, "WEBP", quality=quality, method=4)
+    return output.getvalue()
+
+
+def sniff_extension(image_data: bytes) -> str:
+    for signature, extension in IMAGE_SIGNATURES:
+        if image_data.startswith(signature):
+            return extension
+    return "jpg"
+
+
+@dataclass
+class ImageVariant:
+    """One requested image: its seed and either the image or the error that ended it."""
+    seed: int
+    image: Optional[io.BytesIO] = None
+    error: Optional[Exception] = None
+    # Rendered by a batched call, which does not promise which seed each image used
+    batched: bool = False
+
 
 class ImageService:
     def __init__(self):
-        self.client = Together(api_key=API_KEY)
+        self.client = get_together_client()
         self.semaphore = Semaphore(CONCURRENT_IMAGE_GENERATIONS)
+        self.shaper = get_shaper("together_images")
+        self.cache = get_image_cache() if IMAGE_CACHE_ENABLED else None
+
+    @staticmethod
+    def seeds_for(enhanced_prompt: str, count: int, seed_round: int = 0) -> List[int]:
+        """
+        Seeds derived from the prompt and the user's regenerate round (kept in
+        user_data next to their last prompt), so repeating a request hits the
+        image cache while each Regenerate still gets new images.
+        """
+        digest = hashlib.sha256(f"{seed_round}:{enhanced_prompt}".encode("utf-8")).digest()
+        base = int.from_bytes(digest[:8], "big") % (MAX_SEED - count) + 1
+        return [base + index for index in range(count)]
+
+    async def generate_single_image(self, enhanced_prompt: str, seed: Optional[int] = None,
+                                    deadline: Optional[float] = None) -> io.BytesIO:
+        deadline = current_deadline(deadline)
+
+        async def request() -> io.BytesIO:
+            images = await self._request_images(enhanced_prompt, seed=seed, n=1, deadline=deadline)
+            return images[0]
+
+        # Without a seed the result is random, so there is nothing to share
+        if not SINGLE_FLIGHT_ENABLED or seed is None:
+            return await request()
+
+        # Every caller gets its own buffer, they are read and seeked independently
+        async with enforce(deadline, "image"):
+            image = await flights.do(f"{seed}:{enhanced_prompt}", request)
+        bio = io.BytesIO(image.getvalue())
+        bio.name = image.name
+        return bio
 
-    async def generate_single_image(self, enhanced_prompt: str) -> io.BytesIO:
-        async with self.semaphore:
+    async def generate_previews(self, enhanced_prompt: str, seeds: List[int],
+                                deadline: Optional[float] = None) -> List[Optional[io.BytesIO]]:
+        """
+        Low-resolution, low-step renders of the given seeds, requested
+        concurrently. Previews are not cached or retried; a failed preview
+        comes back as None.
+        """
+        deadline = current_deadline(deadline)
+
+        async def preview(seed: int) -> Optional[io.BytesIO]:
             try:
-                if not enhanced_prompt:
-                    raise InvalidPromptError("Empty prompt provided")
+                images = await self._request_images(
+                    enhanced_prompt, seed=seed, n=1,
+                    width=IMAGE_PREVIEW_WIDTH, height=IMAGE_PREVIEW_HEIGHT, steps=IMAGE_PREVIEW_STEPS,
+                    deadline=deadline
+                )
+                return images[0]
+            except (ImageGenerationError, DeadlineExceededError) as e:
+                logger.warning(f"Preview with seed {seed} failed: {e}")
+                return None
 
-                loop = asyncio.get_event_loop()
-                generate_func = functools.partial(
-                    self.client.images.generate,
-                    prompt=enhanced_prompt,
-                    model=MODEL_NAME,
-                    width=IMAGE_WIDTH,
-                    height=IMAGE_HEIGHT,
-                    steps=IMAGE_STEPS,
-                    response_format="b64_json"
+        return list(await asyncio.gather(*(preview(seed) for seed in seeds)))
+
+    async def generate_variants(
+        self,
+        enhanced_prompt: str,
+        count: int = IMAGE_COUNT,
+        seeds: Optional[List[int]] = None,
+        on_variant: Optional[Callable[[ImageVariant], Awaitable[None]]] = None,
+        seed_round: int = 0,
+        deadline: Optional[float] = None
+    ) -> List[ImageVariant]:
+        """
+        Generates `count` variants of one prompt, one seed per variant.
+
+        Variants already in the image cache are served from it. With
+        IMAGE_BATCH_VARIANTS the rest are requested in a single upstream
+        call; whatever is still missing afterwards (or everything, without
+        batching) is requested per variant, concurrently, and only connection
+        failures are retried. Batched images are not cached, since the
+        provider does not say which seed each of them was rendered with, and a
+        batch rejected for its prompt is not retried per variant. Successful
+        variants are returned even if others failed; only when none succeeds
+        is the first error raised. Running past `deadline` cancels every
+        request and raises DeadlineExceededError.
+        """
+        deadline = current_deadline(deadline)
+        variants = [
+            ImageVariant(seed) for seed in (seeds or self.seeds_for(enhanced_prompt, count, seed_round))
+        ]
+
+        if self.cache:
+            cached = await asyncio.gather(*(self._cached_image(enhanced_prompt, v.seed) for v in variants))
+            for variant, image in zip(variants, cached):
+                variant.image = image
+                if image and on_variant:
+                    await on_variant(variant)
+        generated = [variant for variant in variants if variant.image is None]
+
+        if IMAGE_BATCH_VARIANTS and len(variants) > 1 and len(generated) == len(variants):
+            try:
+                images = await self._request_images(
+                    enhanced_prompt, seed=variants[0].seed, n=len(variants), deadline=deadline
                 )
+                for variant, image in zip(variants, images):
+                    variant.image = image
+                    variant.batched = True
+                    if on_variant:
+                        await on_variant(variant)
+            except ImageGenerationError as e:
+                logger.warning(f"Batched generation of {len(variants)} variants failed: {e}")
+                for variant in variants:
+                    variant.error = e
+                if isinstance(e, (NSFWContentError, InvalidPromptError)):
+                    # Every variant shares the prompt, so retrying them one by one would fail the same way
+                    if on_variant:
+                        for variant in variants:
+                            await on_variant(variant)
+                    raise
+
+        async def complete(variant: ImageVariant):
+            for attempt in range(IMAGE_VARIANT_RETRIES + 1):
+                try:
+                    variant.image = await self.generate_single_image(enhanced_prompt, seed=variant.seed, deadline=deadline)
+                    variant.error = None
+                    break
+                except (NSFWContentError, InvalidPromptError) as e:
+                    variant.error = e
+                    break
+                except ImageGenerationError as e:
+                    variant.error = e
+                    logger.warning(f"Variant with seed {variant.seed} failed (attempt {attempt + 1}): {e}")
+            if on_variant:
+                await on_variant(variant)
+
+        missing = [variant for variant in variants if variant.image is None]
+        if missing:
+            await asyncio.gather(*(complete(variant) for variant in missing))
+
+        if self.cache:
+            await asyncio.gather(*(
+                self._store_image(enhanced_prompt, variant)
+                for variant in generated if variant.image and not variant.batched
+            ))
+
+        if not any(variant.image for variant in variants):
+            raise variants[0].error or APIConnectionError("No image data in response")
+        return variants
+
+    async def is_cached(self, enhanced_prompt: str, seeds: List[int]) -> bool:
+        """
+        True when the images of all `seeds` can be served from the cache.
+        """
+        if not self.cache:
+            return False
+        try:
+            hits = await asyncio.gather(*(self.cache.contains(image_cache_key(enhanced_prompt, seed)) for seed in seeds))
+            return all(hits)
+        except Exception as e:
+            logger.error(f"Image cache lookup failed: {e}")
+            return False
+
+    async def _cached_image(self, enhanced_prompt: str, seed: int) -> Optional[io.BytesIO]:
+        try:
+            return await self.cache.get(image_cache_key(enhanced_prompt, seed))
+        except Exception as e:
+            logger.error(f"Image cache lookup failed: {e}")
+            return None
+
+    async def _store_image(self, enhanced_prompt: str, variant: ImageVariant):
+        try:
+            await self.cache.put(image_cache_key(enhanced_prompt, variant.seed), variant.image)
+        except Exception as e:
+            logger.error(f"Failed to cache image with seed {variant.seed}: {e}")
+
+    async def _request_images(self, enhanced_prompt: str, seed: Optional[int] = None, n: int = 1,
+                              width: int = IMAGE_WIDTH, height: int = IMAGE_HEIGHT,
+                              steps: int = IMAGE_STEPS, deadline: Optional[float] = None) -> List[io.BytesIO]:
+        # Expiry cancels the wait for a slot or the call holding it, which frees the slot at once
+        async with enforce(deadline, "image"), self.semaphore:
+            try:
+                if not enhanced_prompt:
+                    raise InvalidPromptError("Empty prompt provided")
 
                 try:
-                    response = await loop.run_in_executor(None, generate_func)
+                    response = await self.shaper.run(
+                        lambda: self.client.generate_image(
+                            prompt=enhanced_prompt,
+                            model=MODEL_NAME,
+                            width=width,
+                            height=height,
+                            steps=steps,
+                            seed=seed,
+                            n=n,
+                            response_format="b64_json"
+                        )
+                    )
                 except Exception as e:
                     error_message = str(e).lower()
                     if 'nsfw content' in error_message:
@@ -45,21 +289,8 @@ class ImageService:
                     else:
                         raise APIConnectionError(f"API Error: {str(e)}")
 
-                # Validate response
-                if not response:
-                    raise APIConnectionError("No response received from image generation service")
-
-                if hasattr(response, 'error') and response.error:
-                    error_message = str(response.error).lower()
-                    if 'nsfw' in error_message:
-                        raise NSFWContentError("The generated image may contain NSFW content")
-                    else:
-                        raise APIConnectionError(f"API Error: {response.error}")
-
-                if not hasattr(response, 'data') or not response.data:
-                    raise APIConnectionError("No image data in response")
-
-                return self._process_image_response(response)
+                self._validate_image_response(response)
+                return [await self._process_image_data(item) for item in response['data']]
 
             except NSFWContentError:
                 logger.warning(f"NSFW content detected in prompt: {enhanced_prompt}")
@@ -74,15 +305,25 @@ class ImageService:
                 logger.error(f"Unexpected error generating image: {str(e)}")
                 raise APIConnectionError(f"Unexpected error: {str(e)}")
 
-    def _process_image_response(self, response):
+    async def _process_image_data(self, item):
+        """
+        Decodes one b64 result. In pass-through mode the provider's bytes are
+        uploaded as they are; otherwise they are re-encoded in a worker process
+        so the event loop never runs PIL.
+        """
         try:
-            b64_image = response.data[0].b64_json
-            image_data = base64.b64decode(b64_image)
-            image = Image.open(io.BytesIO(image_data)).convert("RGB")
-            bio = io.BytesIO()
-            bio.name = 'image.png'
-            image.save(bio, 'PNG')
-            bio.seek(0)
+            image_data = base64.b64decode(item['b64_json'])
+            if IMAGE_OUTPUT_FORMAT == "passthrough":
+                extension = sniff_extension(image_data)
+            else:
+                loop = asyncio.get_event_loop()
+                image_data = await loop.run_in_executor(
+                    _get_encode_pool(), reencode_image,
+                    image_data, IMAGE_OUTPUT_FORMAT, IMAGE_OUTPUT_QUALITY
+                )
+                extension = "jpg" if IMAGE_OUTPUT_FORMAT == "jpeg" else IMAGE_OUTPUT_FORMAT
+            bio = io.BytesIO(image_data)
+            bio.name = f'image.{extension}'
             return bio
         except Exception as e:
             logger.error(f"Error processing image response: {e}")
@@ -92,14 +333,14 @@ class ImageService:
     def _validate_image_response(response):
         """Validates the API response and raises appropriate exceptions"""
         if not response:
-            raise APIConnectionError("Empty response received")
-        
-        if hasattr(response, 'error') and response.error:
-            error_message = str(response.error).lower()
+            raise APIConnectionError("No response received from image generation service")
+
+        if response.get('error'):
+            error_message = str(response['error']).lower()
             if 'nsfw' in error_message:
-                raise NSFWContentError("NSFW content detected")
+                raise NSFWContentError("The generated image may contain NSFW content")
             else:
-                raise APIConnectionError(f"API Error: {response.error}")
+                raise APIConnectionError(f"API Error: {response['error']}")
 
-        if not hasattr(response, 'data') or not response.data:
-            raise APIConnectionError("No image data in response")
\ No newline at end of file
+        if not response.get('data'):
+            raise APIConnectionError("No image data in response")
@@ -0,0 +1,265 @@
+# services/job_queue.py
+
+import asyncio
+import io
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from config.settings import (
+    IMAGE_QUEUE_DB_PATH, IMAGE_SPOOL_DIR, IMAGE_QUEUE_POLL_INTERVAL, IMAGE_JOB_STALE_SECONDS
+)
+from utils.deadline import current_deadline, enforce
+from utils.exceptions import DeadlineExceededError
+from utils.logging_config import logger
+from utils.sqlite_engine import SQLiteEngine, get_engine
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+COLUMNS = (
+    "id", "user_id", "chat_id", "tier", "seed_round", "prompt", "enhanced_prompt", "status",
+    "progress", "results", "error_type", "error", "worker", "created_at", "updated_at", "deadline_at"
+)
+
+
+async def _create_image_jobs(db):
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS image_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            tier INTEGER NOT NULL DEFAULT 0,
+            prompt TEXT,
+            enhanced_prompt TEXT,
+            status TEXT NOT NULL,
+            progress INTEGER NOT NULL DEFAULT 0,
+            results TEXT,
+            error_type TEXT,
+            error TEXT,
+            worker TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_image_jobs_status ON image_jobs (status, tier, id)')
+
+
+async def _add_seed_round(db):
+    await db.execute('ALTER TABLE image_jobs ADD COLUMN seed_round INTEGER NOT NULL DEFAULT 0')
+
+
+async def _add_deadline(db):
+    # Wall-clock time after which nobody waits for the job any more
+    await db.execute('ALTER TABLE image_jobs ADD COLUMN deadline_at REAL')
+
+
+class ImageJobQueue:
+    """
+    Durable image job queue in its own SQLite file, shared by the bot process
+    (producer) and any number of image worker processes (consumers).
+
+    Workers claim jobs inside a BEGIN IMMEDIATE transaction, so a job is
+    claimed by exactly one worker. Claims prefer the lowest tier, then the
+    user with the fewest running jobs, then the oldest job. Queued jobs past
+    their deadline are failed instead of claimed. Images are handed back as
+    files in IMAGE_SPOOL_DIR and deleted once delivered.
+    """
+
+    MIGRATIONS = [_create_image_jobs, _add_seed_round, _add_deadline]
+
+    def __init__(self, engine: SQLiteEngine = None, spool_dir: str = IMAGE_SPOOL_DIR):
+        self.engine = engine or get_engine(IMAGE_QUEUE_DB_PATH)
+        self.spool_dir = spool_dir
+
+    async def init_schema(self):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        await self.engine.migrate('image_jobs', self.MIGRATIONS)
+
+    async def enqueue(self, user_id: int, chat_id: int, prompt: str = None,
+                      enhanced_prompt: str = None, tier: int = 0, seed_round: int = 0,
+                      deadline_at: float = None) -> int:
+        """
+        Queues a job. Without `enhanced_prompt` the worker enhances `prompt`
+        first. `deadline_at` is the wall-clock time the job must finish by.
+        """
+        now = time.time()
+
+        async def job(db):
+            cursor = await db.execute('''
+                INSERT INTO image_jobs (user_id, chat_id, tier, seed_round, prompt, enhanced_prompt, status,
+                                        created_at, updated_at, deadline_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (user_id, chat_id, tier, seed_round, prompt, enhanced_prompt, STATUS_QUEUED, now, now, deadline_at))
+            return cursor.lastrowid
+        return await self.engine.write(job)
+
+    async def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+
+        async def job(db):
+            # Jobs of a worker that stopped heartbeating go back to the queue
+            await db.execute('''
+                UPDATE image_jobs SET status = ?, worker = NULL, updated_at = ?
+                WHERE status = ? AND updated_at < ?
+            ''', (STATUS_QUEUED, now, STATUS_RUNNING, now - IMAGE_JOB_STALE_SECONDS))
+            # Nobody waits for jobs past their deadline any more
+            await db.execute('''
+                UPDATE image_jobs SET status = ?, error_type = ?, error = ?, updated_at = ?
+                WHERE status = ? AND deadline_at < ?
+            ''', (STATUS_FAILED, "deadline", "The job expired in the queue", now, STATUS_QUEUED, now))
+
+            async with db.execute(f'''
+                SELECT {", ".join(COLUMNS)} FROM image_jobs AS j
+                WHERE status = ?
+                ORDER BY tier ASC,
+                    (SELECT COUNT(*) FROM image_jobs AS r
+                     WHERE r.user_id = j.user_id AND r.status = ?) ASC,
+                    id ASC
+                LIMIT 1
+            ''', (STATUS_QUEUED, STATUS_RUNNING)) as cursor:
+                row = await cursor.fetchone()
+            if row is None:
+                return None
+            await db.execute('''
+                UPDATE image_jobs SET status = ?, worker = ?, updated_at = ? WHERE id = ?
+            ''', (STATUS_RUNNING, worker, now, row[0]))
+            return dict(zip(COLUMNS, row))
+        return await self.engine.write(job)
+
+    async def update_progress(self, job_id: int, progress: int, enhanced_prompt: str = None):
+        """
+        Records progress; doubles as the worker heartbeat.
+        """
+        await self.engine.execute('''
+            UPDATE image_jobs
+            SET progress = ?, enhanced_prompt = COALESCE(?, enhanced_prompt), updated_at = ?
+            WHERE id = ?
+        ''', (progress, enhanced_prompt, time.time(), job_id))
+
+    async def heartbeat(self, job_id: int) -> bool:
+        """
+        Keeps a running job from being requeued as stale. Returns False once
+        the job is no longer running, e.g. because the bot gave up on it.
+        """
+        updated = await self.engine.execute('''
+            UPDATE image_jobs SET updated_at = ? WHERE id = ? AND status = ?
+        ''', (time.time(), job_id, STATUS_RUNNING))
+        return updated > 0
+
+    async def complete(self, job_id: int, enhanced_prompt: str, images: List[Optional[io.BytesIO]]):
+        """
+        Spools the images and marks the job done, unless the bot gave up on
+        it meanwhile; then the images are discarded.
+        """
+        results = []
+        for index, image in enumerate(images):
+            if image is None:
+                results.append(None)
+                continue
+            path = os.path.join(self.spool_dir, f"{job_id}_{index}_{image.name}")
+            await asyncio.to_thread(self._write_file, path, image.getvalue())
+            results.append([path, getattr(image, "cache_key", None)])
+        updated = await self.engine.execute('''
+            UPDATE image_jobs SET status = ?, enhanced_prompt = ?, results = ?, updated_at = ?
+            WHERE id = ? AND status = ?
+        ''', (STATUS_DONE, enhanced_prompt, json.dumps(results), time.time(), job_id, STATUS_RUNNING))
+        if not updated:
+            logger.info(f"Image job {job_id} was abandoned; discarding its images")
+            for result in results:
+                if result is not None:
+                    await asyncio.to_thread(self._remove_file, result[0])
+
+    async def fail(self, job_id: int, error_type: str, error: str):
+        """
+        Marks a queued or running job failed; finished jobs are left alone.
+        """
+        await self.engine.execute('''
+            UPDATE image_jobs SET status = ?, error_type = ?, error = ?, updated_at = ?
+            WHERE id = ? AND status IN (?, ?)
+        ''', (STATUS_FAILED, error_type, error, time.time(), job_id, STATUS_QUEUED, STATUS_RUNNING))
+
+    async def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        row = await self.engine.fetchone(
+            f'SELECT {", ".join(COLUMNS)} FROM image_jobs WHERE id = ?', (job_id,)
+        )
+        return dict(zip(COLUMNS, row)) if row else None
+
+    async def position(self, job: Dict[str, Any]) -> int:
+        row = await self.engine.fetchone('''
+            SELECT COUNT(*) FROM image_jobs
+            WHERE status = ? AND (tier < ? OR (tier = ? AND id < ?))
+        ''', (STATUS_QUEUED, job["tier"], job["tier"], job["id"]))
+        return row[0] + 1
+
+    async def wait(self, job_id: int, on_update: Callable[[Dict[str, Any]], Awaitable[None]] = None,
+                   deadline: float = None) -> Dict[str, Any]:
+        """
+        Polls until the job is done or failed, reporting every observed state.
+        At the deadline (by default the current update's) the job is marked
+        failed, so no worker starts or delivers it, and DeadlineExceededError
+        is raised.
+        """
+        try:
+            async with enforce(current_deadline(deadline), "image worker"):
+                while True:
+                    job = await self.get(job_id)
+                    if job is None:
+                        raise LookupError(f"Image job {job_id} disappeared")
+                    if on_update:
+                        await on_update(job)
+                    if job["status"] in (STATUS_DONE, STATUS_FAILED):
+                        return job
+                    await asyncio.sleep(IMAGE_QUEUE_POLL_INTERVAL)
+        except DeadlineExceededError:
+            await self.fail(job_id, "deadline", "No image worker finished the job before the deadline")
+            job = await self.get(job_id)
+            if job is not None and job["status"] == STATUS_DONE:
+                # Finished just too late; drop its spooled images
+                await self.take_results(job)
+            raise
+
+    async def take_results(self, job: Dict[str, Any]) -> List[Optional[io.BytesIO]]:
+        """
+        Reads the spooled images of a finished job and removes the files.
+        Images keep the image cache key the worker gave them.
+        """
+        images = []
+        for result in json.loads(job["results"] or "[]"):
+            if result is None:
+                images.append(None)
+                continue
+            path, cache_key = result
+            try:
+                bio = io.BytesIO(await asyncio.to_thread(self._read_and_remove, path))
+                bio.name = os.path.basename(path).split("_", 2)[2]
+                if cache_key:
+                    bio.cache_key = cache_key
+                images.append(bio)
+            except OSError as e:
+                logger.error(f"Failed to read spooled image {path}: {e}")
+                images.append(None)
+        return images
+
+    @staticmethod
+    def _write_file(path: str, data: bytes):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.error(f"Failed to remove spooled image {path}: {e}")
+
+    @staticmethod
+    def _read_and_remove(path: str) -> bytes:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.remove(path)
+        return data
@@ -4,6 +4,7 @@ import logging
 from typing import List, Dict, Any
 import openai
 from dotenv import load_dotenv
+from utils.quota_shaper import get_shaper, estimate_tokens
 
 load_dotenv()
 
@@ -20,19 +21,23 @@ class OpenAIClient:
             api_key=api_key,
             base_url="https://api.sambanova.ai/v1/"  # Note the trailing slash
         )
+        self.shaper = get_shaper("sambanova")
 
     async def generate_response(self, model: str, messages: List[Dict[str, Any]], 
                               temperature: float = 0.75, max_tokens: int = 800, 
                               top_p: float = 0.60):
         try:
-            response = await self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                stream=True,
-                max_tokens=max_tokens,
-                stop=["<|eot_id|>","<|eom_id|>"],
-                top_p=top_p
+            response = await self.shaper.run(
+                lambda: self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    stream=True,
+                    max_tokens=max_tokens,
+                    stop=["<|eot_id|>","<|eom_id|>"],
+                    top_p=top_p
+                ),
+                tokens=estimate_tokens(messages, max_tokens)
             )
 
             async for chunk in response:
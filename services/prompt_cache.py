@@ -0,0 +1,111 @@
+# services/prompt_cache.py
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+from config.settings import TRANSLATION_MODEL, TRANSLATION_CACHE_MEMORY_SIZE, TRANSLATION_CACHE_MAX_ROWS
+from utils.language import normalize_prompt
+from utils.logging_config import logger
+from utils.metrics import counter
+from utils.sqlite_engine import SQLiteEngine, get_engine
+
+MEMORY_HITS = counter("translation_cache_memory_hits_total", "Enhanced prompts served from the in-memory LRU")
+DISK_HITS = counter("translation_cache_disk_hits_total", "Enhanced prompts served from the on-disk cache")
+MISSES = counter("translation_cache_misses_total", "Enhanced prompts not found in any cache")
+
+
+async def _create_prompt_cache(db):
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS prompt_cache (
+            key TEXT PRIMARY KEY,
+            enhanced_prompt TEXT NOT NULL,
+            last_access REAL NOT NULL
+        )
+    ''')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_prompt_cache_access ON prompt_cache (last_access)')
+
+
+class PromptCache:
+    """
+    Enhanced prompts by normalized source prompt: an in-memory LRU in front
+    of a SQLite table shared with the image workers. Keys include the
+    translation model, so switching models starts a fresh cache.
+    """
+
+    MIGRATIONS = [_create_prompt_cache]
+
+    def __init__(self, engine: SQLiteEngine = None, memory_size: int = TRANSLATION_CACHE_MEMORY_SIZE,
+                 max_rows: int = TRANSLATION_CACHE_MAX_ROWS):
+        self.engine = engine or get_engine()
+        self.memory_size = memory_size
+        self.max_rows = max_rows
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+
+    async def init_schema(self):
+        await self.engine.migrate('prompt_cache', self.MIGRATIONS)
+
+    @staticmethod
+    def key(prompt: str) -> str:
+        return hashlib.sha256(f"{TRANSLATION_MODEL}\0{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+    async def get(self, prompt: str) -> Optional[str]:
+        key = self.key(prompt)
+        enhanced_prompt = self._memory.get(key)
+        if enhanced_prompt is not None:
+            self._memory.move_to_end(key)
+            MEMORY_HITS.inc()
+            return enhanced_prompt
+
+        try:
+            row = await self.engine.fetchone('SELECT enhanced_prompt FROM prompt_cache WHERE key = ?', (key,))
+            if row is not None:
+                await self.engine.execute(
+                    'UPDATE prompt_cache SET last_access = ? WHERE key = ?', (time.time(), key)
+                )
+        except Exception as e:
+            logger.error(f"Prompt cache lookup failed: {e}")
+            row = None
+
+        if row is None:
+            MISSES.inc()
+            return None
+        DISK_HITS.inc()
+        self._remember(key, row[0])
+        return row[0]
+
+    async def put(self, prompt: str, enhanced_prompt: str):
+        key = self.key(prompt)
+        self._remember(key, enhanced_prompt)
+
+        async def job(db):
+            await db.execute('''
+                INSERT OR REPLACE INTO prompt_cache (key, enhanced_prompt, last_access) VALUES (?, ?, ?)
+            ''', (key, enhanced_prompt, time.time()))
+            # Keep only the `max_rows` most recently used prompts
+            await db.execute('''
+                DELETE FROM prompt_cache WHERE key IN (
+                    SELECT key FROM prompt_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_rows,))
+
+        try:
+            await self.engine.write(job)
+        except Exception as e:
+            logger.error(f"Failed to cache enhanced prompt: {e}")
+
+    def _remember(self, key: str, enhanced_prompt: str):
+        self._memory[key] = enhanced_prompt
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+
+_prompt_cache: Optional[PromptCache] = None
+
+
+def get_prompt_cache() -> PromptCache:
+    global _prompt_cache
+    if _prompt_cache is None:
+        _prompt_cache = PromptCache()
+    return _prompt_cache
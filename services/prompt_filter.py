@@ -0,0 +1,61 @@
+# services/prompt_filter.py
+
+import os
+from typing import List, Optional
+from config.settings import PROMPT_FILTER_TERMS, PROMPT_FILTER_TERMS_FILE
+from utils.logging_config import logger
+from utils.metrics import counter
+from utils.term_matcher import TermMatcher
+
+REJECTED_PROMPTS = counter("prompt_filter_rejections_total", "Prompts rejected locally before any upstream call")
+
+
+def load_terms(terms: str = PROMPT_FILTER_TERMS, terms_file: str = PROMPT_FILTER_TERMS_FILE) -> List[str]:
+    """
+    Blocked terms from the comma-separated setting plus the optional terms
+    file (one term per line, # starts a comment).
+    """
+    loaded = [term for term in terms.split(",") if term.strip()]
+    if terms_file:
+        try:
+            with open(terms_file, encoding="utf-8") as f:
+                for line in f:
+                    line = line.split("#", 1)[0].strip()
+                    if line:
+                        loaded.append(line)
+        except OSError as e:
+            logger.error(f"Could not read prompt filter terms from {terms_file}: {e}")
+    return loaded
+
+
+class PromptFilter:
+    """
+    Rejects prompts containing a blocked term before they reach the
+    enhancement model, the rate limiter or the image API. Terms match whole
+    words, case-insensitively.
+    """
+
+    def __init__(self, terms: List[str] = None):
+        self.matcher = TermMatcher(load_terms() if terms is None else terms, whole_words=True)
+        logger.info(f"Prompt filter loaded {len(self.matcher.terms)} terms.")
+
+    def check(self, prompt: str) -> Optional[str]:
+        """
+        Returns the blocked term found in `prompt`, or None if it may proceed.
+        """
+        if not self.matcher:
+            return None
+        term = self.matcher.find(prompt)
+        if term is not None:
+            REJECTED_PROMPTS.inc()
+        return term
+
+
+_prompt_filter: Optional[PromptFilter] = None
+
+
+def get_prompt_filter() -> PromptFilter:
+    global _prompt_filter
+    if _prompt_filter is None:
+        _prompt_filter = PromptFilter()
+    return _prompt_filter
@@ -0,0 +1,86 @@
+# services/response_cache.py
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from config.settings import (
+    RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_TEMPERATURE, RESPONSE_CACHE_REPLAY_CHARS
+)
+from utils.metrics import counter
+
+HITS = counter("llm_response_cache_hits_total", "Chat replies replayed from the response cache")
+MISSES = counter("llm_response_cache_misses_total", "Cacheable chat replies not found in the response cache")
+
+
+def is_cacheable(messages: List[Dict[str, Any]], temperature: float) -> bool:
+    """
+    Only near-deterministic sampling, or a conversation that is a single
+    user turn, gives an answer worth reusing for someone else.
+    """
+    if temperature <= RESPONSE_CACHE_MAX_TEMPERATURE:
+        return True
+    return sum(1 for message in messages if message.get("role") != "system") == 1 and messages[-1].get("role") == "user"
+
+
+def replay_chunks(text: str, size: int = RESPONSE_CACHE_REPLAY_CHARS) -> Iterator[str]:
+    """
+    Splits a cached reply into stream-sized chunks, cut after whitespace where possible.
+    """
+    start = 0
+    while start < len(text):
+        end = start + size
+        if end < len(text):
+            space = text.rfind(" ", start, end)
+            if space > start:
+                end = space + 1
+        yield text[start:end]
+        start = end
+
+
+class ResponseCache:
+    """
+    Complete chat replies keyed by backend, model, the exact messages and
+    sampling parameters. In memory only, with LRU and TTL eviction.
+    """
+
+    def __init__(self, size: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    @staticmethod
+    def key(backend: str, model: str, messages: List[Dict[str, Any]], temperature: float,
+            max_tokens: int, top_p: float, stop: Optional[List[str]]) -> str:
+        # Case, punctuation and inner spacing can change the answer, so only outer whitespace is dropped
+        turns = [(message.get("role"), str(message.get("content", "")).strip()) for message in messages]
+        payload = json.dumps([backend, model, turns, temperature, max_tokens, top_p, stop])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            MISSES.inc()
+            return None
+        self._entries.move_to_end(key)
+        HITS.inc()
+        return entry[1]
+
+    def put(self, key: str, text: str):
+        self._entries[key] = (time.monotonic() + self.ttl, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
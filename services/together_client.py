@@ -0,0 +1,91 @@
+# together_client.py
+
+import logging
+from typing import Any, Dict, Optional
+import httpx
+from config.settings import (
+    API_KEY, TOGETHER_BASE_URL, TOGETHER_CONNECT_TIMEOUT,
+    TOGETHER_READ_TIMEOUT, TOGETHER_MAX_CONNECTIONS
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TogetherAPIError(Exception):
+    """Raised for transport failures and non-2xx answers from the Together API."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AsyncTogetherClient:
+    """
+    Minimal native async client for the Together REST API.
+
+    Requests share one pooled keep-alive connection pool, so concurrency is
+    bounded by TOGETHER_MAX_CONNECTIONS rather than by executor threads, and
+    cancelling the awaiting task aborts the HTTP request itself.
+    """
+
+    def __init__(self, api_key: str = API_KEY):
+        self._client = httpx.AsyncClient(
+            base_url=TOGETHER_BASE_URL,
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=httpx.Timeout(TOGETHER_READ_TIMEOUT, connect=TOGETHER_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=TOGETHER_MAX_CONNECTIONS,
+                max_keepalive_connections=TOGETHER_MAX_CONNECTIONS
+            )
+        )
+
+    async def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            response = await self._client.post(path, json=payload)
+        except httpx.TimeoutException as e:
+            raise TogetherAPIError(f"Request to {path} timed out: {e!r}")
+        except httpx.TransportError as e:
+            raise TogetherAPIError(f"Connection error on {path}: {e!r}")
+
+        if response.status_code >= 400:
+            try:
+                error = response.json().get("error") or {}
+                message = error.get("message") if isinstance(error, dict) else str(error)
+            except ValueError:
+                message = None
+            raise TogetherAPIError(
+                f"Together API error {response.status_code}: {message or response.text}",
+                status_code=response.status_code,
+                retry_after=response.headers.get("retry-after")
+            )
+        return response.json()
+
+    async def generate_image(self, **params) -> Dict[str, Any]:
+        return await self._post("/images/generations", params)
+
+    async def chat_completion(self, **params) -> Dict[str, Any]:
+        return await self._post("/chat/completions", params)
+
+    async def close(self):
+        await self._client.aclose()
+
+
+_client: Optional[AsyncTogetherClient] = None
+
+
+def get_together_client() -> AsyncTogetherClient:
+    """
+    Returns the process-wide client so image and translation calls share one pool.
+    """
+    global _client
+    if _client is None:
+        _client = AsyncTogetherClient()
+    return _client
+
+
+async def close_together_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
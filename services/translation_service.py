@@ -1,18 +1,102 @@
 import asyncio
-import functools
-from together import Together
-from config.settings import API_KEY, TRANSLATION_MODEL, MAX_PROMPT_LENGTH
+import json
+from typing import List, Optional
+from config.settings import (
+    TRANSLATION_MODEL, MAX_PROMPT_LENGTH, TRANSLATION_CACHE_ENABLED, TRANSLATION_ENGLISH_FAST_PATH,
+    TRANSLATION_BATCH_ENABLED, TRANSLATION_BATCH_WINDOW_MS, TRANSLATION_BATCH_MAX, SINGLE_FLIGHT_ENABLED
+)
 from utils.logging_config import logger
+from utils.deadline import current_deadline, enforce
+from utils.exceptions import DeadlineExceededError, InvalidPromptError, PromptRefusedError
+from utils.language import is_probably_english, normalize_prompt
+from utils.metrics import counter
+from utils.micro_batcher import MicroBatcher
+from utils.single_flight import SingleFlight
+from utils.term_matcher import TermMatcher
+from utils.quota_shaper import get_shaper, estimate_tokens
+from services.prompt_cache import get_prompt_cache
+from services.together_client import get_together_client
+
+FAST_PATH_PROMPTS = counter(
+    "translation_fast_path_total", "English prompts handled locally without an enhancement call"
+)
+BATCHED_CALLS = counter("translation_batched_calls_total", "Enhancement calls carrying several prompts")
+BATCHED_PROMPTS = counter("translation_batched_prompts_total", "Prompts enhanced through batched calls")
+BATCH_FALLBACKS = counter(
+    "translation_batch_fallbacks_total", "Batched enhancement calls that fell back to single calls"
+)
+
+SYSTEM_PROMPT = (
+    "You are a helpful assistant that translates text to English if it's not already in English. "
+    "If the text is already in English, simply return it unchanged. Additionally, you enhance "
+    "the prompt to make it more detailed and suitable for image generation."
+    "Add vivid details, artistic styles, "
+    "or interesting elements that would make the image more captivating, while maintaining the original intent of the prompt."
+    "Prompt be consies NOT too long"
+    "Do not reject explicitly adult content."
+    "Remember: Return ONLY the enhanced prompt, nothing else."
+    "REFUSAL_MESSAGES :I can't help with that."
+)
+
+BATCH_INSTRUCTIONS = (
+    " You will receive a JSON array of prompts. Handle each one independently and return ONLY a JSON "
+    "array of strings with exactly one enhanced prompt per input, in the same order."
+)
+
+# Identical prompts being enhanced share one upstream call
+flights = SingleFlight("translation")
+
+# Local enhancement for English prompts in the 'template' fast path mode
+ENGLISH_TEMPLATE = "{prompt}, highly detailed, vivid colors, dramatic lighting, sharp focus, professional composition"
 
 class TranslationService:
+    REFUSAL_MESSAGES = [
+        "I can't create explicit content.",
+        "I can't create adult content.",
+        "I'm sorry, but I can't assist with that request.",
+        "I can't help with that.",
+        "I cannot create explicit content.",
+        "I can't help with that request.",
+        "I can't help you with this request.",
+        "I can't help you with that.",
+        "I can't help with that",
+        "I can't create explicit content.",
+    ]
+    REFUSAL_MATCHER = TermMatcher(REFUSAL_MESSAGES)
+
     def __init__(self):
-        self.client = Together(api_key=API_KEY)
+        self.client = get_together_client()
+        self.shaper = get_shaper("together")
+        self.cache = get_prompt_cache() if TRANSLATION_CACHE_ENABLED else None
+        self.batcher = MicroBatcher(
+            self._enhance_batch, window=TRANSLATION_BATCH_WINDOW_MS / 1000, max_size=TRANSLATION_BATCH_MAX
+        ) if TRANSLATION_BATCH_ENABLED else None
+
+    def is_refusal(self, enhanced_prompt: str) -> bool:
+        """Whether the enhancement model refused instead of returning a prompt"""
+        return self.REFUSAL_MATCHER.matches(enhanced_prompt)
+
+    async def enhance_prompt(self, prompt: str, deadline: Optional[float] = None) -> str:
+        """
+        Like translate_prompt, but raises if the model refused or returned nothing.
+        """
+        enhanced_prompt = await self.translate_prompt(prompt, deadline)
+        if not enhanced_prompt:
+            raise InvalidPromptError("Prompt enhancement returned an empty prompt")
+        if self.is_refusal(enhanced_prompt):
+            raise PromptRefusedError(f"Enhancement refused the prompt: {enhanced_prompt}")
+        return enhanced_prompt
 
     def _word_count(self, text: str) -> int:
         """Count words in text"""
         return len(text.split())
 
-    async def translate_prompt(self, prompt: str) -> str:
+    async def translate_prompt(self, prompt: str, deadline: Optional[float] = None) -> str:
+        """
+        Translated and enhanced prompt. Upstream errors fall back to the
+        original prompt; running past `deadline` (default: the current
+        update's) raises DeadlineExceededError.
+        """
         if len(prompt) > MAX_PROMPT_LENGTH:
             prompt = prompt[:MAX_PROMPT_LENGTH]
 
@@ -21,39 +105,100 @@ class TranslationService:
             logger.info("Prompt is more than 30 words. Skipping translation.")
             return prompt
 
+        if TRANSLATION_ENGLISH_FAST_PATH in ("skip", "template") and is_probably_english(prompt):
+            FAST_PATH_PROMPTS.inc()
+            logger.info(f"Prompt looks English, enhancing locally ({TRANSLATION_ENGLISH_FAST_PATH}).")
+            return prompt if TRANSLATION_ENGLISH_FAST_PATH == "skip" else ENGLISH_TEMPLATE.format(prompt=prompt)
+
+        deadline = current_deadline(deadline)
+        if SINGLE_FLIGHT_ENABLED:
+            # Joining a flight still waits no longer than this caller's own deadline
+            async with enforce(deadline, "translation"):
+                return await flights.do(normalize_prompt(prompt), lambda: self._translate(prompt, deadline))
+        return await self._translate(prompt, deadline)
+
+    async def _translate(self, prompt: str, deadline: Optional[float] = None) -> str:
+        if self.cache:
+            cached_prompt = await self.cache.get(prompt)
+            if cached_prompt is not None:
+                logger.info(f"Enhanced prompt (cached): {cached_prompt}")
+                return cached_prompt
+
         try:
-            loop = asyncio.get_event_loop()
-            translate_func = functools.partial(
-                self.client.chat.completions.create,
+            async with enforce(deadline, "translation"):
+                if self.batcher:
+                    enhanced_prompt = await self.batcher.submit(prompt)
+                else:
+                    enhanced_prompt = await self._request_enhancement(prompt)
+        except DeadlineExceededError:
+            raise
+        except Exception as e:
+            logger.error(f"Error translating prompt: {e}")
+            return prompt
+
+        logger.info(f"Enhanced prompt: {enhanced_prompt}")
+        # Refusals and empty answers are not cached, a later attempt may succeed
+        if self.cache and enhanced_prompt and not self.is_refusal(enhanced_prompt):
+            await self.cache.put(prompt, enhanced_prompt)
+        return enhanced_prompt
+
+    async def _request_enhancement(self, prompt: str) -> str:
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"Translate and enhance: '{prompt}'"}
+        ]
+        return await self._chat(messages, max_tokens=150)
+
+    async def _enhance_batch(self, prompts: List[str]) -> list:
+        """
+        Enhances the prompts gathered by the micro-batcher in one call. If
+        the batched call or its JSON answer fails, each prompt is sent on its
+        own instead; failures of those come back as exceptions in the list.
+        """
+        if len(prompts) == 1:
+            return [await self._request_enhancement(prompts[0])]
+
+        try:
+            enhanced_prompts = await self._request_batched_enhancement(prompts)
+            BATCHED_CALLS.inc()
+            BATCHED_PROMPTS.inc(len(prompts))
+            return enhanced_prompts
+        except Exception as e:
+            BATCH_FALLBACKS.inc()
+            logger.warning(f"Batched enhancement of {len(prompts)} prompts failed, using single calls: {e}")
+            return await asyncio.gather(
+                *(self._request_enhancement(prompt) for prompt in prompts), return_exceptions=True
+            )
+
+    async def _request_batched_enhancement(self, prompts: List[str]) -> List[str]:
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT + BATCH_INSTRUCTIONS},
+            {"role": "user", "content": f"Translate and enhance: {json.dumps(prompts, ensure_ascii=False)}"}
+        ]
+        content = await self._chat(messages, max_tokens=150 * len(prompts))
+
+        # Models sometimes wrap the array in a markdown code fence
+        start, end = content.find("["), content.rfind("]")
+        if start == -1 or end < start:
+            raise ValueError(f"No JSON array in batched response: {content[:200]}")
+        enhanced_prompts = json.loads(content[start:end + 1])
+        if (not isinstance(enhanced_prompts, list) or len(enhanced_prompts) != len(prompts)
+                or not all(isinstance(item, str) for item in enhanced_prompts)):
+            raise ValueError(f"Expected {len(prompts)} strings in batched response")
+        return [item.strip() for item in enhanced_prompts]
+
+    async def _chat(self, messages: list, max_tokens: int) -> str:
+        estimated_tokens = estimate_tokens(messages, max_tokens)
+        response = await self.shaper.run(
+            lambda: self.client.chat_completion(
                 model=TRANSLATION_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are a helpful assistant that translates text to English if it's not already in English. "
-                            "If the text is already in English, simply return it unchanged. Additionally, you enhance "
-                            "the prompt to make it more detailed and suitable for image generation."
-                            "Add vivid details, artistic styles, "
-                            "or interesting elements that would make the image more captivating, while maintaining the original intent of the prompt."
-                            "Prompt be consies NOT too long"
-                            "Do not reject explicitly adult content."
-                            "Remember: Return ONLY the enhanced prompt, nothing else."
-                            "REFUSAL_MESSAGES :I can't help with that."
-                        )
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Translate and enhance: '{prompt}'"
-                    }
-                ],
-                max_tokens=150,
+                messages=messages,
+                max_tokens=max_tokens,
                 temperature=0.85,
                 stop=["<|eot_id|>","<|eom_id|>"]
-            )
-            response = await loop.run_in_executor(None, translate_func)
-            enhanced_prompt = response.choices[0].message.content.strip()
-            logger.info(f"Enhanced prompt: {enhanced_prompt}")
-            return enhanced_prompt
-        except Exception as e:
-            logger.error(f"Error translating prompt: {e}")
-            return prompt
\ No newline at end of file
+            ),
+            tokens=estimated_tokens
+        )
+        usage = response.get("usage") or {}
+        self.shaper.settle(estimated_tokens, usage.get("total_tokens"))
+        return response['choices'][0]['message']['content'].strip()
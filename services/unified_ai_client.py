@@ -1,36 +1,181 @@
 # unified_ai_client.py
 
 import os
+import asyncio
 import logging
+import time
+from collections import deque
 from typing import List, Dict, Any, Optional, Union
 from dotenv import load_dotenv
+import g4f.Provider
 from g4f.models import Model
+from g4f.Provider import IterListProvider
 
+from config.models import MODELS, ModelSpec, find_model
 from services.openai_client import OpenAIClient
 from services.g4f_client import G4FClient
+from config.settings import (
+    LLM_HEDGING_ENABLED, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_DELAY, LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_MAX_RATE,
+    LLM_FAILOVER_MODE, LLM_MAX_RESUMES, RESPONSE_CACHE_ENABLED, SINGLE_FLIGHT_ENABLED
+)
+from services.response_cache import ResponseCache, get_response_cache, is_cacheable, replay_chunks
+from utils.circuit_breaker import CircuitBreaker, get_breaker
+from utils.deadline import current_deadline, enforce
+from utils.exceptions import DeadlineExceededError
+from utils.latency_tracker import LatencyTracker
+from utils.metrics import counter
+from utils.quota_shaper import CHARS_PER_TOKEN
+from utils.single_flight import SingleFlight
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
-from typing import List, Dict, Any, Optional, Union
-from g4f.models import Model
-from g4f.Provider import DDG, Pizzagpt, ChatgptFree, IterListProvider
+# Requests remembered when enforcing LLM_HEDGE_MAX_RATE
+HEDGE_HISTORY = 100
 
-class UnifiedAIClient:
-    # Define your models
-    OPENAI_MODELS = {
-        "Meta-Llama-3.3-70B-Instruct": "Meta-Llama-3.3-70B-Instruct",
-        "Qwen2.5-Coder-32B-Instruct": "Qwen2.5-Coder-32B-Instruct"
-    }
-
-    G4F_MODEL = Model(
-        name='gpt-4o-min',
-        base_provider='OpenAI',
-        best_provider=IterListProvider([
-            DDG, Pizzagpt, ChatgptFree,
-        ])
-    )
+HEDGED_REQUESTS = counter("llm_hedged_requests_total", "Text requests also started on a second backend")
+HEDGE_WINS = counter("llm_hedge_wins_total", "Hedged text requests where the second backend answered first")
+RESUMES = counter("llm_midstream_failovers_total", "Text streams failed over after output was delivered")
+
+# Yielded by generate_response in 'restart' failover mode: discard the text received so far
+STREAM_RESTART = object()
+
+CONTINUE_INSTRUCTION = (
+    "Your previous answer was cut off. Continue it exactly where it stopped, "
+    "without repeating any of the text already written."
+)
+# Shortest repeated text treated as overlap when a continuation restates its prefix
+MIN_OVERLAP = 8
+# How much of the continuation is buffered to look for such overlap
+OVERLAP_WINDOW = 200
+
+# Identical chat requests in flight share one upstream stream
+flights = SingleFlight("llm")
+
+# Time to first token per backend and model
+ttft_tracker = LatencyTracker()
+# Whether each recent text request hedged, across all clients
+hedge_history = deque(maxlen=HEDGE_HISTORY)
+
+
+def ttft_budget(key: str) -> float:
+    """
+    Seconds to wait for a first token from `key` before hedging.
+    """
+    budget = ttft_tracker.percentile(key, LLM_HEDGE_PERCENTILE, min_samples=LLM_HEDGE_MIN_SAMPLES)
+    return max(LLM_HEDGE_MIN_DELAY, budget or 0.0)
+
+
+class BackendError(Exception):
+    """A backend stream failed; `backend` names it."""
+
+    def __init__(self, backend: str, error: Exception):
+        super().__init__(str(error))
+        self.backend = backend
+        self.error = error
+
+
+class OverlapTrimmer:
+    """
+    Drops text at the start of a continuation that repeats the end of what
+    was already delivered. The first OVERLAP_WINDOW characters are buffered
+    until the overlap can be decided.
+    """
+
+    def __init__(self, delivered: str):
+        self.tail = delivered[-OVERLAP_WINDOW:]
+        self.buffer = ""
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        if self.done:
+            return chunk
+        self.buffer += chunk
+        if len(self.buffer) < len(self.tail):
+            return ""
+        return self.flush()
+
+    def flush(self) -> str:
+        if self.done:
+            return ""
+        self.done = True
+        text = self.buffer.lstrip()
+        for size in range(min(len(self.tail), len(text)), MIN_OVERLAP - 1, -1):
+            if self.tail.endswith(text[:size]):
+                return text[size:]
+        return self.buffer
+
+
+class BackendStream:
+    """
+    One streaming attempt on a backend. Reports its outcome to the
+    backend's circuit breaker and its time to first token to the tracker.
+    Each chunk must arrive before `deadline`.
+    """
+
+    def __init__(self, backend: str, breaker: CircuitBreaker, stream, deadline: Optional[float] = None):
+        self.backend = backend
+        self.breaker = breaker
+        self.stream = stream
+        self.deadline = deadline
+        self.started = time.monotonic()
+        self.first_chunk_latency: Optional[float] = None
+        self.finished = False
+
+    async def next(self) -> Optional[str]:
+        """
+        Returns the next chunk, or None once the stream has ended.
+        """
+        try:
+            async with enforce(self.deadline, "llm"):
+                chunk = await self.stream.__anext__()
+        except StopAsyncIteration:
+            self.finished = True
+            self.breaker.record_success(
+                self.first_chunk_latency if self.first_chunk_latency is not None else time.monotonic() - self.started
+            )
+            return None
+        except DeadlineExceededError:
+            # A hung backend counts as failed, but there is no time left to fail over
+            self.finished = True
+            self.breaker.record_failure()
+            raise
+        except Exception as e:
+            self.finished = True
+            self.breaker.record_failure()
+            raise BackendError(self.backend, e) from e
+        if self.first_chunk_latency is None:
+            self.first_chunk_latency = time.monotonic() - self.started
+            ttft_tracker.record(self.breaker.name, self.first_chunk_latency)
+        return chunk
+
+    async def close(self):
+        """
+        Stops the stream; an unfinished attempt counts as no outcome.
+        """
+        if not self.finished:
+            self.finished = True
+            self.breaker.release()
+        await self.stream.aclose()
+
+_g4f_models: Dict[str, Model] = {}
+
+
+def g4f_model(spec: ModelSpec) -> Model:
+    """
+    The g4f Model for a registry entry, with its providers in registry order.
+    """
+    model = _g4f_models.get(spec.key)
+    if model is None:
+        model = _g4f_models[spec.key] = Model(
+            name=spec.name,
+            base_provider='OpenAI',
+            best_provider=IterListProvider([getattr(g4f.Provider, name) for name in spec.providers])
+        )
+    return model
 
+
+class UnifiedAIClient:
     def __init__(self, backend: Optional[str] = None):
         self._backend = backend or os.getenv("AI_BACKEND", "g4f").lower()
         
@@ -39,23 +184,18 @@ class UnifiedAIClient:
             self.openai_client = OpenAIClient()
         if self._backend in ['g4f', 'auto']:
             self.g4f_client = G4FClient()
-            
+
         logger.info(f"Initialized UnifiedAIClient with backend: {self._backend}")
 
     def _get_appropriate_model(self, model: Union[str, Model], backend: str) -> Union[str, Model]:
         """Get the appropriate model based on the backend"""
-        if backend == 'openai':
-            if isinstance(model, str):
-                if model in self.OPENAI_MODELS:
-                    return model
-                logger.warning(f"Unknown OpenAI model: {model}, using default Qwen2.5-Coder-32B-Instruct")
-                return "Qwen2.5-Coder-32B-Instruct"
-            return "Meta-Llama-3.3-70B-Instruct"
-            
-        elif backend == 'g4f':
-            if isinstance(model, Model):
-                return model
-            return self.G4F_MODEL
+        if backend == 'g4f' and isinstance(model, Model):
+            return model
+        spec = find_model(model)
+        if spec is None or spec.backend != backend:
+            spec = next(spec for spec in MODELS if spec.backend == backend)
+            logger.warning(f"Model {self._model_name(model)} is not a {backend} model, using {spec.name}")
+        return g4f_model(spec) if backend == 'g4f' else spec.name
 
     async def generate_response(
         self,
@@ -64,55 +204,242 @@ class UnifiedAIClient:
         temperature: float = 0.75,
         max_tokens: int = 900,
         top_p: float = 0.60,
-        stop: Optional[List[str]] = None
+        stop: Optional[List[str]] = None,
+        deadline: Optional[float] = None
+    ):
+        """
+        Streams the reply. `deadline` (event loop time, defaulting to the
+        current update's) bounds the whole generation, failovers included.
+        """
+        deadline = current_deadline(deadline)
+        backends = self._backends_for(model)
+        key = ResponseCache.key(
+            "+".join(backends), self._model_name(model), messages, temperature, max_tokens, top_p, stop
+        )
+        cacheable = RESPONSE_CACHE_ENABLED and is_cacheable(messages, temperature)
+        if cacheable:
+            cached = get_response_cache().get(key)
+            if cached is not None:
+                for chunk in replay_chunks(cached):
+                    yield chunk
+                return
+
+        def live():
+            stream = self._generate_live(model, messages, temperature, max_tokens, top_p, stop, backends, deadline)
+            return self._cache_reply(key, stream) if cacheable else stream
+
+        source = flights.stream(key, live) if SINGLE_FLIGHT_ENABLED else live()
+        async for chunk in source:
+            yield chunk
+
+    @staticmethod
+    async def _cache_reply(key: str, stream):
+        """
+        Passes `stream` through and caches the reply once it has completed.
+        """
+        reply = ""
+        async for chunk in stream:
+            reply = "" if chunk is STREAM_RESTART else reply + chunk
+            yield chunk
+        if reply:
+            get_response_cache().put(key, reply)
+
+    async def _generate_live(
+        self,
+        model: Union[str, Model],
+        messages: List[Dict[str, Any]],
+        temperature: float,
+        max_tokens: int,
+        top_p: float,
+        stop: Optional[List[str]],
+        backends: List[str],
+        deadline: Optional[float] = None
     ):
         backends_tried = []
-        
-        # Determine which backends to try based on initialization
-        if self._backend == "openai":
-            backends = ["openai"]
-        elif self._backend == "g4f":
-            backends = ["g4f"]
-        else:  # auto
-            backends = ["openai", "g4f"]
-
-        for backend in backends:
+        backends = list(backends)
+
+        request = (model, messages, temperature, max_tokens, top_p, stop)
+        delivered = ""
+        resumes = 0
+        while True:
+            stream = self._open_next_stream(backends, backends_tried, self._resume_request(request, delivered), deadline)
+            if stream is None:
+                break
             try:
-                if backend == "openai":
-                    logger.info("Using OpenAI backend.")
-                    model_name = self._get_appropriate_model(model, 'openai')
-                    async for chunk in self.openai_client.generate_response(
-                        model=model_name,
-                        messages=messages,
-                        temperature=temperature,
-                        max_tokens=max_tokens,
-                        top_p=top_p
-                    ):
-                        yield chunk
-                    return
-
-                elif backend == "g4f":
-                    logger.info("Using G4F backend.")
-                    g4f_model = self._get_appropriate_model(model, 'g4f')
-                    async for chunk in self.g4f_client.generate_response(
-                        model=g4f_model,
-                        messages=messages,
-                        temperature=temperature,
-                        max_tokens=max_tokens,
-                        top_p=top_p,
-                        stop=stop or ["<|eot_id|>", "<|eom_id|>"]
-                    ):
-                        yield chunk
-                    return
-
-            except Exception as e:
-                logger.error(f"Error with backend '{backend}': {e}", exc_info=True)
-                backends_tried.append(backend)
+                if LLM_HEDGING_ENABLED:
+                    stream, chunk = await self._first_chunk_hedged(
+                        stream, backends, backends_tried, self._resume_request(request, delivered)
+                    )
+                else:
+                    chunk = await stream.next()
+
+                trimmer = OverlapTrimmer(delivered) if delivered else None
+                while chunk is not None:
+                    text = trimmer.feed(chunk) if trimmer else chunk
+                    if text:
+                        delivered += text
+                        yield text
+                    chunk = await stream.next()
+                text = trimmer.flush() if trimmer else ""
+                if text:
+                    delivered += text
+                    yield text
+                return
+
+            except BackendError as e:
+                logger.error(f"Error with backend '{e.backend}': {e.error}", exc_info=e.error)
+                backends_tried.append(e.backend)
+                if not delivered:
+                    continue
+
+                # Output already reached the caller: resume instead of starting over
+                resumes += 1
+                if resumes > LLM_MAX_RESUMES:
+                    break
+                RESUMES.inc()
+                logger.warning(f"Backend '{e.backend}' failed after {len(delivered)} characters, failing over ({LLM_FAILOVER_MODE})")
+                if LLM_FAILOVER_MODE == "restart":
+                    delivered = ""
+                    yield STREAM_RESTART
+                # A dropped stream is often transient, so the same backend may resume it
+                if e.backend not in backends:
+                    backends.append(e.backend)
                 continue
+            finally:
+                await stream.close()
 
         logger.error(f"All backends failed. Backends attempted: {backends_tried}")
         raise RuntimeError("Failed to generate response using all available backends.")
 
+    def _backends_for(self, model: Union[str, Model]) -> List[str]:
+        """
+        Backends to try for `model`: its registry backend and fallbacks that
+        this client runs, or else every backend it runs.
+        """
+        available = ["openai", "g4f"] if self._backend == "auto" else [self._backend]
+        spec = find_model(model)
+        preferred = [backend for backend in spec.backends if backend in available] if spec else []
+        return preferred or available
+
+    @staticmethod
+    def _resume_request(request: tuple, delivered: str) -> tuple:
+        """
+        The request continuing `delivered`: the partial answer is replayed as
+        the assistant's turn, followed by an instruction to continue it.
+        """
+        if not delivered:
+            return request
+        model, messages, temperature, max_tokens, top_p, stop = request
+        messages = messages + [
+            {"role": "assistant", "content": delivered},
+            {"role": "user", "content": CONTINUE_INSTRUCTION},
+        ]
+        remaining_tokens = max(64, max_tokens - len(delivered) // CHARS_PER_TOKEN)
+        return model, messages, temperature, remaining_tokens, top_p, stop
+
+    def _open_next_stream(self, backends: List[str], backends_tried: List[str], request: tuple,
+                          deadline: Optional[float] = None) -> Optional["BackendStream"]:
+        """
+        Starts the request on the next backend whose circuit allows it.
+        Consumes `backends`; returns None once none is left.
+        """
+        model, messages, temperature, max_tokens, top_p, stop = request
+        while backends:
+            backend = backends.pop(0)
+            backend_model = self._get_appropriate_model(model, backend)
+            breaker = get_breaker(f"{backend}:{self._model_name(backend_model)}")
+            if not breaker.allow():
+                logger.warning(f"Skipping backend '{backend}': circuit '{breaker.name}' is {breaker.state}")
+                backends_tried.append(f"{backend} (circuit {breaker.state})")
+                continue
+            return BackendStream(
+                backend, breaker,
+                self._stream_backend(backend, backend_model, messages, temperature, max_tokens, top_p, stop),
+                deadline
+            )
+        return None
+
+    async def _first_chunk_hedged(self, primary: "BackendStream", backends: List[str],
+                                  backends_tried: List[str], request: tuple) -> tuple:
+        """
+        Waits for the first chunk of `primary`. If none arrives within the
+        TTFT budget, the request is also started on the next backend and the
+        first stream to produce a chunk wins; the other is cancelled.
+        Returns the winning stream and its first chunk.
+        """
+        racers = {asyncio.create_task(primary.next()): primary}
+        may_hedge = bool(backends) and self._hedge_allowed()
+        hedged = False
+        try:
+            while racers:
+                timeout = ttft_budget(primary.breaker.name) if may_hedge else None
+                done, _ = await asyncio.wait(racers, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # One hedge attempt per request; only a hedge actually started counts against the rate
+                    may_hedge = False
+                    hedge = self._open_next_stream(backends, backends_tried, request, primary.deadline)
+                    if hedge is not None:
+                        hedged = True
+                        HEDGED_REQUESTS.inc()
+                        logger.info(f"No token from '{primary.backend}' after {timeout:.1f}s, hedging on '{hedge.backend}'")
+                        racers[asyncio.create_task(hedge.next())] = hedge
+                    continue
+
+                for task in done:
+                    stream = racers.pop(task)
+                    try:
+                        chunk = task.result()
+                    except BackendError as e:
+                        await stream.close()
+                        if not racers:
+                            raise
+                        logger.error(f"Error with backend '{e.backend}': {e.error}", exc_info=e.error)
+                        backends_tried.append(e.backend)
+                        continue
+                    if stream is not primary:
+                        HEDGE_WINS.inc()
+                    return stream, chunk
+        finally:
+            hedge_history.append(hedged)
+            for task, stream in racers.items():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await stream.close()
+
+    @staticmethod
+    def _hedge_allowed() -> bool:
+        """
+        Keeps hedging under LLM_HEDGE_MAX_RATE of recent requests.
+        """
+        if not hedge_history:
+            return True
+        return sum(hedge_history) / len(hedge_history) < LLM_HEDGE_MAX_RATE
+
+    def _stream_backend(self, backend: str, model: Union[str, Model], messages: List[Dict[str, Any]],
+                        temperature: float, max_tokens: int, top_p: float, stop: Optional[List[str]]):
+        if backend == "openai":
+            logger.info("Using OpenAI backend.")
+            return self.openai_client.generate_response(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=top_p
+            )
+        logger.info("Using G4F backend.")
+        return self.g4f_client.generate_response(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p,
+            stop=stop or ["<|eot_id|>", "<|eom_id|>"]
+        )
+
+    @staticmethod
+    def _model_name(model: Union[str, Model]) -> str:
+        return model.name if isinstance(model, Model) else model
+
     async def close(self):
         if hasattr(self, 'openai_client'):
             await self.openai_client.close()
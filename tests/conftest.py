@@ -0,0 +1,22 @@
+# tests/conftest.py
+
+import os
+from collections import deque
+import pytest
+
+# config.settings refuses to load without these
+for name in ("bot_token", "tel_imagaibot", "image_api_key", "api_key", "WEBHOOK_URL"):
+    os.environ.setdefault(name, "test")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    A UnifiedAIClient running every backend, with fresh circuit breakers and
+    hedge history. Tests replace its _stream_backend with fakes.
+    """
+    from services import unified_ai_client
+    from utils import circuit_breaker
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    monkeypatch.setattr(unified_ai_client, "hedge_history", deque(maxlen=unified_ai_client.HEDGE_HISTORY))
+    return unified_ai_client.UnifiedAIClient(backend="auto")
@@ -0,0 +1,81 @@
+# tests/test_image_service.py
+
+import asyncio
+import io
+import pytest
+from services import image_service
+from services.image_service import ImageService
+from utils.exceptions import APIConnectionError, NSFWContentError
+
+
+class FakeCache:
+    def __init__(self):
+        self.stored = []
+
+    async def get(self, key):
+        return None
+
+    async def put(self, key, image):
+        self.stored.append(key)
+
+
+class FakeImageService(ImageService):
+    """Counts upstream calls; fails them with `error` if given."""
+
+    def __init__(self, error=None):
+        self.semaphore = asyncio.Semaphore(4)
+        self.cache = FakeCache()
+        self.error = error
+        self.calls = []
+
+    async def _request_images(self, prompt, seed=None, n=1, deadline=None, **kwargs):
+        self.calls.append((seed, n))
+        if self.error:
+            raise self.error
+        images = []
+        for index in range(n):
+            bio = io.BytesIO(b"image")
+            bio.name = f"image{index}.png"
+            images.append(bio)
+        return images
+
+
+def generate(service, count=2):
+    return asyncio.run(service.generate_variants("a cat", count=count, seeds=[10, 11][:count]))
+
+
+@pytest.fixture
+def batching(monkeypatch):
+    monkeypatch.setattr(image_service, "IMAGE_BATCH_VARIANTS", True)
+
+
+def test_variants_requested_one_by_one_are_cached_per_seed():
+    service = FakeImageService()
+    variants = generate(service)
+    assert all(variant.image for variant in variants)
+    assert sorted(service.calls) == [(10, 1), (11, 1)]
+    assert len(service.cache.stored) == 2
+
+
+def test_batched_variants_are_not_cached_under_derived_seeds(batching):
+    service = FakeImageService()
+    variants = generate(service)
+    assert all(variant.image for variant in variants)
+    assert service.calls == [(10, 2)]
+    assert service.cache.stored == []
+
+
+def test_batch_rejected_for_its_prompt_is_not_retried_per_variant(batching):
+    service = FakeImageService(NSFWContentError("nsfw"))
+    with pytest.raises(NSFWContentError):
+        generate(service)
+    assert service.calls == [(10, 2)]
+
+
+def test_batch_connection_failure_falls_back_to_single_requests(batching):
+    service = FakeImageService(APIConnectionError("down"))
+    with pytest.raises(APIConnectionError):
+        generate(service)
+    # One batched call, then each variant with its retries
+    assert service.calls[0] == (10, 2)
+    assert len(service.calls) == 1 + 2 * (image_service.IMAGE_VARIANT_RETRIES + 1)
@@ -0,0 +1,80 @@
+# tests/test_image_worker.py
+
+import asyncio
+import time
+import image_worker
+from services.job_queue import ImageJobQueue, STATUS_FAILED
+from utils.sqlite_engine import SQLiteEngine
+
+
+class FakeTranslationService:
+    async def enhance_prompt(self, prompt, deadline=None):
+        return f"enhanced {prompt}"
+
+
+class SlowImageService:
+    """Renders for `seconds`, recording when a render starts and whether it finished."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.started = 0
+        self.finished = 0
+
+    async def generate_variants(self, enhanced_prompt, **kwargs):
+        self.started += 1
+        await asyncio.sleep(self.seconds)
+        self.finished += 1
+        return []
+
+
+def run_worker_until(tmp_path, monkeypatch, scenario, render_seconds):
+    monkeypatch.setattr(image_worker, "IMAGE_JOB_HEARTBEAT_INTERVAL", 0.05)
+    monkeypatch.setattr(image_worker, "IMAGE_QUEUE_POLL_INTERVAL", 0.01)
+    images = SlowImageService(render_seconds)
+
+    async def run():
+        queue = ImageJobQueue(SQLiteEngine(str(tmp_path / "jobs.db")), str(tmp_path / "spool"))
+        await queue.init_schema()
+        worker = asyncio.create_task(image_worker.run_worker("w", queue, FakeTranslationService(), images))
+        try:
+            return await scenario(queue)
+        finally:
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+            await queue.engine.close()
+    return asyncio.run(run()), images
+
+
+async def wait_for_status(queue, job_id, status):
+    while (await queue.get(job_id))["status"] != status:
+        await asyncio.sleep(0.01)
+
+
+def test_worker_stops_a_job_the_bot_gave_up_on(tmp_path, monkeypatch):
+    async def scenario(queue):
+        job_id = await queue.enqueue(1, 1, prompt="a cat")
+        await wait_for_status(queue, job_id, "running")
+        await queue.fail(job_id, "deadline", "gave up")
+        await asyncio.sleep(0.2)
+    _, images = run_worker_until(tmp_path, monkeypatch, scenario, render_seconds=5)
+    assert (images.started, images.finished) == (1, 0)
+
+
+def test_worker_stops_at_the_job_deadline(tmp_path, monkeypatch):
+    async def scenario(queue):
+        job_id = await queue.enqueue(1, 1, prompt="a cat", deadline_at=time.time() + 0.2)
+        await asyncio.wait_for(wait_for_status(queue, job_id, STATUS_FAILED), timeout=3)
+        return await queue.get(job_id)
+    job, images = run_worker_until(tmp_path, monkeypatch, scenario, render_seconds=5)
+    assert job["error_type"] == "deadline"
+    assert (images.started, images.finished) == (1, 0)
+
+
+def test_expired_queued_job_is_never_started(tmp_path, monkeypatch):
+    async def scenario(queue):
+        job_id = await queue.enqueue(1, 1, prompt="a cat", deadline_at=time.time() - 1)
+        await asyncio.wait_for(wait_for_status(queue, job_id, STATUS_FAILED), timeout=3)
+        return await queue.get(job_id)
+    job, images = run_worker_until(tmp_path, monkeypatch, scenario, render_seconds=5)
+    assert job["error_type"] == "deadline"
+    assert images.started == 0
@@ -0,0 +1,163 @@
+# tests/test_messages.py
+
+import asyncio
+from types import SimpleNamespace
+import pytest
+from handlers.messages import handle_message
+from services import unified_ai_client
+from services.unified_ai_client import HEDGED_REQUESTS, HEDGE_WINS, UnifiedAIClient
+from utils.circuit_breaker import get_breaker
+
+
+class FakeDatabase:
+    """The Database methods handle_message uses, in memory."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def check_and_increment_rate_limit(self, *args):
+        return True
+
+    async def update_chat_metadata(self, *args):
+        pass
+
+    async def insert_message(self, chat_id, timestamp, sender, content, token_counts=None):
+        self.messages.append({
+            "_id": len(self.messages), "timestamp": timestamp, "sender": sender,
+            "content": content, "token_counts": dict(token_counts or {})
+        })
+
+    async def get_chat_history_cleared_at(self, chat_id):
+        return None
+
+    async def get_total_words(self, chat_id, history_cleared_at):
+        return 0
+
+    async def get_messages(self, chat_id, history_cleared_at, after=None):
+        return list(self.messages)
+
+    async def set_token_counts(self, tokenizer, counts):
+        pass
+
+    async def get_chat_summary(self, chat_id):
+        return None
+
+
+class FakeMessage:
+    def __init__(self, text=""):
+        self.text = text
+        self.message_id = 1
+
+    async def reply_text(self, text, **kwargs):
+        return FakeMessage(text)
+
+
+class FakeBot:
+    async def send_chat_action(self, **kwargs):
+        pass
+
+    async def edit_message_text(self, text, **kwargs):
+        pass
+
+
+def answer(text, delay=0):
+    async def stream():
+        await asyncio.sleep(delay)
+        yield text
+    return stream
+
+
+def stalled():
+    async def stream():
+        await asyncio.sleep(30)
+        yield "too late"
+    return stream
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    monkeypatch.setattr(unified_ai_client, "LLM_HEDGING_ENABLED", True)
+    monkeypatch.setattr(unified_ai_client, "LLM_HEDGE_MIN_DELAY", 0.05)
+    monkeypatch.setattr(unified_ai_client, "LLM_HEDGE_MAX_RATE", 0.5)
+
+
+def fake_backends(client, streams):
+    """
+    Serves each backend of `client` from `streams` and returns the list of
+    (backend, model) calls made.
+    """
+    calls = []
+
+    def stream_backend(backend, model, *request):
+        calls.append((backend, UnifiedAIClient._model_name(model)))
+        return streams[backend]()
+    client._stream_backend = stream_backend
+    return calls
+
+
+def run_handler(client, text, model="llama70b"):
+    """
+    Runs handle_message for `text` and returns the reply it stored.
+    """
+    db = FakeDatabase()
+    update = SimpleNamespace(
+        message=FakeMessage(text),
+        effective_chat=SimpleNamespace(id=1),
+        effective_user=SimpleNamespace(id=1, first_name="Ann", username="ann")
+    )
+    context = SimpleNamespace(
+        bot_data={"db": db, "ai_client": client}, user_data={"model": model}, bot=FakeBot()
+    )
+    asyncio.run(handle_message(update, context))
+    return db.messages[-1]["content"] if db.messages[-1]["sender"] == "bot" else None
+
+
+def test_open_circuit_routes_to_fallback_backend(client):
+    breaker = get_breaker("openai:Meta-Llama-3.3-70B-Instruct")
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+    assert breaker.state == "open"
+    calls = fake_backends(client, {"openai": answer("from openai"), "g4f": answer("from g4f")})
+
+    assert run_handler(client, "Which backend answers?") == "from g4f"
+    assert calls == [("g4f", "gpt-4o-mini")]
+
+
+def test_model_backend_is_tried_first(client):
+    calls = fake_backends(client, {"openai": answer("from openai"), "g4f": answer("from g4f")})
+
+    assert run_handler(client, "Hello there", model="g4f") == "from g4f"
+    assert calls == [("g4f", "gpt-4o-mini")]
+
+
+def test_late_first_token_hedges_on_fallback_backend(client, hedging):
+    hedged, wins = HEDGED_REQUESTS.value, HEDGE_WINS.value
+    calls = fake_backends(client, {"openai": stalled(), "g4f": answer("from g4f")})
+
+    assert run_handler(client, "Is anyone there?") == "from g4f"
+    assert calls == [("openai", "Meta-Llama-3.3-70B-Instruct"), ("g4f", "gpt-4o-mini")]
+    assert (HEDGED_REQUESTS.value - hedged, HEDGE_WINS.value - wins) == (1, 1)
+
+
+def test_hedge_rate_is_shared_by_all_clients(client, hedging):
+    fake_backends(client, {"openai": stalled(), "g4f": answer("from g4f")})
+    assert run_handler(client, "First question") == "from g4f"
+
+    # Every recent request hedged, so a late token no longer hedges, whichever client serves it
+    other = UnifiedAIClient(backend="auto")
+    calls = fake_backends(other, {"openai": answer("from openai", delay=0.3), "g4f": answer("from g4f")})
+    assert run_handler(other, "Second question") == "from openai"
+    assert calls == [("openai", "Meta-Llama-3.3-70B-Instruct")]
+
+
+def test_hedge_that_cannot_start_is_not_counted(client, hedging):
+    breaker = get_breaker("g4f:gpt-4o-mini")
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+    hedged = HEDGED_REQUESTS.value
+    calls = fake_backends(client, {"openai": answer("from openai", delay=0.3), "g4f": answer("from g4f")})
+
+    assert run_handler(client, "Anyone but g4f?") == "from openai"
+    assert calls == [("openai", "Meta-Llama-3.3-70B-Instruct")]
+    assert HEDGED_REQUESTS.value == hedged
+    assert list(unified_ai_client.hedge_history) == [False]
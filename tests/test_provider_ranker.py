@@ -0,0 +1,45 @@
+# tests/test_provider_ranker.py
+
+from utils.provider_ranker import ProviderRanker
+
+
+def ranker():
+    # No probing, so order() is the plain ranking
+    return ProviderRanker(half_life=600, probe_interval=10**9)
+
+
+def test_failure_only_provider_sorts_after_a_succeeding_one():
+    providers = ranker()
+    for _ in range(20):
+        providers.record_failure("Dead")
+        providers.record_success("Good", ttft=1.0, chars=1200, stream_seconds=10.0)
+    assert providers.order(["Dead", "Good"]) == ["Good", "Dead"]
+
+
+def test_failure_only_provider_sorts_last_even_without_measured_latency():
+    providers = ranker()
+    providers.record_failure("Dead")
+    providers.record_success("Slow", ttft=30.0, chars=0, stream_seconds=0)
+    providers.record_failure("Slow")
+    assert providers.order(["Dead", "Slow"]) == ["Slow", "Dead"]
+
+
+def test_faster_provider_ranks_first_at_equal_success():
+    providers = ranker()
+    for _ in range(5):
+        providers.record_success("Slow", ttft=4.0, chars=1200, stream_seconds=20.0)
+        providers.record_success("Fast", ttft=0.5, chars=1200, stream_seconds=5.0)
+    assert providers.order(["Slow", "Fast"]) == ["Fast", "Slow"]
+
+
+def test_unseen_providers_go_first():
+    providers = ranker()
+    providers.record_success("Known", ttft=0.5, chars=1200, stream_seconds=5.0)
+    assert providers.order(["Known", "New"]) == ["New", "Known"]
+
+
+def test_stale_demoted_provider_is_probed():
+    providers = ProviderRanker(half_life=600, probe_interval=0)
+    providers.record_failure("Dead")
+    providers.record_success("Good", ttft=1.0, chars=1200, stream_seconds=10.0)
+    assert providers.order(["Good", "Dead"]) == ["Dead", "Good"]
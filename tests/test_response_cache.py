@@ -0,0 +1,16 @@
+# tests/test_response_cache.py
+
+from services.response_cache import ResponseCache
+
+
+def key(content):
+    return ResponseCache.key("openai", "model", [{"role": "user", "content": content}], 0.2, 900, 0.6, None)
+
+
+def test_key_ignores_outer_whitespace_only():
+    assert key("  What is Python?\n") == key("What is Python?")
+
+
+def test_key_keeps_case_punctuation_and_inner_spacing():
+    assert len({key("What is Python?"), key("what is python?"), key("What is Python"),
+                key("What  is Python?")}) == 4
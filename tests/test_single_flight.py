@@ -0,0 +1,118 @@
+# tests/test_single_flight.py
+
+import asyncio
+import pytest
+from utils.single_flight import SingleFlight
+
+
+class Upstream:
+    """Counts calls; each call answers with its number, or fails if told to."""
+
+    def __init__(self, fail_first=False):
+        self.calls = 0
+        self.fail_first = fail_first
+
+    async def call(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.fail_first and self.calls == 1:
+            raise ConnectionError("upstream failed")
+        return f"reply {self.calls}"
+
+    async def stream(self):
+        self.calls += 1
+        number = self.calls
+        for chunk in ("reply ", str(number)):
+            await asyncio.sleep(0.01)
+            yield chunk
+        if self.fail_first and number == 1:
+            raise ConnectionError("upstream failed")
+
+
+async def read(flight, key, upstream):
+    return "".join([chunk async for chunk in flight.stream(key, upstream.stream)])
+
+
+def test_concurrent_calls_share_one_upstream_call():
+    flight, upstream = SingleFlight("test"), Upstream()
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", upstream.call) for _ in range(3)))
+    assert asyncio.run(run()) == ["reply 1"] * 3
+    assert upstream.calls == 1
+
+
+def test_serial_calls_each_reach_upstream():
+    flight, upstream = SingleFlight("test"), Upstream(fail_first=True)
+
+    async def run():
+        with pytest.raises(ConnectionError):
+            await flight.do("key", upstream.call)
+        return await flight.do("key", upstream.call)
+    assert asyncio.run(run()) == "reply 2"
+    assert upstream.calls == 2
+
+
+def test_concurrent_streams_share_one_upstream_stream():
+    flight, upstream = SingleFlight("test"), Upstream()
+
+    async def run():
+        return await asyncio.gather(*(read(flight, "key", upstream) for _ in range(3)))
+    assert asyncio.run(run()) == ["reply 1"] * 3
+    assert upstream.calls == 1
+
+
+def test_serial_streams_each_reach_upstream():
+    flight, upstream = SingleFlight("test"), Upstream(fail_first=True)
+
+    async def run():
+        with pytest.raises(ConnectionError):
+            await read(flight, "key", upstream)
+        return await read(flight, "key", upstream)
+    assert asyncio.run(run()) == "reply 2"
+    assert upstream.calls == 2
+
+
+def test_serial_identical_chat_requests_each_reach_a_backend(client):
+    calls = []
+
+    def stream_backend(backend, model, *request):
+        calls.append(backend)
+
+        async def stream():
+            yield f"answer {len(calls)}"
+        return stream()
+    client._stream_backend = stream_backend
+    messages = [{"role": "user", "content": "Same question"}]
+
+    async def run():
+        replies = []
+        for _ in range(2):
+            replies.append("".join([
+                chunk async for chunk in client.generate_response("Meta-Llama-3.3-70B-Instruct", messages)
+            ]))
+        return replies
+    assert asyncio.run(run()) == ["answer 1", "answer 2"]
+    assert calls == ["openai", "openai"]
+
+
+def test_concurrent_chat_requests_differing_in_case_are_not_coalesced(client):
+    calls = []
+
+    def stream_backend(backend, model, messages, *request):
+        calls.append(messages[-1]["content"])
+
+        async def stream():
+            await asyncio.sleep(0.01)
+            yield f"answer to {messages[-1]['content']}"
+        return stream()
+    client._stream_backend = stream_backend
+
+    async def ask(content):
+        messages = [{"role": "user", "content": content}]
+        return "".join([chunk async for chunk in client.generate_response("Meta-Llama-3.3-70B-Instruct", messages)])
+
+    async def run():
+        return await asyncio.gather(ask("Is it US?"), ask("Is it us?"))
+    assert asyncio.run(run()) == ["answer to Is it US?", "answer to Is it us?"]
+    assert sorted(calls) == ["Is it US?", "Is it us?"]
@@ -0,0 +1,62 @@
+# tests/test_sqlite_engine.py
+
+import asyncio
+import pytest
+from utils.sqlite_engine import SQLiteEngine
+
+
+async def create_table(conn):
+    await conn.execute('CREATE TABLE items (value INTEGER)')
+
+
+async def insert(conn):
+    cursor = await conn.execute('INSERT INTO items (value) VALUES (1)')
+    return cursor.rowcount
+
+
+def run_with_engine(tmp_path, scenario):
+    async def run():
+        engine = SQLiteEngine(str(tmp_path / "test.db"))
+        await engine.write(create_table)
+        try:
+            return await asyncio.wait_for(scenario(engine), timeout=5)
+        finally:
+            await engine.close()
+    return asyncio.run(run())
+
+
+def test_failing_job_does_not_affect_its_batch(tmp_path):
+    async def scenario(engine):
+        async def broken(conn):
+            raise ValueError("bad job")
+        results = await asyncio.gather(engine.write(insert), engine.write(broken), engine.write(insert),
+                                       return_exceptions=True)
+        return results, await engine.fetchone('SELECT COUNT(*) FROM items')
+    results, count = run_with_engine(tmp_path, scenario)
+    assert results[0] == 1 and isinstance(results[1], ValueError) and results[2] == 1
+    assert count == (2,)
+
+
+def test_batch_error_escaping_the_transaction_fails_its_writes_and_writer_goes_on(tmp_path):
+    async def scenario(engine):
+        run_batch = engine._run_batch
+
+        async def crash_once(batch):
+            engine._run_batch = run_batch
+            raise ValueError("writer bug")
+        engine._run_batch = crash_once
+        with pytest.raises(ValueError):
+            await engine.write(insert)
+        return await engine.write(insert)
+    assert run_with_engine(tmp_path, scenario) == 1
+
+
+def test_stopped_writer_fails_queued_and_later_writes(tmp_path):
+    async def scenario(engine):
+        async def cancelled(conn):
+            raise asyncio.CancelledError()
+        with pytest.raises(RuntimeError):
+            await engine.write(cancelled)
+        with pytest.raises(RuntimeError):
+            await engine.write(insert)
+    run_with_engine(tmp_path, scenario)
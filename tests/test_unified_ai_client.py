@@ -0,0 +1,147 @@
+# tests/test_unified_ai_client.py
+
+import asyncio
+import pytest
+from services import unified_ai_client
+from services.unified_ai_client import (
+    CONTINUE_INSTRUCTION, MIN_OVERLAP, OVERLAP_WINDOW, STREAM_RESTART, OverlapTrimmer
+)
+
+MODEL = "Meta-Llama-3.3-70B-Instruct"
+MESSAGES = [{"role": "user", "content": "What is the answer?"}]
+
+
+class FakeBackend:
+    """
+    Serves scripted streams per backend. A script is a list of chunks; an
+    exception in it is raised at that point of the stream, after the chunks
+    before it were delivered. Each call takes the next script of its backend.
+    """
+
+    def __init__(self, client, scripts):
+        self.scripts = {backend: list(streams) for backend, streams in scripts.items()}
+        self.calls = []
+        client._stream_backend = self.stream_backend
+
+    def stream_backend(self, backend, model, messages, temperature, max_tokens, top_p, stop):
+        self.calls.append((backend, messages, max_tokens))
+        script = self.scripts[backend].pop(0)
+
+        async def stream():
+            for item in script:
+                await asyncio.sleep(0)
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        return stream()
+
+
+def collect(client, messages=MESSAGES, max_tokens=900):
+    async def run():
+        return [chunk async for chunk in client.generate_response(MODEL, messages, max_tokens=max_tokens)]
+    return asyncio.run(run())
+
+
+def trim(delivered, *chunks):
+    trimmer = OverlapTrimmer(delivered)
+    return "".join(trimmer.feed(chunk) for chunk in chunks) + trimmer.flush()
+
+
+def test_overlap_of_min_overlap_characters_is_dropped():
+    delivered = "The answer to everything is forty"
+    repeated = delivered[-MIN_OVERLAP:]
+    assert trim(delivered, repeated + "-two.") == "-two."
+
+
+def test_overlap_shorter_than_min_overlap_is_kept():
+    delivered = "The answer to everything is forty"
+    repeated = delivered[-(MIN_OVERLAP - 1):]
+    assert trim(delivered, repeated + "-two.") == repeated + "-two."
+
+
+def test_continuation_without_overlap_keeps_its_leading_space():
+    assert trim("The answer is", " forty-two.") == " forty-two."
+
+
+def test_overlap_is_found_across_chunks_and_after_leading_whitespace():
+    delivered = "The answer to everything is forty"
+    assert trim(delivered, "  everything ", "is for", "ty-two.") == "-two."
+
+
+def test_overlap_of_the_whole_window_is_dropped():
+    delivered = "".join(f"word{i} " for i in range(100))
+    assert len(delivered) > OVERLAP_WINDOW
+    continuation = delivered[-OVERLAP_WINDOW:] + "and more."
+    assert trim(delivered, continuation) == "and more."
+
+
+def test_continuation_is_held_back_until_the_window_is_full():
+    delivered = "x" * (2 * OVERLAP_WINDOW)
+    trimmer = OverlapTrimmer(delivered)
+    assert trimmer.feed("y" * (OVERLAP_WINDOW - 1)) == ""
+    assert trimmer.feed("y") == "y" * OVERLAP_WINDOW
+    assert trimmer.feed("z") == "z"
+    assert trimmer.flush() == ""
+
+
+def test_failure_before_output_fails_over_without_resuming(client):
+    backend = FakeBackend(client, {
+        "openai": [[ConnectionError("refused")]],
+        "g4f": [["The answer ", "is forty-two."]],
+    })
+    assert collect(client) == ["The answer ", "is forty-two."]
+    assert [call[0] for call in backend.calls] == ["openai", "g4f"]
+    assert backend.calls[1][1] == MESSAGES
+
+
+def test_mid_stream_failure_continues_on_next_backend(client, monkeypatch):
+    monkeypatch.setattr(unified_ai_client, "LLM_FAILOVER_MODE", "continue")
+    backend = FakeBackend(client, {
+        "openai": [["The answer ", "to everything is forty", ConnectionError("reset")]],
+        "g4f": [["everything is forty", "-two."]],
+    })
+    chunks = collect(client, max_tokens=100)
+
+    assert STREAM_RESTART not in chunks
+    assert "".join(chunks) == "The answer to everything is forty-two."
+    _, resumed_messages, resumed_max_tokens = backend.calls[1]
+    assert resumed_messages == MESSAGES + [
+        {"role": "assistant", "content": "The answer to everything is forty"},
+        {"role": "user", "content": CONTINUE_INSTRUCTION},
+    ]
+    assert resumed_max_tokens < 100
+
+
+def test_mid_stream_failure_restarts_in_restart_mode(client, monkeypatch):
+    monkeypatch.setattr(unified_ai_client, "LLM_FAILOVER_MODE", "restart")
+    backend = FakeBackend(client, {
+        "openai": [["The answer is", ConnectionError("reset")]],
+        "g4f": [["The answer is forty-two."]],
+    })
+    chunks = collect(client, messages=[{"role": "user", "content": "Restart?"}])
+
+    assert chunks == ["The answer is", STREAM_RESTART, "The answer is forty-two."]
+    assert backend.calls[1][1] == [{"role": "user", "content": "Restart?"}]
+
+
+def test_dropped_stream_may_resume_on_the_same_backend(client, monkeypatch):
+    monkeypatch.setattr(unified_ai_client, "LLM_FAILOVER_MODE", "continue")
+    backend = FakeBackend(client, {
+        "openai": [["The answer ", ConnectionError("reset")], [" forty-two."]],
+        "g4f": [["The answer is", ConnectionError("reset")]],
+    })
+    chunks = collect(client, messages=[{"role": "user", "content": "Again?"}])
+
+    assert "".join(chunks) == "The answer is forty-two."
+    assert [call[0] for call in backend.calls] == ["openai", "g4f", "openai"]
+
+
+def test_gives_up_after_max_resumes(client, monkeypatch):
+    monkeypatch.setattr(unified_ai_client, "LLM_FAILOVER_MODE", "continue")
+    monkeypatch.setattr(unified_ai_client, "LLM_MAX_RESUMES", 1)
+    FakeBackend(client, {
+        "openai": [["one ", ConnectionError("reset")], ["three ", ConnectionError("reset")]],
+        "g4f": [["two ", ConnectionError("reset")]],
+    })
+    with pytest.raises(RuntimeError):
+        collect(client, messages=[{"role": "user", "content": "Count"}])
@@ -0,0 +1,127 @@
+# utils/circuit_breaker.py
+
+import time
+from collections import deque
+from typing import Deque, Dict
+from config.settings import (
+    CIRCUIT_WINDOW, CIRCUIT_MIN_CALLS, CIRCUIT_FAILURE_RATE,
+    CIRCUIT_SLOW_CALL_SECONDS, CIRCUIT_SLOW_CALL_RATE, CIRCUIT_OPEN_SECONDS
+)
+from utils.logging_config import logger
+from utils.metrics import counter, gauge
+
+STATE_CLOSED = "closed"
+STATE_HALF_OPEN = "half_open"
+STATE_OPEN = "open"
+
+# Gauge values exported per state
+STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over a sliding window of recent calls.
+
+    The circuit opens when, over at least `min_calls` of the last `window`
+    calls, the failure rate or the slow-call rate reaches its threshold.
+    After `open_seconds` one probe call is let through (half-open); its
+    outcome closes the circuit again or re-opens it.
+    """
+
+    def __init__(self, name: str, window: int = CIRCUIT_WINDOW, min_calls: int = CIRCUIT_MIN_CALLS,
+                 failure_rate: float = CIRCUIT_FAILURE_RATE, slow_call_seconds: float = CIRCUIT_SLOW_CALL_SECONDS,
+                 slow_call_rate: float = CIRCUIT_SLOW_CALL_RATE, open_seconds: float = CIRCUIT_OPEN_SECONDS):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.state = STATE_CLOSED
+        self._calls: Deque[tuple] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._state_gauge = gauge(
+            "circuit_breaker_state", "Circuit state: 0 closed, 1 half-open, 2 open", {"breaker": name}
+        )
+        self._state_gauge.set(STATE_VALUES[self.state])
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go through now. In half-open state only one probe
+        is admitted at a time.
+        """
+        if self.state == STATE_OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                return False
+            self._transition(STATE_HALF_OPEN)
+        if self.state == STATE_HALF_OPEN:
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def record_success(self, latency: float):
+        """
+        Records a completed call; `latency` is the time to its first response.
+        """
+        slow = latency >= self.slow_call_seconds
+        if self.state == STATE_HALF_OPEN:
+            self._probe_in_flight = False
+            if slow:
+                self._open()
+            else:
+                self._calls.clear()
+                self._transition(STATE_CLOSED)
+            return
+        self._calls.append((False, slow))
+        self._evaluate()
+
+    def record_failure(self):
+        if self.state == STATE_HALF_OPEN:
+            self._probe_in_flight = False
+            self._open()
+            return
+        self._calls.append((True, False))
+        self._evaluate()
+
+    def release(self):
+        """
+        Ends a call that produced no outcome, e.g. because the caller went away.
+        """
+        self._probe_in_flight = False
+
+    def _evaluate(self):
+        if self.state != STATE_CLOSED or len(self._calls) < self.min_calls:
+            return
+        failures = sum(1 for failed, _ in self._calls if failed)
+        slow_calls = sum(1 for _, slow in self._calls if slow)
+        if failures / len(self._calls) >= self.failure_rate or slow_calls / len(self._calls) >= self.slow_call_rate:
+            self._open()
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self._transition(STATE_OPEN)
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.warning(f"Circuit '{self.name}' {self.state} -> {state}")
+        counter(
+            "circuit_breaker_transitions_total", "Circuit state changes",
+            {"breaker": self.name, "to": state}
+        ).inc()
+        self.state = state
+        self._state_gauge.set(STATE_VALUES[state])
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker(name)
+        _breakers[name] = breaker
+    return breaker
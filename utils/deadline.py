@@ -0,0 +1,83 @@
+# utils/deadline.py
+
+import asyncio
+import functools
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from utils.exceptions import DeadlineExceededError
+from utils.logging_config import logger
+from utils.metrics import counter
+
+# Absolute deadline of the update being handled, in event loop time
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+def current_deadline(deadline: Optional[float] = None) -> Optional[float]:
+    """
+    An explicitly passed deadline, or else the one of the current update.
+    """
+    return deadline if deadline is not None else _deadline.get()
+
+
+def remaining(deadline: Optional[float] = None) -> Optional[float]:
+    """
+    Seconds left before the deadline (never negative), or None without one.
+    """
+    deadline = current_deadline(deadline)
+    if deadline is None:
+        return None
+    return max(0.0, deadline - asyncio.get_running_loop().time())
+
+
+@contextmanager
+def deadline_scope(seconds: float):
+    """
+    Gives the code inside at most `seconds` (0 means no limit). A scope
+    nested in another never extends the outer deadline. Yields the deadline.
+    """
+    deadline = _deadline.get()
+    if seconds > 0:
+        own = asyncio.get_running_loop().time() + seconds
+        deadline = own if deadline is None else min(deadline, own)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def with_deadline(seconds: float):
+    """
+    Decorator running an update handler inside a deadline_scope of `seconds`.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            with deadline_scope(seconds):
+                return await handler(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@asynccontextmanager
+async def enforce(deadline: Optional[float], stage: str):
+    """
+    Cancels the block when the deadline passes and raises
+    DeadlineExceededError in its place. Without a deadline it only runs the
+    block.
+    """
+    deadline = current_deadline(deadline)
+    if deadline is None:
+        yield
+        return
+    timeout = asyncio.timeout_at(deadline)
+    try:
+        async with timeout:
+            yield
+    except TimeoutError:
+        if not timeout.expired():
+            raise
+        counter("deadline_exceeded_total", "Upstream calls cancelled at their update's deadline", {"stage": stage}).inc()
+        logger.warning(f"Deadline exceeded during {stage}")
+        raise DeadlineExceededError(f"{stage} did not finish before the deadline")
@@ -14,4 +14,12 @@ class APIConnectionError(ImageGenerationError):
 
 class InvalidPromptError(ImageGenerationError):
     """Raised when the user's prompt is invalid."""
-    pass
\ No newline at end of file
+    pass
+
+class PromptRefusedError(ImageGenerationError):
+    """Raised when the prompt enhancement model refuses the user's prompt."""
+    pass
+
+class DeadlineExceededError(Exception):
+    """Raised when an update runs out of its time budget before an upstream call completes."""
+    pass
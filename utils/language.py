@@ -0,0 +1,40 @@
+# utils/language.py
+
+import re
+import unicodedata
+
+# Frequent English function words; one of them is enough to tell English
+# apart from other languages written in plain ASCII Latin script
+ENGLISH_WORDS = frozenset("""
+    a an the of in on at with and or but for from to by under over into onto
+    is are was were be being been it its this that these those there their his her
+    my your our who which what where when while as like very some no not
+""".split())
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Canonical form of a prompt for cache keys: NFKC, case-folded, single spaces.
+    """
+    return " ".join(unicodedata.normalize("NFKC", prompt).casefold().split())
+
+
+def is_latin_ascii(text: str) -> bool:
+    """Whether every letter in `text` is an unaccented Latin letter"""
+    return all(char.isascii() for char in text if char.isalpha())
+
+
+def is_probably_english(prompt: str) -> bool:
+    """
+    Cheap local guess whether a prompt is already English: only unaccented
+    Latin letters, and either at most two words or at least one common
+    English function word.
+    """
+    if not is_latin_ascii(prompt):
+        return False
+    words = WORD_PATTERN.findall(prompt.lower())
+    if not words:
+        return False
+    return len(words) <= 2 or any(word in ENGLISH_WORDS for word in words)
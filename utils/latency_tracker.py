@@ -0,0 +1,32 @@
+# utils/latency_tracker.py
+
+import math
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class LatencyTracker:
+    """
+    Keeps the last `window` latency samples per key and answers percentile queries.
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, key: str, seconds: float):
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, key: str, quantile: float, min_samples: int = 1) -> Optional[float]:
+        """
+        Nearest-rank percentile of the samples of `key`, or None with too few samples.
+        """
+        samples = self._samples.get(key)
+        if not samples or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        rank = max(1, math.ceil(quantile * len(ordered)))
+        return ordered[rank - 1]
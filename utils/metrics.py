@@ -0,0 +1,121 @@
+# utils/metrics.py
+
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+
+Labels = Optional[Dict[str, str]]
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in sorted((labels or {}).items())]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    TYPE = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Labels = None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels)} {self.value:g}"]
+
+
+class Gauge(Counter):
+    TYPE = "gauge"
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+
+class Histogram:
+    TYPE = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS, labels: Labels = None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.total += value
+
+    def render(self) -> List[str]:
+        lines = []
+        cumulative = 0
+        bounds = [f"{bound:g}" for bound in self.buckets] + ["+Inf"]
+        for bound, count in zip(bounds, self.counts):
+            cumulative += count
+            le = f'le="{bound}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labels)} {self.total:g}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels)} {cumulative}")
+        return lines
+
+
+_metrics: Dict[Tuple[str, tuple], object] = {}
+
+
+def _get_or_create(metric_class, name: str, help_text: str, labels: Labels, **kwargs):
+    key = (name, tuple(sorted((labels or {}).items())))
+    if key not in _metrics:
+        _metrics[key] = metric_class(name, help_text, labels=labels, **kwargs)
+    return _metrics[key]
+
+
+def counter(name: str, help_text: str, labels: Labels = None) -> Counter:
+    """
+    Returns the process-wide counter `name` with `labels`, creating it on first use.
+    """
+    return _get_or_create(Counter, name, help_text, labels)
+
+
+def gauge(name: str, help_text: str, labels: Labels = None) -> Gauge:
+    """
+    Returns the process-wide gauge `name` with `labels`, creating it on first use.
+    """
+    return _get_or_create(Gauge, name, help_text, labels)
+
+
+def histogram(name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS, labels: Labels = None) -> Histogram:
+    """
+    Returns the process-wide histogram `name` with `labels`, creating it on first use.
+    """
+    return _get_or_create(Histogram, name, help_text, labels, buckets=buckets)
+
+
+def render_metrics() -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    by_name: Dict[str, list] = {}
+    for metric in list(_metrics.values()):
+        by_name.setdefault(metric.name, []).append(metric)
+
+    lines = []
+    for name, metrics in by_name.items():
+        lines.append(f"# HELP {name} {metrics[0].help_text}")
+        lines.append(f"# TYPE {name} {metrics[0].TYPE}")
+        for metric in metrics:
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,73 @@
+# utils/progress.py
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+from utils.logging_config import logger
+
+
+class ProgressReporter:
+    """
+    Pushes progress to a status message as real pipeline events arrive.
+
+    An optional note (e.g. the queue position) is shown next to the bar.
+    Edits are throttled to one per `min_interval` seconds; an update that
+    arrives too early is held back and flushed once the interval has passed,
+    so the latest state always reaches the user without flooding Telegram.
+    """
+
+    def __init__(self, render: Callable[[int, Optional[str]], Awaitable[None]], total_steps: int, min_interval: float):
+        self.render = render
+        self.total_steps = total_steps
+        self.min_interval = min_interval
+        self.current = -1
+        self.note: Optional[str] = None
+        self._shown = (-1, None)
+        self._last_render = 0.0
+        self._pending: Optional[asyncio.Task] = None
+
+    async def update(self, step: int, force: bool = False):
+        """
+        Records that the pipeline reached `step`. Progress never moves backwards.
+        """
+        step = min(step, self.total_steps)
+        if step <= self.current:
+            return
+        self.current = step
+        await self._schedule(force)
+
+    async def set_note(self, note: Optional[str], force: bool = False):
+        if note == self.note:
+            return
+        self.note = note
+        await self._schedule(force)
+
+    async def _schedule(self, force: bool):
+        wait = self.min_interval - (time.monotonic() - self._last_render)
+        if force or wait <= 0:
+            await self._render()
+        elif self._pending is None:
+            self._pending = asyncio.create_task(self._render_later(wait))
+
+    async def _render_later(self, delay: float):
+        await asyncio.sleep(delay)
+        self._pending = None
+        await self._render()
+
+    async def _render(self):
+        if (self.current, self.note) == self._shown:
+            return
+        self._shown = (self.current, self.note)
+        self._last_render = time.monotonic()
+        try:
+            await self.render(max(self.current, 0), self.note)
+        except Exception as e:
+            logger.error(f"Error rendering progress: {e}", exc_info=True)
+
+    def close(self):
+        """
+        Drops any held-back update, e.g. before the status message is deleted.
+        """
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
@@ -1,73 +1,94 @@
 # utils/prompt_storage.py
 
-import aiosqlite
 from datetime import datetime
-import os
 from typing import List
 from utils.logging_config import logger
+from utils.sqlite_engine import SQLiteEngine, get_engine
+
+
+async def _create_user_prompts(db):
+    """
+    Creates user_prompts keyed by the implicit rowid, which orders prompts by
+    insertion and backs pruning. Older databases used a (user_id, timestamp)
+    primary key; their rows are carried over.
+    """
+    async with db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_prompts'"
+    ) as cursor:
+        has_legacy_table = await cursor.fetchone() is not None
+
+    if has_legacy_table:
+        async with db.execute('PRAGMA table_info(user_prompts)') as cursor:
+            has_legacy_key = any(row[5] for row in await cursor.fetchall())
+        if not has_legacy_key:
+            return
+        await db.execute('ALTER TABLE user_prompts RENAME TO user_prompts_legacy')
+
+    await db.execute('''
+        CREATE TABLE user_prompts (
+            user_id INTEGER NOT NULL,
+            timestamp DATETIME,
+            prompt TEXT
+        )
+    ''')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_user_prompts_user ON user_prompts (user_id)')
+    if has_legacy_table:
+        await db.execute('''
+            INSERT INTO user_prompts (user_id, timestamp, prompt)
+            SELECT user_id, timestamp, prompt FROM user_prompts_legacy
+            ORDER BY timestamp ASC
+        ''')
+        await db.execute('DROP TABLE user_prompts_legacy')
+
 
 class PromptStorage:
-    def __init__(self, db_path: str = None, max_prompts: int = 5):
+    MIGRATIONS = [_create_user_prompts]
+
+    def __init__(self, engine: SQLiteEngine = None, max_prompts: int = 5):
         """
-        Initialize the PromptStorage with the path to the database and maximum prompts to store.
+        Initialize the PromptStorage with the shared SQLite engine and maximum prompts to store.
         """
         self.max_prompts = max_prompts
-        # If no db_path provided, default to 'rate_limit.db' in project root
-        if db_path is None:
-            self.db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'rate_limit.db')
-        else:
-            self.db_path = db_path
+        self.engine = engine or get_engine()
 
-    async def _init_db(self):
+    async def init_schema(self):
         """
-        Initialize the database table for storing user prompts.
+        Migrate the prompt tables. Called once at startup.
         """
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute('''
-                    CREATE TABLE IF NOT EXISTS user_prompts (
-                        user_id INTEGER,
-                        timestamp DATETIME,
-                        prompt TEXT,
-                        PRIMARY KEY (user_id, timestamp)
-                    )
-                ''')
-                await db.commit()
-                logger.info("Prompt storage table ensured.")
-        except Exception as e:
-            logger.error(f"Database initialization error in PromptStorage: {e}")
-            raise
+        await self.engine.migrate('prompt_storage', self.MIGRATIONS)
 
     async def add_prompt(self, user_id: int, prompt: str):
         """
         Add a new prompt for a user and ensure only the last `max_prompts` are stored.
         """
+        await self.add_prompts(user_id, [prompt])
+
+    async def add_prompts(self, user_id: int, prompts: List[str]):
+        """
+        Add several prompts for a user and prune old ones in a single transaction.
+        """
+        timestamp = datetime.now()
+
+        async def job(db):
+            await db.executemany('''
+                INSERT INTO user_prompts (user_id, timestamp, prompt)
+                VALUES (?, ?, ?)
+            ''', [(user_id, timestamp, prompt) for prompt in prompts])
+
+            # Keep only the newest `max_prompts` rows of this user
+            await db.execute('''
+                DELETE FROM user_prompts
+                WHERE user_id = ? AND rowid <= (
+                    SELECT rowid FROM user_prompts
+                    WHERE user_id = ?
+                    ORDER BY rowid DESC
+                    LIMIT 1 OFFSET ?
+                )
+            ''', (user_id, user_id, self.max_prompts))
+
         try:
-            # Ensure database is initialized
-            await self._init_db()
-            
-            timestamp = datetime.now()
-            async with aiosqlite.connect(self.db_path) as db:
-                # Insert the new prompt
-                await db.execute('''
-                    INSERT INTO user_prompts (user_id, timestamp, prompt)
-                    VALUES (?, ?, ?)
-                ''', (user_id, timestamp, prompt))
-                await db.commit()
-                logger.info(f"Added prompt for user {user_id} at {timestamp}.")
-
-                # Delete oldest prompts if exceeding max_prompts
-                await db.execute('''
-                    DELETE FROM user_prompts 
-                    WHERE user_id = ? AND timestamp NOT IN (
-                        SELECT timestamp FROM user_prompts
-                        WHERE user_id = ?
-                        ORDER BY timestamp DESC
-                        LIMIT ?
-                    )
-                ''', (user_id, user_id, self.max_prompts))
-                await db.commit()
-                logger.info(f"Ensured only last {self.max_prompts} prompts are stored for user {user_id}.")
+            await self.engine.write(job)
+            logger.info(f"Added {len(prompts)} prompts for user {user_id} at {timestamp}.")
         except Exception as e:
             logger.error(f"Error adding prompt for user {user_id}: {e}")
             raise
@@ -77,33 +98,26 @@ class PromptStorage:
         Retrieve the last `max_prompts` prompts for a user.
         """
         try:
-            # Ensure database is initialized
-            await self._init_db()
-            
-            async with aiosqlite.connect(self.db_path) as db:
-                async with db.execute('''
-                    SELECT prompt FROM user_prompts
-                    WHERE user_id = ?
-                    ORDER BY timestamp DESC
-                    LIMIT ?
-                ''', (user_id, self.max_prompts)) as cursor:
-                    rows = await cursor.fetchall()
-                    prompts = [row[0] for row in rows]
-                    logger.info(f"Retrieved {len(prompts)} prompts for user {user_id}.")
-                    return prompts
+            rows = await self.engine.fetchall('''
+                SELECT prompt FROM user_prompts
+                WHERE user_id = ?
+                ORDER BY rowid DESC
+                LIMIT ?
+            ''', (user_id, self.max_prompts))
+            prompts = [row[0] for row in rows]
+            logger.info(f"Retrieved {len(prompts)} prompts for user {user_id}.")
+            return prompts
         except Exception as e:
             logger.error(f"Error retrieving prompts for user {user_id}: {e}")
-            return []
+            raise
 
     async def clear_prompts(self, user_id: int):
         """
         Clear all prompts for a specific user.
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute('DELETE FROM user_prompts WHERE user_id = ?', (user_id,))
-                await db.commit()
-                logger.info(f"Cleared all prompts for user {user_id}.")
+            await self.engine.execute('DELETE FROM user_prompts WHERE user_id = ?', (user_id,))
+            logger.info(f"Cleared all prompts for user {user_id}.")
         except Exception as e:
             logger.error(f"Error clearing prompts for user {user_id}: {e}")
-            raise
\ No newline at end of file
+            raise
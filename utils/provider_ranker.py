@@ -0,0 +1,146 @@
+# utils/provider_ranker.py
+
+import time
+from typing import Dict, List, Optional, Sequence
+from config.settings import G4F_RANK_HALF_LIFE, G4F_PROBE_INTERVAL, CIRCUIT_SLOW_CALL_SECONDS
+from utils.logging_config import logger
+from utils.metrics import counter, gauge
+from utils.quota_shaper import CHARS_PER_TOKEN
+
+# Reply length, in tokens, used to turn TTFT and throughput into an expected latency
+REFERENCE_TOKENS = 300
+
+PROBES = counter("g4f_provider_probes_total", "Requests sent first to a demoted g4f provider to re-measure it")
+
+
+class ProviderStats:
+    """
+    Outcome, time-to-first-token and throughput of one provider, decayed
+    exponentially so that old samples lose half their weight every half-life.
+    """
+
+    def __init__(self):
+        self.successes = 0.0
+        self.failures = 0.0
+        self.ttft: Optional[float] = None
+        self.tokens_per_second: Optional[float] = None
+        self.updated_at = time.monotonic()
+        self.last_attempt = 0.0
+
+    def decay(self, half_life: float, now: float) -> float:
+        """
+        Ages the counts to `now`; returns the remaining sample weight.
+        """
+        factor = 0.5 ** ((now - self.updated_at) / half_life)
+        self.successes *= factor
+        self.failures *= factor
+        self.updated_at = now
+        return self.successes + self.failures
+
+    def expected_seconds(self) -> Optional[float]:
+        """
+        Expected latency of a REFERENCE_TOKENS reply, or None before the first success.
+        """
+        if self.ttft is None:
+            return None
+        seconds = self.ttft
+        if self.tokens_per_second:
+            seconds += REFERENCE_TOKENS / self.tokens_per_second
+        return seconds
+
+    def score(self, unmeasured_seconds: float) -> float:
+        """
+        Success rate (with a one-and-one prior) per expected second of
+        latency. Without a measured latency the provider is assumed to take
+        `unmeasured_seconds`.
+        """
+        success_rate = (self.successes + 1) / (self.successes + self.failures + 2)
+        expected = self.expected_seconds()
+        return success_rate / max(expected if expected is not None else unmeasured_seconds, 0.1)
+
+
+class ProviderRanker:
+    """
+    Orders the providers of a retry list by recent success rate, TTFT and
+    tokens per second. Providers never measured go first so they get
+    measured; a demoted provider is moved to the front once every
+    `probe_interval` seconds so it can recover its rank.
+    """
+
+    def __init__(self, half_life: float = G4F_RANK_HALF_LIFE, probe_interval: float = G4F_PROBE_INTERVAL):
+        self.half_life = half_life
+        self.probe_interval = probe_interval
+        self._stats: Dict[str, ProviderStats] = {}
+
+    def order(self, names: Sequence[str]) -> List[str]:
+        now = time.monotonic()
+        unseen = [name for name in names if name not in self._stats]
+        unmeasured_seconds = self._unmeasured_seconds()
+        seen = sorted(
+            (name for name in names if name in self._stats),
+            key=lambda name: self._stats[name].score(unmeasured_seconds), reverse=True
+        )
+        ranked = unseen + seen
+        if unseen or len(seen) < 2:
+            return ranked
+
+        stale = min(seen[1:], key=lambda name: self._stats[name].last_attempt)
+        if now - self._stats[stale].last_attempt >= self.probe_interval:
+            PROBES.inc()
+            logger.info(f"Probing demoted g4f provider {stale}")
+            ranked.remove(stale)
+            ranked.insert(0, stale)
+        return ranked
+
+    def record_success(self, name: str, ttft: float, chars: int, stream_seconds: float):
+        """
+        Records a completed stream: `ttft` to the first chunk, then `chars`
+        characters over `stream_seconds`.
+        """
+        stats, weight = self._aged(name)
+        stats.ttft = ttft if stats.ttft is None else (stats.ttft * weight + ttft) / (weight + 1)
+        if chars and stream_seconds > 0:
+            tps = chars / CHARS_PER_TOKEN / stream_seconds
+            stats.tokens_per_second = tps if stats.tokens_per_second is None else (
+                (stats.tokens_per_second * weight + tps) / (weight + 1)
+            )
+        stats.successes += 1
+        self._export(name, stats)
+
+    def record_failure(self, name: str):
+        stats, _ = self._aged(name)
+        stats.failures += 1
+        self._export(name, stats)
+
+    def _aged(self, name: str):
+        now = time.monotonic()
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = ProviderStats()
+        weight = stats.decay(self.half_life, now)
+        stats.last_attempt = now
+        return stats, weight
+
+    def _unmeasured_seconds(self) -> float:
+        """
+        Latency assumed for providers that never succeeded: that of the
+        slowest measured provider, or a slow call when none is measured. A
+        provider that only fails must never look fast.
+        """
+        measured = [stats.expected_seconds() for stats in self._stats.values()]
+        return max((seconds for seconds in measured if seconds is not None), default=CIRCUIT_SLOW_CALL_SECONDS)
+
+    def _export(self, name: str, stats: ProviderStats):
+        gauge("g4f_provider_score", "Ranking score of a g4f provider", {"provider": name}).set(
+            stats.score(self._unmeasured_seconds())
+        )
+
+
+_ranker: Optional[ProviderRanker] = None
+
+
+def get_provider_ranker() -> ProviderRanker:
+    global _ranker
+    if _ranker is None:
+        _ranker = ProviderRanker()
+    return _ranker
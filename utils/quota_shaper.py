@@ -0,0 +1,203 @@
+# utils/quota_shaper.py
+
+import asyncio
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+from config.settings import UPSTREAM_LIMITS, UPSTREAM_MAX_RETRIES
+from utils.logging_config import logger
+
+T = TypeVar("T")
+
+# Rough characters-per-token ratio used to estimate TPM usage before a call
+CHARS_PER_TOKEN = 4
+# Default pause applied after a 429 that carries no Retry-After hint
+DEFAULT_BACKOFF_SECONDS = 5.0
+# Learned limits never drop below this fraction of the configured one
+MIN_RATE_FACTOR = 0.1
+# A 429 status quoted in an error message ("Response 429:", "Error code: 429 -", "HTTP/1.1 429")
+STATUS_429 = re.compile(r"\b(?:response|status(?: code)?|error code|http(?:/[\d.]+)?)[\s:=]*429\b")
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `rate_per_minute`.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.max_rate = rate_per_minute / 60.0
+        self.rate = self.max_rate
+        self.capacity = capacity if capacity is not None else float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def delay_for(self, amount: float, now: float) -> float:
+        """
+        Returns the number of seconds until `amount` tokens are available.
+        Requests larger than the bucket are capped so they can still pass.
+        """
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def scale(self, factor: float):
+        """
+        Scales the refill rate relative to the configured maximum.
+        """
+        self.rate = max(self.max_rate * MIN_RATE_FACTOR, min(self.max_rate, self.rate * factor))
+
+
+class ProviderShaper:
+    """
+    Shapes outbound traffic to a single upstream provider.
+
+    Callers are admitted in FIFO order (asyncio.Lock wakes waiters in the
+    order they arrived), so a burst is queued instead of rejected. Limits
+    shrink on 429 responses and slowly recover on success.
+    """
+
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._lock = asyncio.Lock()
+        self._blocked_until = 0.0
+
+    async def acquire(self, tokens: int = 0):
+        """
+        Waits until both the request and the token budget allow one more call.
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                wait = self._blocked_until - now
+                if self.requests:
+                    wait = max(wait, self.requests.delay_for(1, now))
+                if self.tokens and tokens:
+                    wait = max(wait, self.tokens.delay_for(tokens, now))
+                if wait <= 0:
+                    break
+                logger.debug(f"Upstream '{self.name}' shaped, waiting {wait:.2f}s")
+                await asyncio.sleep(wait)
+
+            if self.requests:
+                self.requests.consume(1)
+            if self.tokens and tokens:
+                self.tokens.consume(tokens)
+
+    def settle(self, estimated: int, actual: Optional[int]):
+        """
+        Corrects the token bucket once the real usage of a call is known.
+        """
+        if not self.tokens or actual is None:
+            return
+        if actual < estimated:
+            self.tokens.refund(estimated - actual)
+        elif actual > estimated:
+            self.tokens.consume(actual - estimated)
+
+    def record_success(self):
+        if self.requests:
+            self.requests.scale(1.05)
+        if self.tokens:
+            self.tokens.scale(1.05)
+
+    def record_rate_limited(self, retry_after: Optional[float] = None):
+        """
+        Pauses the provider and halves the learned rate after a 429.
+        """
+        pause = retry_after if retry_after is not None else DEFAULT_BACKOFF_SECONDS
+        self._blocked_until = max(self._blocked_until, time.monotonic() + pause)
+        if self.requests:
+            self.requests.scale(0.5)
+        if self.tokens:
+            self.tokens.scale(0.5)
+        logger.warning(f"Upstream '{self.name}' rate limited, pausing for {pause:.1f}s")
+
+    async def run(self, call: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+        """
+        Runs `call` under the shaper, retrying it when the provider answers 429.
+        """
+        attempt = 0
+        while True:
+            await self.acquire(tokens)
+            try:
+                result = await call()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= UPSTREAM_MAX_RETRIES:
+                    raise
+                self.record_rate_limited(retry_after_from(e))
+                attempt += 1
+                continue
+            self.record_success()
+            return result
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    Detects 429 responses from the OpenAI/Together SDKs, httpx or g4f. The
+    message is only consulted for errors without a status code, and a bare
+    "429" in it (an id, a token count) does not count.
+    """
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    if status is not None:
+        return status == 429
+    message = str(error).lower()
+    return bool(STATUS_429.search(message)) or "rate limit" in message or "too many requests" in message
+
+
+def retry_after_from(error: Exception) -> Optional[float]:
+    """
+    Extracts a Retry-After hint (in seconds) from an upstream error, if any.
+    """
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is None:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        retry_after = headers.get("retry-after") or headers.get("Retry-After")
+    if retry_after is None:
+        match = re.search(r"retry after (\d+(?:\.\d+)?)", str(error).lower())
+        retry_after = match.group(1) if match else None
+    try:
+        return float(retry_after) if retry_after is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], max_tokens: int = 0) -> int:
+    """
+    Estimates prompt plus completion tokens for a chat request.
+    """
+    chars = sum(len(str(message.get("content", ""))) for message in messages)
+    return chars // CHARS_PER_TOKEN + max_tokens
+
+
+_shapers: Dict[str, ProviderShaper] = {}
+
+
+def get_shaper(provider: str) -> ProviderShaper:
+    """
+    Returns the process-wide shaper for `provider`, creating it on first use.
+    """
+    shaper = _shapers.get(provider)
+    if shaper is None:
+        rpm, tpm = UPSTREAM_LIMITS.get(provider, (0, 0))
+        shaper = ProviderShaper(provider, rpm=rpm, tpm=tpm)
+        _shapers[provider] = shaper
+    return shaper
@@ -0,0 +1,120 @@
+# utils/single_flight.py
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from utils.metrics import counter
+
+
+class _Broadcast:
+    """
+    Chunks of one upstream stream, kept so that every subscriber, including
+    late ones, reads the whole stream from the start.
+    """
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, source: AsyncIterator, on_done: Callable[[], None]):
+        """
+        Copies `source` into the broadcast. `on_done` runs as soon as the
+        source ends, before any subscriber is woken.
+        """
+        try:
+            async for chunk in source:
+                async with self._changed:
+                    self.chunks.append(chunk)
+                    self._changed.notify_all()
+        except BaseException as e:
+            self.error = e
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            on_done()
+            self.done = True
+            async with self._changed:
+                self._changed.notify_all()
+
+    async def read(self) -> AsyncIterator:
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.chunks) or self.done)
+                chunks = self.chunks[index:]
+            for chunk in chunks:
+                yield chunk
+            index += len(chunks)
+            if self.done and index == len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent requests: while a call for `key` is in
+    flight, further callers share its result (`do`) or subscribe to its
+    stream (`stream`) instead of starting their own. Nothing is kept once the
+    call has finished; caching is left to the callers.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self._coalesced = counter(
+            "single_flight_coalesced_total", "Requests that joined an identical in-flight request", {"group": name}
+        )
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        # A finished call is never joined, even if its done callback has not run yet
+        if future is not None and not future.done():
+            self._coalesced.inc()
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(call())
+        self._calls[key] = future
+        future.add_done_callback(lambda _: self._finish(key, future))
+        return await asyncio.shield(future)
+
+    def _finish(self, key: str, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        # Every waiter may have been cancelled (e.g. at its deadline); the error is theirs, not the loop's
+        if not future.cancelled():
+            future.exception()
+
+    async def stream(self, key: str, source: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """
+        Yields the chunks of `source()`, shared with every caller asking for
+        `key` meanwhile. The upstream stream is cancelled once its last
+        subscriber goes away.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None or broadcast.done:
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.create_task(
+                broadcast.publish(source(), lambda: self._forget(key, broadcast))
+            )
+        else:
+            self._coalesced.inc()
+
+        broadcast.subscribers += 1
+        try:
+            async for chunk in broadcast.read():
+                yield chunk
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.task.done():
+                broadcast.task.cancel()
+                self._forget(key, broadcast)
+
+    def _forget(self, key: str, broadcast: _Broadcast):
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
@@ -0,0 +1,255 @@
+# utils/sqlite_engine.py
+
+import asyncio
+import aiosqlite
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+from config.settings import SQLITE_DB_PATH, SQLITE_READERS, SQLITE_BUSY_TIMEOUT_MS, SQLITE_WRITE_BATCH
+from utils.logging_config import logger
+
+T = TypeVar("T")
+WriteJob = Callable[[aiosqlite.Connection], Awaitable[Any]]
+Migration = Callable[[aiosqlite.Connection], Awaitable[None]]
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
+
+
+class SQLiteEngine:
+    """
+    Owns a SQLite file: one writer connection fed by a queue, plus a small
+    pool of reader connections.
+
+    Every write is an async callable that receives the writer connection.
+    The writer task drains the queue and runs up to `batch_size` jobs in a
+    single transaction; each job gets its own savepoint so a failing job
+    does not roll back its neighbours. Under WAL, readers never block the
+    writer and vice versa.
+    """
+
+    def __init__(self, db_path: str, readers: int = 2, batch_size: int = 64):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._reader_count = max(1, readers)
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._readers: "asyncio.Queue[aiosqlite.Connection]" = asyncio.Queue()
+        self._reader_conns: List[aiosqlite.Connection] = []
+        self._queue: "asyncio.Queue[Optional[Tuple[WriteJob, asyncio.Future]]]" = asyncio.Queue()
+        self._writer_task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._start_lock = asyncio.Lock()
+
+    async def _connect(self) -> aiosqlite.Connection:
+        # isolation_level=None leaves transaction control to the writer loop
+        conn = await aiosqlite.connect(self.db_path, isolation_level=None)
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+    async def start(self):
+        """
+        Opens the connections and starts the writer task. Safe to call more than once.
+        """
+        async with self._start_lock:
+            if self._writer_task is not None:
+                return
+            self._writer = await self._connect()
+            for _ in range(self._reader_count):
+                conn = await self._connect()
+                self._reader_conns.append(conn)
+                self._readers.put_nowait(conn)
+            await self._writer.execute('''
+                CREATE TABLE IF NOT EXISTS schema_versions (
+                    component TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            ''')
+            self._start_writer()
+            logger.info(f"SQLite engine started on {self.db_path} with {self._reader_count} readers.")
+
+    def _start_writer(self):
+        self._writer_task = asyncio.create_task(self._writer_loop())
+        self._writer_task.add_done_callback(self._writer_exited)
+
+    def _writer_exited(self, task: asyncio.Task):
+        """
+        A writer task that ends without close() fails every queued write, so
+        no caller waits forever. A crashed writer is restarted; a cancelled
+        one makes later writes fail fast.
+        """
+        if self._closing:
+            return
+        error = None if task.cancelled() else task.exception()
+        logger.error(f"SQLite writer for {self.db_path} stopped unexpectedly: {error!r}")
+        self._fail_queued(RuntimeError(f"SQLite writer for {self.db_path} stopped"))
+        if error is not None:
+            self._start_writer()
+
+    def _fail_queued(self, error: Exception):
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                self._fail_batch([item], error)
+
+    async def close(self):
+        if self._writer_task is None:
+            return
+        self._closing = True
+        try:
+            if not self._writer_task.done():
+                await self._queue.put(None)
+                await self._writer_task
+        finally:
+            self._closing = False
+        self._writer_task = None
+        for conn in self._reader_conns:
+            await conn.close()
+        self._reader_conns.clear()
+        self._readers = asyncio.Queue()
+        await self._writer.close()
+        self._writer = None
+        logger.info("SQLite engine closed.")
+
+    async def _ensure_started(self):
+        if self._writer_task is None:
+            await self.start()
+
+    async def write(self, job: Callable[[aiosqlite.Connection], Awaitable[T]]) -> T:
+        """
+        Queues `job` for the writer and returns its result once committed.
+        """
+        await self._ensure_started()
+        if self._writer_task.done():
+            raise RuntimeError(f"SQLite writer for {self.db_path} is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((job, future))
+        return await future
+
+    async def execute(self, sql: str, params: Iterable[Any] = ()) -> int:
+        """
+        Runs a single write statement and returns the affected row count.
+        """
+        async def job(conn):
+            cursor = await conn.execute(sql, params)
+            return cursor.rowcount
+        return await self.write(job)
+
+    async def fetchall(self, sql: str, params: Iterable[Any] = ()) -> List[tuple]:
+        await self._ensure_started()
+        conn = await self._readers.get()
+        try:
+            async with conn.execute(sql, params) as cursor:
+                return await cursor.fetchall()
+        finally:
+            self._readers.put_nowait(conn)
+
+    async def fetchone(self, sql: str, params: Iterable[Any] = ()) -> Optional[tuple]:
+        rows = await self.fetchall(sql, params)
+        return rows[0] if rows else None
+
+    async def migrate(self, component: str, migrations: List[Migration]):
+        """
+        Applies the migrations of `component` it has not seen yet, in order.
+        The version of a component is the number of migrations applied.
+        """
+        async def job(conn):
+            async with conn.execute(
+                'SELECT version FROM schema_versions WHERE component = ?', (component,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            version = row[0] if row else 0
+            for migration in migrations[version:]:
+                await migration(conn)
+            if version < len(migrations):
+                await conn.execute(
+                    'INSERT OR REPLACE INTO schema_versions (component, version) VALUES (?, ?)',
+                    (component, len(migrations))
+                )
+                logger.info(f"Migrated '{component}' schema to version {len(migrations)}.")
+        await self.write(job)
+
+    async def _writer_loop(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                await self._run_batch(batch)
+            except BaseException as e:
+                # Whatever escaped the batch, its callers still get an answer
+                logger.error(f"SQLite writer failed on a batch of {len(batch)}: {e!r}")
+                self._fail_batch(batch, e if isinstance(e, Exception) else RuntimeError("SQLite writer stopped"))
+                if not isinstance(e, Exception):
+                    raise
+
+    @staticmethod
+    def _fail_batch(batch: List[Tuple[WriteJob, asyncio.Future]], error: Exception):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _run_batch(self, batch: List[Tuple[WriteJob, asyncio.Future]]):
+        conn = self._writer
+        outcomes: Dict[int, Tuple[bool, Any]] = {}
+        try:
+            await conn.execute('BEGIN IMMEDIATE')
+            for index, (job, future) in enumerate(batch):
+                if future.cancelled():
+                    continue
+                await conn.execute('SAVEPOINT job')
+                try:
+                    outcomes[index] = (True, await job(conn))
+                    await conn.execute('RELEASE job')
+                except Exception as e:
+                    await conn.execute('ROLLBACK TO job')
+                    await conn.execute('RELEASE job')
+                    outcomes[index] = (False, e)
+            await conn.execute('COMMIT')
+        except Exception as e:
+            logger.error(f"SQLite write batch of {len(batch)} failed: {e}")
+            try:
+                if conn.in_transaction:
+                    await conn.execute('ROLLBACK')
+            except Exception as rollback_error:
+                logger.error(f"SQLite rollback failed: {rollback_error}")
+            outcomes = {index: (False, e) for index in range(len(batch))}
+
+        for index, (_, future) in enumerate(batch):
+            if future.done() or index not in outcomes:
+                continue
+            ok, value = outcomes[index]
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+
+_engines: Dict[str, SQLiteEngine] = {}
+
+
+def get_engine(db_path: str = SQLITE_DB_PATH) -> SQLiteEngine:
+    """
+    Returns the process-wide engine for `db_path`.
+    """
+    engine = _engines.get(db_path)
+    if engine is None:
+        engine = SQLiteEngine(db_path, readers=SQLITE_READERS, batch_size=SQLITE_WRITE_BATCH)
+        _engines[db_path] = engine
+    return engine
+
+
+async def close_engines():
+    for engine in _engines.values():
+        await engine.close()
@@ -0,0 +1,81 @@
+# utils/term_matcher.py
+
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+
+class TermMatcher:
+    """
+    Case-insensitive multi-term matcher (Aho-Corasick).
+
+    The automaton is compiled once from the term list, after which a text is
+    scanned in a single pass regardless of how many terms there are. With
+    `whole_words` a match only counts when it is not part of a longer word.
+    """
+
+    def __init__(self, terms: Iterable[str], whole_words: bool = False):
+        self.whole_words = whole_words
+        self.terms: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        for term in terms:
+            term = term.strip().casefold()
+            if term and term not in self.terms:
+                self._add(term, len(self.terms))
+                self.terms.append(term)
+        self._build_failure_links()
+
+    def __bool__(self) -> bool:
+        return bool(self.terms)
+
+    def _add(self, term: str, index: int):
+        state = 0
+        for char in term:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(index)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, text: str) -> Optional[str]:
+        """
+        Returns the first term found in `text`, or None.
+        """
+        text = text.casefold()
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for index in self._output[state]:
+                term = self.terms[index]
+                if not self.whole_words or self._is_whole_word(text, position - len(term) + 1, position + 1):
+                    return term
+        return None
+
+    def matches(self, text: str) -> bool:
+        return self.find(text) is not None
+
+    @staticmethod
+    def _is_whole_word(text: str, start: int, end: int) -> bool:
+        before = text[start - 1] if start > 0 else " "
+        after = text[end] if end < len(text) else " "
+        return not before.isalnum() and not after.isalnum()
@@ -0,0 +1,87 @@
+# utils/token_counter.py
+
+import math
+import re
+from typing import Dict
+from utils.logging_config import logger
+
+# Tokens a chat template adds around every message (role markers, separators)
+MESSAGE_OVERHEAD = 4
+
+# Words, or single symbols; code is symbol-dense and tokenizes to many small pieces
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+class TokenCounter:
+    """Counts tokens of text; `name` identifies the tokenizer in stored counts."""
+
+    name = "base"
+
+    def count(self, text: str) -> int:
+        raise NotImplementedError
+
+    def count_message(self, text: str) -> int:
+        return self.count(text) + MESSAGE_OVERHEAD
+
+
+class EstimatingCounter(TokenCounter):
+    """
+    Offline estimate for BPE tokenizers: one token per symbol, one per six
+    characters of an ASCII word and one per two characters of any other word
+    (non-Latin scripts split into far more tokens). `scale` calibrates the
+    estimate to a particular model's tokenizer.
+    """
+
+    def __init__(self, scale: float = 1.0):
+        self.scale = scale
+        self.name = f"estimate-{scale:g}"
+
+    def count(self, text: str) -> int:
+        tokens = 0
+        for piece in _PIECES.findall(text):
+            if not piece[0].isalnum() and piece[0] != "_":
+                tokens += 1
+            elif piece.isascii():
+                tokens += math.ceil(len(piece) / 6)
+            else:
+                tokens += math.ceil(len(piece) / 2)
+        return math.ceil(tokens * self.scale)
+
+
+class TiktokenCounter(TokenCounter):
+    """Exact counts with a tiktoken encoding."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.name = f"tiktoken-{encoding.name}"
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+_counters: Dict[str, TokenCounter] = {}
+
+
+def get_token_counter(spec: str) -> TokenCounter:
+    """
+    Returns the counter for `spec`: "estimate", "estimate:<scale>" or
+    "tiktoken:<encoding>". tiktoken is optional; when it is missing or its
+    encoding cannot be loaded offline the estimator is used instead.
+    """
+    counter = _counters.get(spec)
+    if counter is not None:
+        return counter
+
+    kind, _, argument = spec.partition(":")
+    if kind == "tiktoken":
+        try:
+            import tiktoken
+            counter = TiktokenCounter(tiktoken.get_encoding(argument or "cl100k_base"))
+        except Exception as e:
+            logger.warning(f"tiktoken encoding '{argument}' unavailable, estimating tokens instead: {e}")
+            counter = EstimatingCounter()
+    else:
+        counter = EstimatingCounter(float(argument) if argument else 1.0)
+
+    _counters[spec] = counter
+    return counter